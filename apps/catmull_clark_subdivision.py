@@ -26,13 +26,25 @@ TODO
 
 __docformat__ = 'restructuredtext'
 
+import os
 import time
+import hashlib
+import threading
 import numpy as np
+from collections import OrderedDict
 
-from module3d import Object3D
+from module3d import Object3D, buildVertexAdjacency, gatherMap
+from getpath import getPath, isSubPath
 import log
 
 class SubdivisionObject(Object3D):
+    # Attributes that only depend on the topology of the parent mesh
+    TOPOLOGY = ('face_map', 'face_rmap', 'vtx_map', 'uv_map',
+                'cbase', 'ebase', 'tcbase', 'tebase',
+                'fvert', 'fuvs', 'evert', 'etexc', 'vedge', 'nedges',
+                'vedge_offsets', 'vedge_list', 'vedge_overflow',
+                'vface', 'nfaces', 'vface_offsets', 'vface_list', 'vface_overflow')
+
     def __init__(self, object):
         name = object.name + '.sub'
         super(SubdivisionObject, self).__init__(name, 4)
@@ -66,9 +78,6 @@ class SubdivisionObject(Object3D):
         progress(0)
         
         parent = self.parent
-        nverts = len(parent.coord)
-        ntexco = len(parent.texco)
-        nfaces = len(parent.fvert)
 
         group_mask = np.ones(len(parent._faceGroups), dtype=bool)
 
@@ -80,6 +89,74 @@ class SubdivisionObject(Object3D):
         progress(1)
 
         face_mask = group_mask[parent.group]
+
+        key = getTopologyKey(parent, face_mask)
+        topology = getCachedTopology(key, parent)
+        if topology is None:
+            self.createTopology(face_mask, progress)
+            cacheTopology(key, parent, self)
+        else:
+            log.debug('Using cached subdivision topology for %s.', parent.name)
+            for name, value in topology.items():
+                setattr(self, name, value)
+            progress(13)
+
+        nfaces = len(self.fvert)
+        nverts = len(self.vface)
+        ntexco = self.tebase + len(self.etexc)
+
+        self.group = np.repeat(parent.group[self.face_map], 4)
+        self.fmtls = np.repeat(parent.fmtls[self.face_map], 4)
+        self.face_mask = np.repeat(parent.face_mask[self.face_map], 4)
+        self.fnorm = np.zeros((nfaces,3))
+
+        self.coord = np.zeros((nverts, 3), dtype=np.float32)
+        self.vnorm = np.zeros((nverts, 3), dtype=np.float32)
+        self.vtang = np.zeros((nverts, 4), dtype=np.float32)
+        self.color = np.zeros((nverts, 4), dtype=np.uint8) + 255
+
+        self.ucoor = False
+        self.unorm = False
+        self.utang = False
+        self.ucolr = False
+
+        self.texco = np.zeros((ntexco, 2), dtype=np.float32)
+
+        self.utexc = False
+
+        progress(14)
+
+        self.updateIndexBuffer()
+
+        progress(15)
+
+        self.update_uvs()
+
+        progress(16)
+
+        self.update_coords()
+
+        progress(17)
+
+        self.calcNormals()
+
+        progress(18)
+
+        self.sync_all()
+
+        progress(19)
+
+    def createTopology(self, face_mask, progress):
+        """
+        Build the topology tables of the subdivided mesh (the TOPOLOGY
+        attributes). These only depend on the faces of the parent mesh and
+        on the mask of subdivided faces, not on vertex positions.
+        """
+        parent = self.parent
+        nverts = len(parent.coord)
+        ntexco = len(parent.texco)
+        nfaces = len(parent.fvert)
+
         self.face_map = np.argwhere(face_mask)[...,0]
         self.face_rmap = np.zeros(nfaces, dtype=int) - 1
         nfaces = len(self.face_map)
@@ -135,7 +212,7 @@ class SubdivisionObject(Object3D):
 
         _, x0 = np.unique(fvedges2, return_index=True)
         _, x1 = np.unique(fvedges2[::-1], return_index=True)
-        xmap = np.hstack((x0[:,None]/4, len(fvedges2) - 1 - x1[:,None]/4))
+        xmap = np.hstack((x0[:,None]//4, len(fvedges2) - 1 - x1[:,None]//4))
         vedgelist = np.hstack((vedgelist, xmap)).reshape((-1,2,2))
         del xmap
 
@@ -157,9 +234,6 @@ class SubdivisionObject(Object3D):
 
         self.fvert = np.empty((nfaces,4,4), dtype=np.uint32)
         self.fuvs  = np.empty((nfaces,4,4), dtype=np.uint32)
-        self.group = np.empty((nfaces,4), dtype=np.uint16)
-        self.fmtls = np.empty((nfaces,4), dtype=np.uint16)
-        self.face_mask = np.empty((nfaces,4), dtype=bool)
 
         # Create faces
         # v0  e0  v1
@@ -174,10 +248,6 @@ class SubdivisionObject(Object3D):
         self.fuvs[:,:,0] = fuv
         self.fuvs[:,:,2] = np.arange(nfaces)[:,None] + self.tcbase
 
-        self.group[...] = parent.group[self.face_map][:,None]
-        self.fmtls[...] = parent.fmtls[self.face_map][:,None]
-        self.face_mask[...] = parent.face_mask[self.face_map][:,None]
-
         progress(7)
 
         fvedges2 = np.asarray(fvedges2, dtype=np.uint32) + self.ebase
@@ -195,83 +265,33 @@ class SubdivisionObject(Object3D):
         self.evert = np.asarray(vedgelist, dtype = np.uint32)
         self.etexc = np.asarray(tedgelist, dtype = np.uint32)
 
-        self.vedge = np.zeros((nverts, self.MAX_FACES), dtype=np.uint32)
-        self.nedges = np.zeros(nverts, dtype=np.uint8)
-
         progress(9)
 
-        map = np.argsort(self.evert[:,0,:].flat)
-        vi = self.evert[:,0,:].flat[map]
-        ei = np.mgrid[:len(self.evert),:2][0].flat[map].astype(np.uint32)
-        del map
-        ix, first = np.unique(vi, return_index=True)
-        n = first[1:] - first[:-1]
-        n = np.hstack((n, np.array([len(vi) - first[-1]])))
-        self.nedges[ix] = n.astype(np.uint8)
-        for i in range(len(ix)):
-            self.vedge[ix[i],:n[i]] = ei[first[i]:][:n[i]]
-        del vi, ei, ix, n, first
+        self.vedge, nedges, self.vedge_offsets, self.vedge_list = \
+            buildVertexAdjacency(self.evert[:,0,:], nverts, self.MAX_FACES)
+        self.nedges = np.minimum(nedges, self.MAX_FACES).astype(np.uint8)
+        self.vedge_overflow = bool(len(nedges)) and nedges.max() > self.MAX_FACES
+        del nedges
 
         progress(10)
 
         nverts = self.ebase + len(vedgelist)
 
-        self.coord = np.zeros((nverts, 3), dtype=np.float32)
-        self.vnorm = np.zeros((nverts, 3), dtype=np.float32)
-        self.vtang = np.zeros((nverts, 4), dtype=np.float32)
-        self.color = np.zeros((nverts, 4), dtype=np.uint8) + 255
         self.vface = np.zeros((nverts, self.MAX_FACES), dtype=np.uint32)
         self.nfaces = np.zeros(nverts, dtype=np.uint8)
 
-        self.ucoor = False
-        self.unorm = False
-        self.utang = False
-        self.ucolr = False
-
         progress(11)
 
-        ntexco = self.tebase + len(tedgelist)
-
-        self.texco = np.zeros((ntexco, 2), dtype=np.float32)
-
-        self.utexc = False
-
-        progress(12)
-
         nfaces *= 4
 
         self.fvert = self.fvert.reshape((nfaces,4))
         self.fuvs  = self.fuvs.reshape((nfaces,4))
-        self.group = self.group.reshape(nfaces)
-        self.fmtls = self.fmtls.reshape(nfaces)
-        self.face_mask = self.face_mask.reshape(nfaces)
-        self.fnorm = np.zeros((nfaces,3))
 
-        progress(13)
+        progress(12)
 
         self._update_faces()
 
-        progress(14)
-
-        self.updateIndexBuffer()
-
-        progress(15)
-
-        self.update_uvs()
-
-        progress(16)
-
-        self.update_coords()
-
-        progress(17)
-
-        self.calcNormals()
-
-        progress(18)
-
-        self.sync_all()
-
-        progress(19)
+        progress(13)
 
     def dump(self):
         for k in dir(self):
@@ -336,6 +356,28 @@ class SubdivisionObject(Object3D):
         evert[...] = np.where(inedge[:,None], mvert / 2, (mvert + vc) / 4)
         del ic1, ic2, vc
 
+        if parent.vface_overflow or self.vedge_overflow:
+            nvface, nedges, nvedge, oevert, oevert2, ofvert = self._averageAdjacencyList(cvert, mvert, inedge)
+        else:
+            nvface, nedges, nvedge, oevert, oevert2, ofvert = self._averageAdjacencyTable(cvert, mvert, inedge)
+        opvert = pcoord
+
+        valid = nvface >= 3
+
+        bvert[...] = np.where(valid[:,None],
+                              np.where((nedges == nvface)[:,None],
+                                       (ofvert + 2 * oevert + (nvface[:,None] - 3) * opvert) / nvface[:,None],
+                                       (oevert2 + opvert) / (nvedge + 1)),
+                              (3 * oevert - ofvert) / 2)
+
+        self.markCoords(coor=True)
+
+    def _averageAdjacencyTable(self, cvert, mvert, inedge):
+        """
+        Averages of the face points and edge midpoints around each base
+        vertex, from the vface and vedge tables of at most MAX_FACES entries.
+        """
+        parent = self.parent
         nvface = parent.nfaces[self.vtx_map]
 
         # comment: this code could really do with some comments
@@ -348,29 +390,159 @@ class SubdivisionObject(Object3D):
         facewt = np.arange(self.MAX_FACES)[None,:,None] < nvface[:,None,None]
         facewt = facewt / nvface.astype(np.float32)[:,None,None]
         ofvert = np.sum(cvert[self.face_rmap[parent.vface[self.vtx_map]]] * facewt, axis=1)
-        opvert = pcoord
-
-        valid = nvface >= 3
-
-        bvert[...] = np.where(valid[:,None],
-                              np.where((self.nedges == nvface)[:,None],
-                                       (ofvert + 2 * oevert + (nvface[:,None] - 3) * opvert) / nvface[:,None],
-                                       (oevert2 + opvert) / (nvedge + 1)),
-                              (3 * oevert - ofvert) / 2)
+        return nvface, self.nedges, nvedge, oevert, oevert2, ofvert
+
+    def _averageAdjacencyList(self, cvert, mvert, inedge):
+        """
+        Like _averageAdjacencyTable, from the face and edge lists of the
+        vertices, for meshes with vertices with more than MAX_FACES faces or
+        edges.
+        """
+        parent = self.parent
+        nverts = len(self.vtx_map)
 
-        self.markCoords(coor=True)
+        rows, faces = parent.getVertexFaces(self.vtx_map)
+        nvface = np.bincount(rows, minlength=nverts)
+        ofvert = np.zeros((nverts, 3), dtype=np.float32)
+        np.add.at(ofvert, rows, cvert[self.face_rmap[faces]])
+        ofvert /= nvface[:,None]
+
+        rows, edges = gatherMap((self.vedge_offsets, self.vedge_list), np.arange(nverts), rows=True)
+        nedges = np.bincount(rows, minlength=nverts)
+        bedge = inedge[edges]
+        nvedge = np.bincount(rows, weights=bedge, minlength=nverts)[:,None]
+        oevert = np.zeros((nverts, 3), dtype=np.float32)
+        np.add.at(oevert, rows, mvert[edges] / 2)
+        oevert2 = np.zeros((nverts, 3), dtype=np.float32)
+        np.add.at(oevert2, rows[bedge], mvert[edges[bedge]] / 2)
+        oevert /= nedges[:,None]
+        return nvface, nedges, nvedge, oevert, oevert2, ofvert
+
+    def getChangedVerticesAndFaces(self, parentVerts):
+        """
+        Returns the indices of the vertices and faces of this subdivided mesh
+        whose positions or normals can change when the given vertices of the
+        parent mesh move. Catmull-Clark smoothing reaches two rings of parent
+        faces around a moved vertex.
+        """
+        parent = self.parent
+        pfaces = parent.getFacesForVertices(parentVerts)
+        pfaces = parent.getFacesForVertices(np.unique(parent.fvert[pfaces]))
+        faces = self.face_rmap[pfaces]
+        faces = faces[faces >= 0]
+        faces = (4 * faces[:,None] + np.arange(4)[None,:]).reshape(-1)
+        verts = np.unique(self.fvert[faces])
+        return verts, faces
 
     def update(self):
         self.update_coords()
         super(SubdivisionObject, self).update()
 
+# Topology tables of recently subdivided meshes, by topology key
+_topologyCache = OrderedDict()
+MAX_CACHED_TOPOLOGIES = 8
+# Part of the topology key, change it when the topology tables change
+TOPOLOGY_VERSION = 3
+# Meshes can be subdivided in worker threads (see exportutils.collect)
+_topologyLock = threading.RLock()
+
+# Also store topology tables as .subdiv.npz next to the mesh, for meshes in
+# the user data path (like compiled meshes, see files3d.loadMesh)
+cacheToDisk = True
+
+def getTopologyKey(parent, face_mask):
+    """
+    Hash of everything the subdivided topology depends on: the faces and UV
+    faces of the parent mesh, the mask of subdivided faces and the vertex and
+    UV counts.
+    """
+    h = hashlib.sha1()
+    h.update(('%d %d %d %s' % (TOPOLOGY_VERSION, len(parent.coord), len(parent.texco), parent.fvert.shape)).encode('ascii'))
+    for a in (parent.fvert, parent.fuvs, face_mask):
+        h.update(np.ascontiguousarray(a))
+    return h.hexdigest()
+
+def _getTopologyPath(parent):
+    path = getattr(parent, 'path', None)
+    if not path:
+        return None
+    return os.path.splitext(path)[0] + '.subdiv.npz'
+
+def getCachedTopology(key, parent):
+    """
+    Topology tables (a dict of SubdivisionObject.TOPOLOGY attributes) for
+    the given topology key, from memory or disk, or None if not cached.
+    """
+    with _topologyLock:
+        if key in _topologyCache:
+            topology = _topologyCache.pop(key)
+            _topologyCache[key] = topology
+            return topology
+
+    path = _getTopologyPath(parent) if cacheToDisk else None
+    if not path or not os.path.isfile(path):
+        return None
+
+    try:
+        npzfile = np.load(path)
+        if str(npzfile['key']) != key:
+            log.debug('Cached subdivision topology out of date: %s', path)
+            return None
+        topology = dict((name, npzfile[name]) for name in SubdivisionObject.TOPOLOGY)
+    except Exception:
+        log.warning('Unable to load cached subdivision topology: %s', path, exc_info=True)
+        return None
+    for name in ('cbase', 'ebase', 'tcbase', 'tebase'):
+        topology[name] = int(topology[name])
+
+    _storeTopology(key, topology)
+    return topology
+
+def cacheTopology(key, parent, obj):
+    """
+    Store the topology tables of subdivided object obj.
+    """
+    topology = dict((name, getattr(obj, name)) for name in SubdivisionObject.TOPOLOGY)
+    _storeTopology(key, topology)
+
+    path = _getTopologyPath(parent) if cacheToDisk else None
+    if not path:
+        return
+    if not isSubPath(path, getPath('')):
+        # Only write cached topology to user data path
+        return
+    try:
+        np.savez(path, key = np.array(key), **topology)
+    except Exception:
+        log.notice('Unable to save cached subdivision topology: %s', path)
+
+def _storeTopology(key, topology):
+    for value in topology.values():
+        if isinstance(value, np.ndarray):
+            # Arrays are shared by all objects with this topology
+            value.flags.writeable = False
+    with _topologyLock:
+        _topologyCache[key] = topology
+        while len(_topologyCache) > MAX_CACHED_TOPOLOGIES:
+            _topologyCache.popitem(last=False)
+
+def clearTopologyCache():
+    with _topologyLock:
+        _topologyCache.clear()
+
 def createSubdivisionObject(object, progressCallback=None):
     obj = SubdivisionObject(object)
     obj.create(progressCallback)
     # obj.dump()
     return obj
 
-def updateSubdivisionObject(object, progressCallback=None):
-    object.update()
-    object.calcNormals()
-    object.sync_all()
+def updateSubdivisionObject(object, progressCallback=None, changedVerts=None):
+    if changedVerts is None:
+        object.update()
+        object.calcNormals()
+        object.sync_all()
+    else:
+        verts, faces = object.getChangedVerticesAndFaces(changedVerts)
+        object.update_coords()
+        object.calcNormals(1, 1, verts, faces)
+        object.sync_all()
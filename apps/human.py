@@ -59,6 +59,11 @@ class Human(gui3d.Object):
         self.clothesProxies = {}
         self.activeClothing = None
         self.targetsDetailStack = {}  # All details targets applied, with their values
+        self.targetMatrix = algos3d.TargetMatrix(len(self.meshData.coord))
+        self.appliedTargets = None  # Target values currently applied to the mesh, None if unknown
+        self.deltaUpdates = 0       # Delta updates applied since the last full rebuild
+        self.maxDeltaUpdates = 256  # Full rebuild after this many delta updates, to bound float drift
+        self.movedVerts = None      # Mask of the vertices moved by target deltas since the last commit
         self.symmetryModeEnabled = False
 
         self.enableUVInterpolation = 0
@@ -465,10 +470,14 @@ class Human(gui3d.Object):
             self.africanVal *= scale
 
     def setDetail(self, name, value):
+        # Targets in the detail stack are kept in the target cache
         if value:
+            if name not in self.targetsDetailStack:
+                algos3d.targetBuffer.pin(name)
             self.targetsDetailStack[name] = value
         elif name in self.targetsDetailStack:
             del self.targetsDetailStack[name]
+            algos3d.targetBuffer.unpin(name)
 
     def getDetail(self, name):
         return self.targetsDetailStack.get(name, 0.0)
@@ -503,13 +512,20 @@ class Human(gui3d.Object):
         progressVal = 0.0
         progressIncr = 0.5 / (len(self.targetsDetailStack) + 1)
 
+        # Pack all targets in one sparse matrix and apply them in a single pass
+        self.targetMatrix.retain(self.targetsDetailStack)
         for (targetPath, morphFactor) in list(self.targetsDetailStack.items()):
-            algos3d.loadTranslationTarget(self.meshData, targetPath, morphFactor, None, 0, 0)
+            if morphFactor:
+                self.targetMatrix.setTarget(targetPath, algos3d.getTarget(self.meshData, targetPath))
 
             progressVal += progressIncr
             if progressCallback:
                 progressCallback(progressVal)
 
+        self.targetMatrix.apply(self.meshData, self.targetsDetailStack)
+        self.appliedTargets = dict(self.targetsDetailStack)
+        self.deltaUpdates = 0
+        self.movedVerts = None
 
         # Update all verts
         self.getSeedMesh().update()
@@ -536,6 +552,125 @@ class Human(gui3d.Object):
         self.callEvent('onChanged', events3d.HumanEvent(self, 'targets'))
 
 
+    def applyTargetDeltas(self, targetPaths=None):
+        """
+        This method applies to the mesh only the difference between the
+        target values in targetsDetailStack and the values that are currently
+        applied to the mesh (appliedTargets). Normals are not recalculated and
+        the mesh is not updated. The moved vertices are remembered until the
+        changes are committed with updateTargets, which updates all of them.
+
+        Returns the indices of the vertices and faces that were changed.
+
+        Parameters
+        ----------
+
+        targetPaths:
+            *list*. Optional: only consider these targets. If not specified,
+            all targets in targetsDetailStack or appliedTargets are considered.
+
+        """
+        obj = self.meshData
+
+        if targetPaths is None:
+            targetPaths = set(self.targetsDetailStack) | set(self.appliedTargets)
+
+        vmask = np.zeros(obj.getVertexCount(), dtype=bool)
+        fmask = np.zeros(len(obj.fvert), dtype=bool)
+
+        for targetPath in targetPaths:
+            old = self.appliedTargets.get(targetPath, 0.0)
+            new = self.targetsDetailStack.get(targetPath, 0.0)
+            if new == old:
+                continue
+
+            target = algos3d.getTarget(obj, targetPath)
+            if target.apply(obj, new - old, update=False, calcNormals=False):
+                vmask[target.verts] = True
+                fmask[target.faces] = True
+
+            if new:
+                self.appliedTargets[targetPath] = new
+            else:
+                del self.appliedTargets[targetPath]
+            self.deltaUpdates += 1
+
+        if self.movedVerts is None:
+            self.movedVerts = vmask.copy()
+        else:
+            self.movedVerts |= vmask
+
+        return np.argwhere(vmask)[...,0], np.argwhere(fmask)[...,0]
+
+    def calcChangedNormals(self, faces):
+        """
+        This method recalculates the normals of the given faces and of all
+        their vertices, including the vertices that did not move, as their
+        normals depend on the moved faces too.
+
+        Returns the indices of the vertices whose normals were recalculated.
+        """
+        obj = self.meshData
+        verts = np.unique(obj.fvert[faces])
+        obj.calcNormals(1, 1, verts, faces)
+        return verts
+
+    def updateTargets(self, progressCallback=None, update=True):
+        """
+        This method commits the changes made to targetsDetailStack since the
+        targets were last applied. Only the changed targets are applied, and
+        normals are only recalculated for the affected vertices and faces.
+        These include the vertices moved by target deltas (for example while
+        dragging a modifier slider) since the last commit.
+
+        A full rebuild with applyAllTargets is done instead when the applied
+        target values are unknown, or when maxDeltaUpdates delta updates have
+        been applied since the last full rebuild, to bound float drift.
+
+        """
+        if self.appliedTargets is None or self.deltaUpdates >= self.maxDeltaUpdates:
+            self.applyAllTargets(progressCallback, update)
+            return
+
+        if progressCallback:
+            progressCallback(0.0)
+
+        self._commitTargetDeltas(update, progressCallback)
+
+        if progressCallback:
+            progressCallback(1.0)
+
+        self.callEvent('onChanged', events3d.HumanEvent(self, 'targets'))
+
+    def invalidateTargets(self):
+        """
+        This method marks the applied target values as unknown, so that the
+        next updateTargets does a full rebuild. Call it after the mesh
+        coordinates were changed without going through the targets.
+        """
+        self.appliedTargets = None
+
+    def _commitTargetDeltas(self, update=True, progressCallback=None):
+        self.applyTargetDeltas()
+
+        if progressCallback:
+            progressCallback(0.5)
+
+        if self.movedVerts is None:
+            moved = np.zeros(0, dtype=np.intp)
+        else:
+            moved = np.argwhere(self.movedVerts)[...,0]
+        self.movedVerts = None
+
+        verts = self.calcChangedNormals(self.meshData.getFacesForVertices(moved))
+        if update:
+            self.meshData.update(verts)
+        self.updateProxyMesh()
+        if self.isSubdivided():
+            if progressCallback:
+                progressCallback(0.7)
+            self.updateSubdivisionMesh(moved)
+
     def getPartNameForGroupName(self, groupName):
         for k in self.bodyZones:
             if k in groupName:
@@ -594,9 +729,7 @@ class Human(gui3d.Object):
             # Reset previous targets on symm side
 
             if targetName[:2] == prefix2:
-                targetVal = self.targetsDetailStack[target]
-                algos3d.loadTranslationTarget(self.meshData, target, -targetVal, None, 1, 0)
-                del self.targetsDetailStack[target]
+                self.setDetail(target, 0)
 
         # Apply symm target. For horiz movement the value must be inverted
 
@@ -609,12 +742,12 @@ class Human(gui3d.Object):
                     targetSym = targetSym.replace('trans-in', 'trans-out')
                 elif 'trans-out' in targetSym:
                     targetSym = targetSym.replace('trans-out', 'trans-in')
-                algos3d.loadTranslationTarget(self.meshData, targetSym, targetSymVal, None, 1, 1)
-                self.targetsDetailStack[targetSym] = targetSymVal
+                self.setDetail(targetSym, targetSymVal)
 
-        self.updateProxyMesh()
-        if self.isSubdivided():
-            self.getSubdivisionMesh()
+        if self.appliedTargets is None:
+            self.applyAllTargets()
+        else:
+            self._commitTargetDeltas()
 
         mh.redraw()
 
@@ -627,6 +760,7 @@ class Human(gui3d.Object):
         self.meshData.coord[...] = self.meshStored
         self.meshData.vnorm[...] = self.meshStoredNormals
         self.meshData.markCoords(coor=True, norm=True)
+        self.invalidateTargets()
 
     def setDefaultValues(self):
         self.age = 0.5
@@ -652,7 +786,10 @@ class Human(gui3d.Object):
     def resetMeshValues(self):
         self.setDefaultValues()
 
+        for name in self.targetsDetailStack:
+            algos3d.targetBuffer.unpin(name)
         self.targetsDetailStack = {}
+        self.invalidateTargets()
 
         self.setMaterial(self._defaultMaterial)
 
@@ -35,6 +35,7 @@ import gui
 import log
 import targets
 from functools import reduce
+from collections import OrderedDict
 
 # Gender
 # -
@@ -92,13 +93,13 @@ class DetailAction(gui3d.Action):
     def do(self):
         for (target, value) in list(self.after.items()):
             self.human.setDetail(target, value)
-        self.human.applyAllTargets(gui3d.app.progress, update=self.update)
+        self.human.updateTargets(gui3d.app.progress, update=self.update)
         return True
 
     def undo(self):
         for (target, value) in list(self.before.items()):
             self.human.setDetail(target, value)
-        self.human.applyAllTargets()
+        self.human.updateTargets()
         return True
 
 class ModifierAction(gui3d.Action):
@@ -112,13 +113,13 @@ class ModifierAction(gui3d.Action):
 
     def do(self):
         self.modifier.setValue(self.human, self.after)
-        self.human.applyAllTargets(gui3d.app.progress)
+        self.human.updateTargets(gui3d.app.progress)
         self.postAction()
         return True
 
     def undo(self):
         self.modifier.setValue(self.human, self.before)
-        self.human.applyAllTargets(gui3d.app.progress)
+        self.human.updateTargets(gui3d.app.progress)
         self.postAction()
         return True
 
@@ -240,24 +241,23 @@ class BaseModifier(object):
             self.faces = human.meshData.getFacesForVertices(self.verts)
 
     def updateValue(self, human, value, updateNormals=1):
-        if self.verts is None and self.faces is None:
-            self.buildLists()
+        if human.appliedTargets is None:
+            # Applied target values unknown, apply changes relative to the
+            # current state and force a full rebuild on the next commit
+            human.appliedTargets = dict(human.targetsDetailStack)
+            human.deltaUpdates = human.maxDeltaUpdates
 
         # Update detail state
-        old_detail = [human.getDetail(target[0]) for target in self.targets]
         self.setValue(human, value)
-        new_detail = [human.getDetail(target[0]) for target in self.targets]
 
-        # Apply changes
-        for target, old, new in zip(self.targets, old_detail, new_detail):
-            if new == old:
-                continue
-            algos3d.loadTranslationTarget(human.meshData, target[0], new - old, None, 0, 0)
+        # Apply changes, only the vertices and faces of changed targets are affected
+        verts, faces = human.applyTargetDeltas([target[0] for target in self.targets])
 
-        # Update vertices
+        # Update vertices, the normals of all moved vertices are recalculated
+        # when the change is committed with updateTargets
         if updateNormals:
-            human.meshData.calcNormals(1, 1, self.verts, self.faces)
-        human.meshData.update(self.verts, updateNormals)
+            verts = human.calcChangedNormals(faces)
+        human.meshData.update(verts, updateNormals)
         human.callEvent('onChanging', events3d.HumanEvent(human, self.eventType))
 
 class Modifier(BaseModifier):
@@ -429,3 +429,405 @@ class MacroModifier(GenericModifier):
 
     def buildLists(self):
         pass
+
+
+# Modifier definitions of the modelling task views, by the group keyword
+# their values are saved with in .mhm files. Each group is a list of
+# features (name, base, templates), each template defines one modifier:
+#   (tname, tvar, opts)             macro modifier
+#   (tname, tleft, tright, opts)    universal modifier with two targets
+#   (tname, opts)                   universal modifier with one target
+MODIFIER_FEATURES = OrderedDict()
+
+MODIFIER_FEATURES['macro'] = [
+    ('Macro', 'macrodetails', [
+        (None, 'Gender', {'label' : 'Gender'}),
+        (None, 'Age', {'label' : 'Age'}),
+        ('universal', 'Muscle', {'label' : 'Muscle'}),
+        ('universal', 'Weight', {'label' : 'Weight'}),
+        ('universal-stature', 'Height', {'label' : 'Height'}),
+        (None, 'African', {'label' : 'African'}),
+        (None, 'Asian', {'label' : 'Asian'}),
+        (None, 'Caucasian', {'label' : 'Caucasian'}),
+        ]),
+    ]
+
+MODIFIER_FEATURES['gendered'] = [
+    ('Genitals', 'genitals', [
+        ('genitals', 'feminine', 'masculine', {}),
+        ]),
+    ('Breast', 'breast', [
+        (None, 'BreastSize', {'label' : 'Breast size'}),
+        (None, 'BreastFirmness', {'label' : 'Breast firmness', 'reverse' : True}),
+        ('breast', 'down', 'up', {}),
+        ('breast-dist', 'min', 'max', {}),
+        ('breast-point', 'min', 'max', {}),
+        ]),
+    ]
+
+MODIFIER_FEATURES['face'] = [
+    ('head shape', 'head', [
+        ('head-oval', {'cam' : 'frontView'}),
+        ('head-round', {'cam' : 'frontView'}),
+        ('head-rectangular', {'cam' : 'frontView'}),
+        ('head-square', {'cam' : 'frontView'}),
+        ('head-triangular', {'cam' : 'frontView'}),
+        ('head-invertedtriangular', {'cam' : 'frontView'}),
+        ('head-diamond', {'cam' : 'frontView'}),
+        ]),
+    ('head', 'head', [
+        ('head-age', 'less', 'more', {'cam' : 'frontView'}),
+        ('head-angle', 'in', 'out', {'cam' : 'rightView'}),
+        ('head-scale-depth', 'less', 'more', {'cam' : 'rightView'}),
+        ('head-scale-horiz', 'less', 'more', {'cam' : 'frontView'}),
+        ('head-scale-vert', 'more', 'less', {'cam' : 'frontView'}),
+        ('head-trans', 'in', 'out', {'cam' : 'frontView'}),
+        ('head-trans', 'down', 'up', {'cam' : 'frontView'}),
+        ('head-trans', 'forward', 'backward', {'cam' : 'rightView'}),
+        ]),
+    ('neck', 'neck', [
+        ('neck-scale-depth', 'less', 'more', {'cam' : 'rightView'}),
+        ('neck-scale-horiz', 'less', 'more', {'cam' : 'frontView'}),
+        ('neck-scale-vert', 'more', 'less', {'cam' : 'frontView'}),
+        ('neck-trans', 'in', 'out', {'cam' : 'frontView'}),
+        ('neck-trans', 'down', 'up', {'cam' : 'frontView'}),
+        ('neck-trans', 'forward', 'backward', {'cam' : 'rightView'}),
+        ]),
+    ('right eye', 'eyes', [
+        ('r-eye-height1', 'min', 'max', {'cam' : 'frontView'}),
+        ('r-eye-height2', 'min', 'max', {'cam' : 'frontView'}),
+        ('r-eye-height3', 'min', 'max', {'cam' : 'frontView'}),
+        ('r-eye-push1', 'in', 'out', {'cam' : 'frontView'}),
+        ('r-eye-push2', 'in', 'out', {'cam' : 'frontView'}),
+        ('r-eye-move', 'in', 'out', {'cam' : 'frontView'}),
+        ('r-eye-move', 'up', 'down', {'cam' : 'frontView'}),
+        ('r-eye', 'small', 'big', {'cam' : 'frontView'}),
+        ('r-eye-corner1', 'up', 'down', {'cam' : 'frontView'}),
+        ('r-eye-corner2', 'up', 'down', {'cam' : 'frontView'})
+        ]),
+    ('left eye', 'eyes', [
+        ('l-eye-height1', 'min', 'max', {'cam' : 'frontView'}),
+        ('l-eye-height2', 'min', 'max', {'cam' : 'frontView'}),
+        ('l-eye-height3', 'min', 'max', {'cam' : 'frontView'}),
+        ('l-eye-push1', 'in', 'out', {'cam' : 'frontView'}),
+        ('l-eye-push2', 'in', 'out', {'cam' : 'frontView'}),
+        ('l-eye-move', 'in', 'out', {'cam' : 'frontView'}),
+        ('l-eye-move', 'up', 'down', {'cam' : 'frontView'}),
+        ('l-eye', 'small', 'big', {'cam' : 'frontView'}),
+        ('l-eye-corner1', 'up', 'down', {'cam' : 'frontView'}),
+        ('l-eye-corner2', 'up', 'down', {'cam' : 'frontView'}),
+        ]),
+    ('nose features', 'nose', [
+        ('nose', 'compress', 'uncompress', {'cam' : 'rightView'}),
+        ('nose', 'convex', 'concave', {'cam' : 'rightView'}),
+        ('nose', 'moregreek', 'lessgreek', {'cam' : 'rightView'}),
+        ('nose', 'morehump', 'lesshump', {'cam' : 'rightView'}),
+        ('nose', 'potato', 'point', {'cam' : 'rightView'}),
+        ('nose-nostrils', 'point', 'unpoint', {'cam' : 'frontView'}),
+        ('nose-nostrils', 'up', 'down', {'cam' : 'rightView'}),
+        ('nose-point', 'up', 'down', {'cam' : 'rightView'}),
+        ]),
+    ('nose size details', 'nose', [
+        ('nose-nostril-width', 'min', 'max', {'cam' : 'frontView'}),
+        ('nose-height', 'min', 'max', {'cam' : 'rightView'}),
+        ('nose-width1', 'min', 'max', {'cam' : 'frontView'}),
+        ('nose-width2', 'min', 'max', {'cam' : 'frontView'}),
+        ('nose-width3', 'min', 'max', {'cam' : 'frontView'}),
+        ('nose-width', 'min', 'max', {'cam' : 'frontView'}),
+        ]),
+    ('nose size', 'nose', [
+        ('nose-trans', 'up', 'down', {'cam' : 'frontView'}),
+        ('nose-trans', 'forward', 'backward', {'cam' : 'rightView'}),
+        ('nose-trans', 'in', 'out', {'cam' : 'frontView'}),
+        ('nose-scale-vert', 'incr', 'decr', {'cam' : 'frontView'}),
+        ('nose-scale-horiz', 'incr', 'decr', {'cam' : 'frontView'}),
+        ('nose-scale-depth', 'incr', 'decr', {'cam' : 'rightView'}),
+        ]),
+    ('mouth size', 'mouth', [
+        ('mouth-scale-horiz', 'incr', 'decr', {'cam' : 'frontView'}),
+        ('mouth-scale-vert', 'incr', 'decr', {'cam' : 'frontView'}),
+        ('mouth-scale-depth', 'incr', 'decr', {'cam' : 'rightView'}),
+        ('mouth-trans', 'in', 'out', {'cam' : 'frontView'}),
+        ('mouth-trans', 'up', 'down', {'cam' : 'frontView'}),
+        ('mouth-trans', 'forward', 'backward', {'cam' : 'rightView'}),
+        ]),
+    ('mouth size details', 'mouth', [
+        ('mouth-lowerlip-height', 'min', 'max', {'cam' : 'frontView'}),
+        ('mouth-lowerlip-middle', 'up', 'down', {'cam' : 'frontView'}),
+        ('mouth-lowerlip-width', 'min', 'max', {'cam' : 'frontView'}),
+        ('mouth-upperlip-height', 'min', 'max', {'cam' : 'frontView'}),
+        ('mouth-upperlip-width', 'min', 'max', {'cam' : 'frontView'}),
+        ]),
+    ('mouth features', 'mouth', [
+        ('mouth-lowerlip-ext', 'up', 'down', {'cam' : 'frontView'}),
+        ('mouth-angles', 'up', 'down', {'cam' : 'frontView'}),
+        ('mouth-lowerlip-middle', 'up', 'down', {'cam' : 'frontView'}),
+        ('mouth-lowerlip', 'deflate', 'inflate', {'cam' : 'rightView'}),
+        ('mouth-philtrum', 'up', 'down', {'cam' : 'frontView'}),
+        ('mouth-philtrum', 'increase', 'decrease', {'cam' : 'rightView'}),
+        ('mouth-upperlip', 'deflate', 'inflate', {'cam' : 'rightView'}),
+        ('mouth-upperlip-ext', 'up', 'down', {'cam' : 'frontView'}),
+        ('mouth-upperlip-middle', 'up', 'down', {'cam' : 'frontView'}),
+        ]),
+    ('right ear', 'ears', [
+        ('r-ear', 'backward', 'forward', {'cam' : 'rightView'}),
+        ('r-ear', 'big', 'small', {'cam' : 'rightView'}),
+        ('r-ear', 'down', 'up', {'cam' : 'rightView'}),
+        ('r-ear-height', 'min', 'max', {'cam' : 'rightView'}),
+        ('r-ear-lobe', 'min', 'max', {'cam' : 'rightView'}),
+        ('r-ear', 'pointed', 'triangle', {'cam' : 'rightView'}),
+        ('r-ear-rot', 'backward', 'forward', {'cam' : 'rightView'}),
+        ('r-ear', 'square', 'round', {'cam' : 'rightView'}),
+        ('r-ear-width', 'max', 'min', {'cam' : 'rightView'}),
+        ('r-ear-wing', 'out', 'in', {'cam' : 'frontView'}),
+        ('r-ear-flap', 'out', 'in', {'cam' : 'frontView'}),
+        ]),
+    ('left ear', 'ears', [
+        ('l-ear', 'backward', 'forward', {'cam' : 'leftView'}),
+        ('l-ear', 'big', 'small', {'cam' : 'leftView'}),
+        ('l-ear', 'down', 'up', {'cam' : 'leftView'}),
+        ('l-ear-height', 'min', 'max', {'cam' : 'leftView'}),
+        ('l-ear-lobe', 'min', 'max', {'cam' : 'leftView'}),
+        ('l-ear', 'pointed', 'triangle', {'cam' : 'leftView'}),
+        ('l-ear-rot', 'backward', 'forward', {'cam' : 'leftView'}),
+        ('l-ear', 'square', 'round', {'cam' : 'leftView'}),
+        ('l-ear-width', 'max', 'min', {'cam' : 'leftView'}),
+        ('l-ear-wing', 'out', 'in', {'cam' : 'frontView'}),
+        ('l-ear-flap', 'out', 'in', {'cam' : 'frontView'}),
+        ]),
+    ('chin', 'chin', [
+        ('chin', 'in', 'out', {'cam' : 'rightView'}),
+        ('chin-width', 'min', 'max', {'cam' : 'frontView'}),
+        ('chin-height', 'min', 'max', {'cam' : 'frontView'}),
+        ('chin', 'squared', 'round', {'cam' : 'frontView'}),
+        ('chin', 'prognathism1', 'prognathism2', {'cam' : 'rightView'}),
+        ]),
+    ('cheek', 'cheek', [
+        ('l-cheek', 'in', 'out', {'cam' : 'frontView'}),
+        ('l-cheek-bones', 'out', 'in', {'cam' : 'frontView'}),
+        ('r-cheek', 'in', 'out', {'cam' : 'frontView'}),
+        ('r-cheek-bones', 'out', 'in', {'cam' : 'frontView'}),
+        ]),
+    ]
+
+MODIFIER_FEATURES['torso'] = [
+    ('Torso', 'torso', [
+        ('torso-scale-depth', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ('torso-scale-horiz', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ('torso-scale-vert', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ('torso-trans', 'in', 'out', {'cam' : 'setGlobalCamera'}),
+        ('torso-trans', 'down', 'up', {'cam' : 'setGlobalCamera'}),
+        ('torso-trans', 'forward', 'backward', {'cam' : 'setGlobalCamera'}),
+        ]),
+    ('Hip', 'hip', [
+        ('hip-scale-depth', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ('hip-scale-horiz', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ('hip-scale-vert', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ('hip-trans', 'in', 'out', {'cam' : 'setGlobalCamera'}),
+        ('hip-trans', 'down', 'up', {'cam' : 'setGlobalCamera'}),
+        ('hip-trans', 'forward', 'backward', {'cam' : 'setGlobalCamera'}),
+        ]),
+    ('Stomach', 'stomach', [
+        ('stomach-tone', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ]),
+    ('Buttocks', 'buttocks', [
+        ('buttocks-tone', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ]),
+    ('Pelvis', 'pelvis', [
+        ('pelvis-tone', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
+        ])
+    ]
+
+MODIFIER_FEATURES['armslegs'] = [
+    ('right hand', 'armslegs', [
+        ('r-hand-scale-depth', 'decr', 'incr', {'cam' : 'setRightHandTopCamera'}),
+        ('r-hand-scale-horiz', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}),
+        ('r-hand-scale-vert', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}),
+        ('r-hand-trans', 'in', 'out', {'cam' : 'setRightHandFrontCamera'}),
+        ('r-hand-trans', 'down', 'up', {'cam' : 'setRightHandFrontCamera'}),
+        ('r-hand-trans', 'forward', 'backward', {'cam' : 'setRightHandTopCamera'}),
+        ]),
+    ('left hand', 'armslegs', [
+        ('l-hand-scale-depth', 'decr', 'incr', {'cam' : 'setLeftHandTopCamera'}),
+        ('l-hand-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftHandFrontCamera'}),
+        ('l-hand-scale-vert', 'decr', 'incr', {'cam' : 'setLeftHandFrontCamera'}),
+        ('l-hand-trans', 'in', 'out', {'cam' : 'setLeftHandFrontCamera'}),
+        ('l-hand-trans', 'down', 'up', {'cam' : 'setLeftHandFrontCamera'}),
+        ('l-hand-trans', 'forward', 'backward', {'cam' : 'setLeftHandTopCamera'}),
+        ]),
+    ('right foot', 'armslegs', [
+        ('r-foot-scale-depth', 'decr', 'incr', {'cam' : 'setRightFootRightCamera'}),
+        ('r-foot-scale-horiz', 'decr', 'incr', {'cam' : 'setRightFootFrontCamera'}),
+        ('r-foot-scale-vert', 'decr', 'incr', {'cam' : 'setRightFootFrontCamera'}),
+        ('r-foot-trans', 'in', 'out', {'cam' : 'setRightFootFrontCamera'}),
+        ('r-foot-trans', 'down', 'up', {'cam' : 'setRightFootFrontCamera'}),
+        ('r-foot-trans', 'forward', 'backward', {'cam' : 'setRightFootRightCamera'}),
+        ]),
+    ('left foot', 'armslegs', [
+        ('l-foot-scale-depth', 'decr', 'incr', {'cam' : 'setLeftFootLeftCamera'}),
+        ('l-foot-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftFootFrontCamera'}),
+        ('l-foot-scale-vert', 'decr', 'incr', {'cam' : 'setLeftFootFrontCamera'}),
+        ('l-foot-trans', 'in', 'out', {'cam' : 'setLeftFootFrontCamera'}),
+        ('l-foot-trans', 'down', 'up', {'cam' : 'setLeftFootFrontCamera'}),
+        ('l-foot-trans', 'forward', 'backward', {'cam' : 'setLeftFootLeftCamera'}),
+        ]),
+    ('left arm', 'armslegs', [
+        ('l-lowerarm-scale-depth', 'decr', 'incr', {'cam' : 'setLeftArmTopCamera'}),
+        ('l-lowerarm-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-lowerarm-scale-vert', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-lowerarm-trans', 'in', 'out', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-lowerarm-trans', 'down', 'up', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-lowerarm-trans', 'forward', 'backward', {'cam' : 'setLeftArmTopCamera'}),
+        ('l-upperarm-scale-depth', 'decr', 'incr', {'cam' : 'setLeftArmTopCamera'}),
+        ('l-upperarm-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-upperarm-scale-vert', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-upperarm-trans', 'in', 'out', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-upperarm-trans', 'down', 'up', {'cam' : 'setLeftArmFrontCamera'}),
+        ('l-upperarm-trans', 'forward', 'backward', {'cam' : 'setLeftArmTopCamera'}),
+        ]),
+    ('right arm', 'armslegs', [
+        ('r-lowerarm-scale-depth', 'decr', 'incr', {'cam' : 'setRightArmTopCamera'}),
+        ('r-lowerarm-scale-horiz', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-lowerarm-scale-vert', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-lowerarm-trans', 'in', 'out', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-lowerarm-trans', 'down', 'up', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-lowerarm-trans', 'forward', 'backward', {'cam' : 'setRightArmTopCamera'}),
+        ('r-upperarm-scale-depth', 'decr', 'incr', {'cam' : 'setRightArmTopCamera'}),
+        ('r-upperarm-scale-horiz', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-upperarm-scale-vert', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-upperarm-trans', 'in', 'out', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-upperarm-trans', 'down', 'up', {'cam' : 'setRightArmFrontCamera'}),
+        ('r-upperarm-trans', 'forward', 'backward', {'cam' : 'setRightArmTopCamera'}),
+        ]),
+    ('left leg', 'armslegs', [
+        ('l-lowerleg-scale-depth', 'decr', 'incr', {'cam' : 'setLeftLegLeftCamera'}),
+        ('l-lowerleg-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-lowerleg-scale-vert', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-lowerleg-trans', 'in', 'out', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-lowerleg-trans', 'down', 'up', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-lowerleg-trans', 'forward', 'backward', {'cam' : 'setLeftLegLeftCamera'}),
+        ('l-upperleg-scale-depth', 'decr', 'incr', {'cam' : 'setLeftLegLeftCamera'}),
+        ('l-upperleg-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-upperleg-scale-vert', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-upperleg-trans', 'in', 'out', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-upperleg-trans', 'down', 'up', {'cam' : 'setLeftLegFrontCamera'}),
+        ('l-upperleg-trans', 'forward', 'backward', {'cam' : 'setLeftLegLeftCamera'}),
+        ]),
+    ('right leg', 'armslegs', [
+        ('r-lowerleg-scale-depth', 'decr', 'incr', {'cam' : 'setRightLegRightCamera'}),
+        ('r-lowerleg-scale-horiz', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-lowerleg-scale-vert', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-lowerleg-trans', 'in', 'out', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-lowerleg-trans', 'down', 'up', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-lowerleg-trans', 'forward', 'backward', {'cam' : 'setRightLegRightCamera'}),
+        ('r-upperleg-scale-depth', 'decr', 'incr', {'cam' : 'setRightLegRightCamera'}),
+        ('r-upperleg-scale-horiz', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-upperleg-scale-vert', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-upperleg-trans', 'in', 'out', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-upperleg-trans', 'down', 'up', {'cam' : 'setRightLegFrontCamera'}),
+        ('r-upperleg-trans', 'forward', 'backward', {'cam' : 'setRightLegRightCamera'}),
+        ])
+    ]
+
+MODIFIER_FEATURES['asymmetry'] = [
+    ('brow', 'asym', [
+        ('asym-brown-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-brown-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('cheek', 'asym', [
+        ('asym-cheek-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-cheek-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('ear', 'asym', [
+        ('asym-ear-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-ear-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-ear-3', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-ear-4', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('eye', 'asym', [
+        ('asym-eye-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-eye-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-eye-3', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-eye-4', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-eye-5', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-eye-6', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-eye-7', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-eye-8', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('jaw', 'asym', [
+        ('asym-jaw-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-jaw-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-jaw-3', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('mouth', 'asym', [
+        ('asym-mouth-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-mouth-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('nose', 'asym', [
+        ('asym-nose-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-nose-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-nose-3', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-nose-4', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('temple', 'asym', [
+        ('asym-temple-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-temple-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('top', 'asym', [
+        ('asym-top-1', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ('asym-top-2', 'l', 'r', {'cam' : 'setFaceCamera'}),
+        ]),
+    ('body', 'asym', [
+        ('asymm-breast-1', 'l', 'r', {'cam' : 'setGlobalCamera'}),
+        ('asymm-trunk-1', 'l', 'r', {'cam' : 'setGlobalCamera'}),
+        ]),
+    ]
+
+def createModifiers(base, templates, modifiers):
+    """
+    Create the modifiers for the templates of one feature (see
+    MODIFIER_FEATURES) and add them to the modifiers dict, under the name
+    their values are saved with. Returns (template, modifier) for each
+    template.
+    """
+    result = []
+    for template in templates:
+        if len(template) == 3:
+            tname, tvar, opts = template
+            modifier = MacroModifier(base, tname, tvar)
+            modifiers[tvar] = modifier
+        else:
+            if len(template) == 4:
+                tname, tleft, tright, opts = template
+                left  = '-'.join([base, tname, tleft])
+                right = '-'.join([base, tname, tright])
+            else:
+                tname, opts = template
+                left = None
+                right = '-'.join([base, tname])
+
+            modifier = UniversalModifier(left, right)
+
+            tpath = '-'.join(template[0:-1])
+            modifierName = tpath
+            clashIndex = 0
+            while modifierName in modifiers:
+                log.debug('modifier clash: %s', modifierName)
+                modifierName = '%s%d' % (tpath, clashIndex)
+                clashIndex += 1
+
+            modifiers[modifierName] = modifier
+        result.append((template, modifier))
+    return result
+
+def loadModifiers():
+    """
+    Create the modifiers of all groups in MODIFIER_FEATURES, without the
+    modelling plugins. Returns a dict {group: {name: modifier}}.
+    """
+    groups = {}
+    for group, features in MODIFIER_FEATURES.items():
+        modifiers = groups[group] = {}
+        for name, base, templates in features:
+            createModifiers(base, templates, modifiers)
+    return groups
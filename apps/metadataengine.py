@@ -61,17 +61,25 @@ the following examples illustrate the use of the load search and save functions:
     // Sets r1 to be the list [\"c:\MakeHuman\objectlibrary\obj2.obj\",\"leg\",\"calf\",\"muscular\"]
 
     r2 = searchRecord('tags.txt', 'eye')
-    // Sets r2 to be the list [\"c:\MakeHuman\objectlibrary\obj4.obj\",\"c:\MakeHuman\objectlibrary\obj5.obj\",\"c:\MakeHuman\objectlibrary\obj7.obj\"]
+    // Sets r2 to be the list [\"c:\MakeHuman\objectlibrary\obj4.obj\"]
 
     recordToSave = 'c:\MakeHuman\objectlibrary\obj5.obj eyelash thick long black'
     saveRecord('tags.txt', recordToSave)
-    // Replaces the existing 'obj5' record with the new record in the file on disk.
+    // Appends the merged 'obj5' record to the file on disk, it replaces the existing record.
+
+Searches match whole fields, using the field index described in RecordArchive,
+so loading and searching no longer scan the file, and saving a record appends
+one line instead of rewriting the file.
 
 """
 
 __docformat__ = 'restructuredtext'
 
+import os
 import time
+import json
+import zlib
+import atexit
 import log
 
 def joinRecords(record1, record2):
@@ -100,9 +108,325 @@ def joinRecords(record1, record2):
     return ' '.join(joinedRecord)
 
 
+class RecordArchive(object):
+
+    """
+    An indexed record archive.
+
+    The records are stored in the text archive format, one record per line,
+    with the record ID first. Saving a record appends the merged record to the
+    end of the file, so a record ID can occur on several lines, of which the
+    last one is current. When too many lines are superseded, the archive is
+    compacted, which rewrites it with one line per record.
+    A compacted archive is an ordinary text archive.
+
+    The index is stored next to the archive, in <archivePath>.index. It maps
+    each record ID to the file offset of its current line, and each field to
+    the IDs of the records containing it. The index is written when the
+    archive is compacted or flushed, with a checksum of the indexed part of
+    the archive. Records appended after that are indexed again when the
+    archive is opened. An archive without an index, or one that was changed
+    by other means, is indexed from scratch. This is also done when a record
+    read through the index does not have the expected ID.
+    """
+
+    INDEX_VERSION = 2
+
+    def __init__(self, archivePath):
+        """
+        This method opens the archive and loads or builds its index.
+
+        Parameters
+        ----------
+
+        archivePath:
+          *string*.  The file system path to the file containing the set of records.
+        """
+
+        self.path = archivePath
+        self.indexPath = archivePath + '.index'
+        self.offsets = {}       # record ID -> offset of the current line
+        self.fields = {}        # field -> set of record IDs
+        self.size = 0           # bytes of the archive that are indexed
+        self.garbage = 0        # superseded lines
+        self.indexSize = None   # archive size when the index was written
+        self.stale = False      # the indexed part of the archive was changed
+
+        time1 = time.time()
+        if not self._loadIndex():
+            self._clearIndex()
+        self._indexTail()
+        log.debug('Indexed %s records of %s in %s sec', len(self.offsets), archivePath, time.time() - time1)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, recordID):
+        return recordID in self.offsets
+
+    def _checksum(self, size):
+        """
+        Returns the checksum of the first size bytes of the archive.
+        """
+        checksum = 0
+        with open(self.path, 'rb') as f:
+            while size > 0:
+                data = f.read(min(size, 1 << 20))
+                if not data:
+                    break
+                checksum = zlib.crc32(data, checksum)
+                size -= len(data)
+        return checksum & 0xffffffff
+
+    def _endsWithNewline(self, size):
+        with open(self.path, 'rb') as f:
+            f.seek(size - 1)
+            return f.read(1) == b'\n'
+
+    def _loadIndex(self):
+        if not os.path.isfile(self.indexPath) or not os.path.isfile(self.path):
+            return False
+        try:
+            with open(self.indexPath, 'r') as f:
+                index = json.load(f)
+            if index.get('version') != self.INDEX_VERSION:
+                return False
+            size = index['size']
+            if size > os.path.getsize(self.path) or index['checksum'] != self._checksum(size):
+                log.message('Archive %s was changed, rebuilding index', self.path)
+                return False
+            self.offsets = index['offsets']
+            self.fields = dict((field, set(recordIDs)) for field, recordIDs in index['fields'].items())
+            self.size = size
+            self.garbage = index['garbage']
+            self.indexSize = size
+            return True
+        except Exception:
+            log.warning('Unable to load archive index %s', self.indexPath, exc_info=True)
+            return False
+
+    def _clearIndex(self):
+        self.offsets = {}
+        self.fields = {}
+        self.size = 0
+        self.garbage = 0
+        self.stale = False
+
+    def _rebuildIndex(self):
+        """
+        Index the archive from scratch.
+        """
+        log.message('Archive %s was changed, rebuilding index', self.path)
+        self._clearIndex()
+        self.indexSize = None
+        self._indexTail(False)
+
+    def _indexTail(self, rebuild=True):
+        """
+        Index the records appended to the archive since the index was written.
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.size)
+            offset = self.size
+            for line in f:
+                self._indexLine(line.decode('utf-8').split(), offset)
+                offset += len(line)
+            self.size = offset
+        if self.stale and rebuild:
+            self._rebuildIndex()
+
+    def _indexLine(self, record, offset):
+        if not record:
+            return
+        recordID = record[0]
+        if recordID in self.offsets:
+            self.garbage += 1
+            oldRecord = self._readRecord(recordID, False)
+            if oldRecord is None:
+                # The indexed part of the archive was changed, the fields of
+                # the old record are unknown
+                self.stale = True
+                oldRecord = [recordID]
+            for field in oldRecord[1:]:
+                recordIDs = self.fields.get(field)
+                if recordIDs is not None:
+                    recordIDs.discard(recordID)
+                    if not recordIDs:
+                        del self.fields[field]
+        self.offsets[recordID] = offset
+        for field in record[1:]:
+            self.fields.setdefault(field, set()).add(recordID)
+
+    def _readRecord(self, recordID, rebuild=True):
+        """
+        Returns the record with the specified ID, read at its indexed offset.
+        If the line there is not that record, the archive was changed since
+        it was indexed. The index is then rebuilt if rebuild is set, and
+        *None* is returned if the record is not found.
+        """
+        record = self._readLine(self.offsets[recordID])
+        if record and record[0] == recordID:
+            return record
+        if not rebuild:
+            return None
+        self._rebuildIndex()
+        if recordID not in self.offsets:
+            return None
+        return self._readLine(self.offsets[recordID])
+
+    def _readLine(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return f.readline().decode('utf-8').split()
+
+    def load(self, recordID):
+        """
+        Returns the record with the specified ID as a list of strings, with the
+        record ID in the '0' element, or *None* if it is not found.
+        """
+        if recordID not in self.offsets:
+            return None
+        return self._readRecord(recordID)
+
+    def search(self, field):
+        """
+        Returns the IDs of the records that contain the specified field, in
+        archive order.
+        """
+        recordIDs = self.fields.get(field, ())
+        return sorted(recordIDs, key = lambda recordID: self.offsets[recordID])
+
+    def save(self, recordToSave):
+        """
+        Merge the record with the existing record with the same ID, if any, and
+        append it to the archive.
+        """
+        newRecord = recordToSave.split()
+        recordID = newRecord[0]
+        oldRecord = self._readRecord(recordID) if recordID in self.offsets else None
+        if oldRecord:
+            line = joinRecords(newRecord, oldRecord)
+        else:
+            line = ' '.join(newRecord)
+
+        data = ('%s\n' % line).encode('utf-8')
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            if offset > self.size:
+                # Appended to by someone else, index those records first
+                self._indexTail()
+                offset = self.size
+            if offset > 0 and not self._endsWithNewline(offset):
+                # Terminate the last line, which was written by other means
+                f.write(b'\n')
+                offset += 1
+            f.write(data)
+        self._indexLine(line.split(), offset)
+        self.size = offset + len(data)
+
+        if self.garbage > max(100, len(self.offsets)):
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the archive with only the current line of each record, and
+        write the index.
+        """
+        time1 = time.time()
+        recordIDs = sorted(self.offsets, key = lambda recordID: self.offsets[recordID])
+        with open(self.path, 'rb') as f:
+            data = f.read(self.size)
+        lines = []
+        for recordID in recordIDs:
+            start = self.offsets[recordID]
+            end = data.find(b'\n', start)
+            lines.append(data[start:end if end >= 0 else len(data)].decode('utf-8').strip())
+
+        tmpPath = self.path + '.tmp'
+        offsets = {}
+        offset = 0
+        with open(tmpPath, 'wb') as f:
+            for recordID, line in zip(recordIDs, lines):
+                data = ('%s\n' % line).encode('utf-8')
+                f.write(data)
+                offsets[recordID] = offset
+                offset += len(data)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmpPath, self.path)
+
+        self.offsets = offsets
+        self.size = offset
+        self.garbage = 0
+        self.flush()
+        log.message('Compacted %s records in %s sec', len(offsets), time.time() - time1)
+
+    def flush(self):
+        """
+        Write the index, if records were added since it was last written.
+        """
+        if self.indexSize == self.size:
+            return
+        index = {
+            'version': self.INDEX_VERSION,
+            'size': self.size,
+            'checksum': self._checksum(self.size) if os.path.isfile(self.path) else 0,
+            'garbage': self.garbage,
+            'offsets': self.offsets,
+            'fields': dict((field, sorted(recordIDs)) for field, recordIDs in self.fields.items())
+            }
+        with open(self.indexPath, 'w') as f:
+            json.dump(index, f)
+        self.indexSize = self.size
+
+    def importText(self, textPath):
+        """
+        Save all records of a text archive in this archive.
+        """
+        with open(textPath, 'r') as f:
+            for line in f:
+                if line.split():
+                    self.save(line)
+
+    def exportText(self, textPath):
+        """
+        Write all records to a text archive, one line per record.
+        """
+        recordIDs = sorted(self.offsets, key = lambda recordID: self.offsets[recordID])
+        with open(textPath, 'w') as f:
+            for recordID in recordIDs:
+                record = self._readRecord(recordID)
+                if record:
+                    f.write('%s\n' % ' '.join(record))
+
+
+_archives = {}
+
+def getArchive(archivePath):
+    """
+    Returns the open RecordArchive for the specified path.
+    """
+    archivePath = os.path.abspath(archivePath)
+    try:
+        return _archives[archivePath]
+    except KeyError:
+        archive = _archives[archivePath] = RecordArchive(archivePath)
+        return archive
+
+@atexit.register
+def flushArchives():
+    for archive in list(_archives.values()):
+        try:
+            archive.flush()
+        except Exception:
+            log.warning('Unable to write archive index %s', archive.indexPath, exc_info=True)
+
+
 def loadRecord(archivePath, recordID):
     """
-    This function reads the file specified, searches for the specified record ID
+    This function searches the archive specified for the specified record ID
     and returns that record if found or *None* if not found. 
     The record is returned as a list of strings containing the record ID in the '0' 
     element and successive fields in the following elements.
@@ -118,20 +442,15 @@ def loadRecord(archivePath, recordID):
     """
 
     time1 = time.time()
-    f = open(archivePath)
-    record = None
-    for line in f:
-        if line.find(recordID) != -1:
-            record = line.split()
-            log.message('Found %s fields in %s sec', len(record), time.time() - time1)
-            break
-    f.close()
+    record = getArchive(archivePath).load(recordID)
+    if record:
+        log.message('Found %s fields in %s sec', len(record), time.time() - time1)
     return record
 
 
 def searchRecord(archivePath, field):
     """
-    This function reads the file specified, searches for the specified field
+    This function searches the archive specified for the specified field
     and returns a list of the records that contain that field 
     (ie a list of strings containing recordIDs).
     
@@ -146,21 +465,15 @@ def searchRecord(archivePath, field):
     """
 
     time1 = time.time()
-    f = open(archivePath)
-    recordIDs = []
-    for line in f:
-        if line.find(field) != -1:
-            recordIDs.append(line.split()[0])
-    f.close()
+    recordIDs = getArchive(archivePath).search(field)
     log.message('Found %s records in %s sec', len(recordIDs), time.time() - time1)
     return recordIDs
 
 
 def saveRecord(archivePath, recordToSave):
     """
-    This function searches a file to see if the specified record ID exists, 
-    building and saving a consolidated record if it does and appending a new record to 
-    the end of the file if it doesn't.
+    This function merges the record with the existing record with the same
+    record ID, if any, and appends it to the archive.
     
     Parameters
     ----------
@@ -174,31 +487,7 @@ def saveRecord(archivePath, recordToSave):
 
     time1 = time.time()
     recordID = recordToSave.split()[0]
-    records = []
-    isExistent = None
-    try:
-        f = open(archivePath)
-        i = 0
-        for line in f:
-            if line.find(recordID) != -1:
-                i += 1
-                isExistent = 1
-                oldRecord = line.split()
-                newRecord = recordToSave.split()
-                if oldRecord[0] == recordID:
-                    line = joinRecords(newRecord, oldRecord)
-            records.append(line.strip())
-        f.close()
-    except:
+    if not os.path.exists(archivePath):
         log.message('A new %s archive will be created', archivePath)
-
-    if not isExistent:
-        records.append(recordToSave)
-
-    f = open(archivePath, 'w')
-    for record in records:
-        f.write('%s\n' % record)
-    f.close()
+    getArchive(archivePath).save(recordToSave)
     log.message('Record %s saved in %s sec', recordID, time.time() - time1)
-
-
@@ -23,6 +23,7 @@ TODO
 """
 
 import os
+import json
 import numpy
 import gui3d
 import exportutils
@@ -31,90 +32,36 @@ import mh
 from collections import OrderedDict
 
 import material
+from getpath import getPath, isSubPath
 
 _A7converter = None
 
 
-class CProxyRefVert:
+def fitProxyCoords(refCoords, refVerts, refWeights, offsets):
+    """
+    Coordinates of proxy vertices, each a weighted sum of three reference
+    vertices plus an offset.
 
-    def __init__(self, parent, scale):
-        self._parent = parent
-        self._scale = scale
+    Parameters
+    ----------
 
-
-    def fromSingle(self, words, vnum, proxy):
-        self._exact = True
-        v0 = int(words[0])
-        self._verts = (v0,v0,v0)
-        self._weights = (1,0,0)
-        self._offset = numpy.array((0,0,0), float)
-        self.addProxyVertWeight(proxy, v0, vnum, 1)
-        return self
-
-
-    def fromTriple(self, words, vnum, proxy):
-        self._exact = False
-        v0 = int(words[0])
-        v1 = int(words[1])
-        v2 = int(words[2])
-        w0 = float(words[3])
-        w1 = float(words[4])
-        w2 = float(words[5])
-        if len(words) > 6:
-            d0 = float(words[6])
-            d1 = float(words[7])
-            d2 = float(words[8])
-        else:
-            (d0,d1,d2) = (0,0,0)
-
-        self._verts = (v0,v1,v2)
-        self._weights = (w0,w1,w2)
-        self._offset = numpy.array((d0,d1,d2), float)
-
-        self.addProxyVertWeight(proxy, v0, vnum, w0)
-        self.addProxyVertWeight(proxy, v1, vnum, w1)
-        self.addProxyVertWeight(proxy, v2, vnum, w2)
-        return self
-
-
-    def addProxyVertWeight(self, proxy, v, pv, w):
-        try:
-            proxy.vertWeights[v].append((pv, w))
-        except KeyError:
-            proxy.vertWeights[v] = [(pv,w)]
-        return
-
-    def getHumanVerts(self):
-        return self._verts
-
-    def getWeights(self):
-        return self._weights
-
-    def getOffset(self):
-        return self._offset
-
-    def getCoord(self):
-        rv0,rv1,rv2 = self._verts
-        v0 = self._parent.coord[rv0]
-        v1 = self._parent.coord[rv1]
-        v2 = self._parent.coord[rv2]
-        w0,w1,w2 = self._weights
-        return (w0*v0 + w1*v1 + w2*v2 + self._scale*self._offset)
-
-    def getConvertedCoord(self, converter):
-        rv0,rv1,rv2 = self._verts
-        v0 = converter.refVerts[rv0].getCoord()
-        v1 = converter.refVerts[rv1].getCoord()
-        v2 = converter.refVerts[rv2].getCoord()
-        w0,w1,w2 = self._weights
-        return (w0*v0 + w1*v1 + w2*v2 + self._scale*self._offset)
+    refCoords:
+      *array*. (nRefVerts, 3) coordinates of the reference mesh.
+    refVerts:
+      *array*. (nProxyVerts, 3) indices of the reference vertices.
+    refWeights:
+      *array*. (nProxyVerts, 3) weights of the reference vertices.
+    offsets:
+      *array*. (nProxyVerts, 3) scaled offsets.
+    """
+    return numpy.einsum('ijk,ij->ik', refCoords[refVerts], refWeights) + offsets
 
 
 #
 #    class CProxy
 #
 
-class CProxy:
+class CProxy(object):
     def __init__(self, file, typ, layer):
         name = os.path.splitext(os.path.basename(file))[0]
         self.name = name.capitalize().replace(" ","_")
@@ -124,8 +71,16 @@ class CProxy:
         self.basemesh = "alpha_7"
         self.tags = []
 
-        self.vertWeights = {}       # (proxy-vert, weight) list for each parent vert
-        self.refVerts = []
+        self._vertWeights = None
+        self._refVertIndex = None
+
+        # Per proxy vertex: the reference vertices of the base mesh, their
+        # weights and an offset (scaled with scales)
+        self.refObj = None
+        self.refVerts = numpy.zeros((0,3), dtype=numpy.uint32)
+        self.refWeights = numpy.zeros((0,3), dtype=numpy.float32)
+        self.offsets = numpy.zeros((0,3), dtype=numpy.float32)
+        self.scales = numpy.ones(3, dtype=numpy.float32)
 
         self.xScaleData = None
         self.yScaleData = None
@@ -153,7 +108,8 @@ class CProxy:
         self.texFacesLayers = {}
 
         self.deleteGroups = []
-        self.deleteVerts = None
+        self.deleteVertIdxs = numpy.zeros(0, dtype=numpy.uint32)
+        self.deleteVerts = None     # Mask of deleted base mesh verts, see readProxyFile
 
         self.wire = False
         self.cage = False
@@ -211,12 +167,38 @@ class CProxy:
         return obj.mesh.texture.replace('\\', '/')
 
 
+    @property
+    def vertWeights(self):
+        """
+        (proxy-vert, weight) list for each parent vert, built from the
+        reference vertex arrays on first use.
+        """
+        if self._vertWeights is None:
+            self._vertWeights = {}
+            for pv, (verts, weights) in enumerate(zip(self.refVerts.tolist(), self.refWeights.tolist())):
+                if verts[0] == verts[1] == verts[2]:
+                    # Proxy vertex at a single parent vertex
+                    self._addVertWeight(verts[0], pv, 1)
+                else:
+                    for v,w in zip(verts, weights):
+                        self._addVertWeight(v, pv, w)
+        return self._vertWeights
+
+
+    def _addVertWeight(self, v, pv, w):
+        try:
+            self._vertWeights[v].append((pv, w))
+        except KeyError:
+            self._vertWeights[v] = [(pv,w)]
+
+
     def getCoords(self):
         converter = self.getConverter()
         if converter:
-            return [refVert.getConvertedCoord(converter) for refVert in self.refVerts]
+            refCoords = converter.getCoords()
         else:
-            return [refVert.getCoord() for refVert in self.refVerts]
+            refCoords = self.refObj.coord
+        return fitProxyCoords(refCoords, self.refVerts, self.refWeights, self.scales * self.offsets)
 
 
     def update(self, obj):
@@ -251,8 +233,7 @@ class CProxy:
 
         converter = self.getConverter()
         if converter:
-            co1 = converter.refVerts[vn1].getCoord()
-            co2 = converter.refVerts[vn2].getCoord()
+            co1, co2 = converter.getCoords()[[vn1, vn2]]
         else:
             co1 = obj.coord[vn1]
             co2 = obj.coord[vn2]
@@ -261,48 +242,130 @@ class CProxy:
         return num/den
 
 
+    def getRefVertIndex(self):
+        """
+        Sparse matrix from parent verts to proxy verts, in compressed rows by
+        parent vertex: (indptr, proxy verts, weights). The entries of parent
+        vertex v are indptr[v]:indptr[v+1].
+        """
+        if self._refVertIndex is None:
+            nProxyVerts = len(self.refVerts)
+            refVerts = self.refVerts.astype(numpy.intp)
+            weights = self.refWeights.astype(float)
+            mask = numpy.ones(refVerts.shape, dtype=bool)
+            # Proxy vertices at a single parent vertex
+            single = (refVerts[:,0] == refVerts[:,1]) & (refVerts[:,1] == refVerts[:,2])
+            mask[single,1:] = False
+            weights[single,0] = 1
+
+            verts = refVerts[mask]
+            pverts = numpy.repeat(numpy.arange(nProxyVerts), 3).reshape(-1,3)[mask]
+            weights = weights[mask]
+            order = numpy.argsort(verts, kind='mergesort')
+            verts = verts[order]
+
+            nVerts = verts[-1] + 1 if len(verts) else 0
+            indptr = numpy.searchsorted(verts, numpy.arange(nVerts+1))
+            self._refVertIndex = (indptr, pverts[order], weights[order])
+        return self._refVertIndex
+
+
+    def getRefEntries(self, verts):
+        """
+        All (proxy vert, weight) entries of the given parent verts.
+        Returns (src, pverts, weights), with src the position in verts of the
+        parent vertex of each entry.
+        """
+        indptr, pverts, weights = self.getRefVertIndex()
+        verts = numpy.asarray(verts, dtype=numpy.intp).reshape(-1)
+        verts = numpy.where(verts < len(indptr) - 1, verts, len(indptr) - 1)
+        starts = indptr[verts]
+        counts = indptr[numpy.minimum(verts + 1, len(indptr) - 1)] - starts
+        src = numpy.repeat(numpy.arange(len(verts)), counts)
+        idx = numpy.arange(len(src)) + numpy.repeat(starts - (numpy.cumsum(counts) - counts), counts)
+        return src, pverts[idx], weights[idx]
+
+
+    def transferVertexGroups(self, groups):
+        """
+        Transfer vertex groups (for example bone weights) of the parent mesh
+        to the proxy.
+
+        Parameters
+        ----------
+
+        groups:
+          *dict*. (verts, weights) arrays for each group name.
+
+        Returns an OrderedDict with (verts, weights) arrays for each group
+        that influences the proxy, in the order of groups.
+        """
+        names = list(groups.keys())
+        result = OrderedDict()
+        if not names:
+            return result
+
+        verts = []
+        weights = []
+        for (vs, ws) in [groups[name] for name in names]:
+            verts.append(numpy.asarray(vs, dtype=numpy.intp).reshape(-1))
+            weights.append(numpy.asarray(ws, dtype=float).reshape(-1))
+        gidx = numpy.repeat(numpy.arange(len(names)), [len(vs) for vs in verts])
+        verts = numpy.concatenate(verts)
+        weights = numpy.concatenate(weights)
+
+        src, pverts, pweights = self.getRefEntries(verts)
+        pweights = pweights * weights[src]
+        keep = (pweights > 1e-4)
+
+        # Sum the entries per group and proxy vertex
+        nProxyVerts = len(self.refVerts)
+        keys, inv = numpy.unique(gidx[src[keep]] * nProxyVerts + pverts[keep], return_inverse=True)
+        sums = numpy.bincount(inv.reshape(-1), pweights[keep])
+        keep = (sums > 1e-4)
+        keys = keys[keep]
+        sums = sums[keep]
+
+        gidx = keys // nProxyVerts
+        bounds = numpy.searchsorted(gidx, numpy.arange(len(names)+1))
+        for n,name in enumerate(names):
+            start, end = bounds[n], bounds[n+1]
+            if start < end:
+                result[name] = (keys[start:end] % nProxyVerts, sums[start:end])
+        return result
+
+
     def getWeights(self, rawWeights):
         weights = OrderedDict()
         if not rawWeights:
             return weights
+        groups = OrderedDict()
         for key in list(rawWeights.keys()):
-            vgroup = []
-            empty = True
-            if key == "Spine1":
-                print(("RW", rawWeights[key]))
-                print(("VW", list(self.vertWeights.items())))
-            for (v,wt) in rawWeights[key]:
-                try:
-                    vlist = self.vertWeights[v]
-                except KeyError:
-                    vlist = []
-                for (pv, w) in vlist:
-                    pw = w*wt
-                    if (pw > 1e-4):
-                        vgroup.append((pv, pw))
-                        empty = False
-            if key == "Spine1":
-                print(("VL", vlist))
-            if not empty:
-                weights[key] = self.fixVertexGroup(vgroup)
+            vgroup = numpy.array(rawWeights[key], dtype=float).reshape(-1,2)
+            groups[key] = (vgroup[:,0].astype(numpy.intp), vgroup[:,1])
+        for key, (pverts, pweights) in list(self.transferVertexGroups(groups).items()):
+            weights[key] = list(zip(pverts.tolist(), pweights.tolist()))
         return weights
 
 
-    def fixVertexGroup(self, vgroup):
-        fixedVGroup = []
-        vgroup.sort()
-        pv = -1
-        while vgroup:
-            (pv0, wt0) = vgroup.pop()
-            if pv0 == pv:
-                wt += wt0
-            else:
-                if pv >= 0 and wt > 1e-4:
-                    fixedVGroup.append((pv, wt))
-                (pv, wt) = (pv0, wt0)
-        if pv >= 0 and wt > 1e-4:
-            fixedVGroup.append((pv, wt))
-        return fixedVGroup
+    def transferShape(self, verts, offsets, scale=1.0):
+        """
+        Transfer a shape (offsets of parent verts) to the proxy.
+        Returns (verts, offsets) arrays of the moved proxy vertices.
+        """
+        pverts, poffsets = self._transferShape(verts, offsets, scale)
+        keep = (numpy.sum(poffsets * poffsets, axis=1) > 1e-8)
+        return pverts[keep], poffsets[keep]
+
+
+    def _transferShape(self, verts, offsets, scale):
+        offsets = numpy.asarray(offsets, dtype=float).reshape(-1,3)
+        src, pverts, pweights = self.getRefEntries(verts)
+        pverts, inv = numpy.unique(pverts, return_inverse=True)
+        inv = inv.reshape(-1)
+        poffsets = (scale * pweights)[:,None] * offsets[src]
+        poffsets = numpy.column_stack([numpy.bincount(inv, poffsets[:,i], minlength=len(pverts)) for i in range(3)])
+        return pverts, poffsets
 
 
     def getShapes(self, rawShapes, scale):
@@ -310,49 +373,169 @@ class CProxy:
             return []
         shapes = []
         for (key, rawShape) in rawShapes:
-            shape = []
-            for (v,dr) in list(rawShape.items()):
-                (dx,dy,dz) = dr
-                try:
-                    vlist = self.vertWeights[v]
-                except KeyError:
-                    vlist = []
-                for (pv, w) in vlist:
-                    shape.append((pv, scale*w*dx, scale*w*dy, scale*w*dz))
-            if shape != []:
-                fixedShape = self.fixShape(shape)
-                shapes.append((key,fixedShape))
+            verts = list(rawShape.keys())
+            pverts, poffsets = self._transferShape(verts, [rawShape[v] for v in verts], scale)
+            if len(pverts) > 0:
+                keep = (numpy.sum(poffsets * poffsets, axis=1) > 1e-8)
+                shapes.append((key, dict(zip(pverts[keep].tolist(), [tuple(dr) for dr in poffsets[keep].tolist()]))))
         return shapes
 
-
-    def fixShape(self, shape):
-        fixedShape = {}
-        shape.sort()
-        pv = -1
-        for (pv0, dx0, dy0, dz0) in shape:
-            if pv0 == pv:
-                dx += dx0
-                dy += dy0
-                dz += dz0
-            else:
-                if pv >= 0 and (dx*dx + dy*dy + dz*dz) > 1e-8:
-                    fixedShape[pv] = (dx, dy, dz)
-                (pv, dx, dy, dz) = (pv0, dx0, dy0, dz0)
-        if pv >= 0 and (dx*dx + dy*dy + dz*dz) > 1e-8:
-            fixedShape[pv] = (dx, dy, dz)
-        return fixedShape
-
 #
-#    readProxyFile(obj, file, evalOnLoad=False, scale=1.0):
+#    readProxyFile(obj, file, type="Clothes", layer=4):
 #
 
+def readProxyFile(obj, filepath, type="Clothes", layer=4):
+    """
+    Load a proxy file and fit it to the base mesh obj.
+    """
+    if not isinstance(filepath, str):
+        raise NameError("Bug readProxyFile %s" % filepath)
+
+    proxy = loadProxyFile(filepath, type, layer)
+    if proxy is None:
+        return None
+
+    proxy.refObj = obj
+    proxy.deleteVerts = numpy.zeros(len(obj.coord), bool)
+    proxy.deleteVerts[proxy.deleteVertIdxs] = True
+    for index, data in enumerate([proxy.xScaleData, proxy.yScaleData, proxy.zScaleData]):
+        proxy.scales[index] = proxy.getScale(data, obj, index)
+
+    return proxy
+
+
+def loadProxyFile(filepath, type="Clothes", layer=4):
+    """
+    Load a proxy file from its compiled .mhpxy file if it is up to date,
+    otherwise parse it and compile it, like files3d.loadMesh does for meshes.
+    The returned proxy is not yet fitted to a base mesh, see readProxyFile.
+    """
+    compiledPath = getCompiledPath(filepath)
+    try:
+        if not os.path.isfile(compiledPath):
+            log.debug('compiled proxy missing: %s', compiledPath)
+            raise RuntimeError()
+        if os.path.isfile(filepath) and os.path.getmtime(filepath) > os.path.getmtime(compiledPath):
+            log.debug('compiled proxy out of date: %s', compiledPath)
+            raise RuntimeError()
+        return loadBinaryProxy(compiledPath, filepath, type, layer)
+    except:
+        proxy = parseProxyFile(filepath, type, layer)
+        if proxy is None:
+            return None
+        if isSubPath(compiledPath, getPath('')):
+            # Only write compiled proxies to user data path
+            try:
+                saveBinaryProxy(proxy, compiledPath)
+            except Exception:
+                log.notice('unable to save compiled proxy: %s', compiledPath)
+        else:
+            log.debug('Not writing compiled proxies to system paths (%s).', compiledPath)
+        return proxy
+
+
+def getCompiledPath(filepath):
+    return os.path.splitext(filepath)[0] + '.mhpxy'
+
+
+# Version of the compiled proxy format, compiled files with another version
+# are recompiled
+COMPILED_PROXY_VERSION = 1
+
+# Proxy attributes stored in the header of compiled proxy files
+_compiledAttributes = ['name', 'uuid', 'basemesh', 'tags', 'z_depth', 'weights',
+    'useBaseMaterials', 'cull', 'transparent', 'xScaleData', 'yScaleData', 'zScaleData',
+    'deleteGroups', 'maskLayer', 'textureLayer', 'clothings', 'transparencies',
+    'wire', 'cage', 'modifiers', 'shapekeys']
+
+# File attributes, stored relative to the proxy file
+_compiledFileAttributes = ['obj_file', 'material_file', 'mhxMaterial_file']
+
+
+def saveBinaryProxy(proxy, path):
+    """
+    Write the parsed proxy file data of proxy to a compiled .mhpxy file.
+    """
+    folder = os.path.dirname(proxy.file)
+    header = dict((attr, getattr(proxy, attr)) for attr in _compiledAttributes)
+    header['version'] = COMPILED_PROXY_VERSION
+    for attr in _compiledFileAttributes:
+        filepath = getattr(proxy, attr)
+        header[attr] = os.path.relpath(filepath, folder) if filepath else None
+    header['uvLayers'] = [(layer, os.path.relpath(filepath, folder)) for layer, filepath in proxy.uvLayers.items()]
+
+    with open(path, 'wb') as fp:
+        numpy.savez(fp,
+            header = numpy.array(json.dumps(header)),
+            refVerts = proxy.refVerts,
+            refWeights = proxy.refWeights,
+            offsets = proxy.offsets,
+            deleteVertIdxs = proxy.deleteVertIdxs)
+
+
+def _loadCompiledHeader(npzfile):
+    header = json.loads(str(npzfile['header']))
+    if header.get('version') != COMPILED_PROXY_VERSION:
+        raise RuntimeError('Compiled proxy version %s is not supported' % header.get('version'))
+    return header
+
+
+def loadBinaryProxy(path, filepath, type="Clothes", layer=4):
+    """
+    Create a proxy from compiled .mhpxy file path, compiled from proxy file
+    filepath.
+    """
+    npzfile = numpy.load(path)
+    header = _loadCompiledHeader(npzfile)
+
+    proxy = CProxy(filepath, type, layer)
+    folder = os.path.realpath(os.path.expanduser(os.path.dirname(filepath)))
+
+    for attr in _compiledAttributes:
+        setattr(proxy, attr, header[attr])
+    for attr in ['xScaleData', 'yScaleData', 'zScaleData']:
+        if getattr(proxy, attr):
+            setattr(proxy, attr, tuple(getattr(proxy, attr)))
+    proxy.clothings = [tuple(piece) for piece in proxy.clothings]
+    for attr in _compiledFileAttributes:
+        if header[attr]:
+            setattr(proxy, attr, os.path.join(folder, header[attr]))
+    proxy.uvLayers = dict((layer, os.path.join(folder, uvFile)) for layer, uvFile in header['uvLayers'])
+    if proxy.material_file:
+        proxy.material.fromFile(proxy.material_file)
+
+    proxy.refVerts = npzfile['refVerts']
+    proxy.refWeights = npzfile['refWeights']
+    proxy.offsets = npzfile['offsets']
+    proxy.deleteVertIdxs = npzfile['deleteVertIdxs']
+
+    return proxy
+
+
+def readCompiledTags(filepath):
+    """
+    Tags of a proxy file, read from its compiled file if it is up to date.
+    Returns None if there is no valid compiled file.
+    """
+    compiledPath = getCompiledPath(filepath)
+    try:
+        if not os.path.isfile(compiledPath):
+            return None
+        if os.path.isfile(filepath) and os.path.getmtime(filepath) > os.path.getmtime(compiledPath):
+            return None
+        return set(_loadCompiledHeader(numpy.load(compiledPath))['tags'])
+    except Exception:
+        return None
+
+
 doRefVerts = 1
 doWeights = 2
 doDeleteVerts = 3
 
-def readProxyFile(obj, filepath, type="Clothes", layer=4):
-    if not isinstance(filepath, str):
-        raise NameError("Bug readProxyFile %s" % filepath)
+def parseProxyFile(filepath, type="Clothes", layer=4):
+    """
+    Parse a proxy file (.mhclo or .proxy).
+    """
     folder = os.path.realpath(os.path.expanduser(os.path.dirname(filepath)))
     objfile = None
 
@@ -364,13 +547,14 @@ def readProxyFile(obj, filepath, type="Clothes", layer=4):
 
     tails = {}
     proxy = CProxy(filepath, type, layer)
-    proxy.deleteVerts = numpy.zeros(len(obj.coord), bool)
 
     useProjection = True
     ignoreOffset = False
-    scales = numpy.array((1.0,1.0,1.0), float)
+    refVerts = []
+    refWeights = []
+    offsets = []
+    deleteVerts = []
     status = 0
-    vnum = 0
     for line in fp:
         words = line.split()
 
@@ -440,13 +624,10 @@ def readProxyFile(obj, filepath, type="Clothes", layer=4):
 
         elif key == 'x_scale':
             proxy.xScaleData = getScaleData(words)
-            scales[0] = proxy.getScale(proxy.xScaleData, obj, 0)
         elif key == 'y_scale':
             proxy.yScaleData = getScaleData(words)
-            scales[1] = proxy.getScale(proxy.yScaleData, obj, 1)
         elif key == 'z_scale':
             proxy.zScaleData = getScaleData(words)
-            scales[2] = proxy.getScale(proxy.zScaleData, obj, 2)
         elif key == 'use_projection':
             useProjection = int(words[1])
         elif key == 'ignoreOffset':
@@ -454,7 +635,7 @@ def readProxyFile(obj, filepath, type="Clothes", layer=4):
         elif key == 'delete':
             proxy.deleteGroups.append(words[1])
         elif key == 'delete_connected':
-            selectConnected(proxy, obj, int(words[1]))
+            log.warning('delete_connected is not supported, found in proxy file %s', filepath)
 
         elif key == 'mask_uv_layer':
             if len(words) > 1:
@@ -502,13 +683,20 @@ def readProxyFile(obj, filepath, type="Clothes", layer=4):
 
 
         elif status == doRefVerts:
-            refVert = CProxyRefVert(obj, scales)
-            proxy.refVerts.append(refVert)
             if len(words) == 1:
-                refVert.fromSingle(words, vnum, proxy)
+                v0 = int(words[0])
+                refVerts.append((v0,v0,v0))
+                refWeights.append((1,0,0))
+                offsets.append((0,0,0))
             else:
-                refVert.fromTriple(words, vnum, proxy)
-            vnum += 1
+                verts = (int(words[0]), int(words[1]), int(words[2]))
+                weights = (float(words[3]), float(words[4]), float(words[5]))
+                if len(words) > 6:
+                    offsets.append((float(words[6]), float(words[7]), float(words[8])))
+                else:
+                    offsets.append((0,0,0))
+                refVerts.append(verts)
+                refWeights.append(weights)
 
         elif status == doWeights:
             v = int(words[0])
@@ -523,19 +711,25 @@ def readProxyFile(obj, filepath, type="Clothes", layer=4):
                 else:
                     v1 = int(v)
                     if sequence:
-                        for vn in range(v0,v1+1):
-                            proxy.deleteVerts[vn] = True
+                        deleteVerts.extend(range(v0,v1+1))
                         sequence = False
                     else:
-                        proxy.deleteVerts[v1] = True
+                        deleteVerts.append(v1)
                     v0 = v1
 
         else:
             log.warning('Unknown keyword %s found in proxy file %s', key, filepath)
 
+    if refVerts:
+        proxy.refVerts = numpy.array(refVerts, dtype=numpy.uint32)
+        proxy.refWeights = numpy.array(refWeights, dtype=numpy.float32)
+        proxy.offsets = numpy.array(offsets, dtype=numpy.float32)
+    proxy.deleteVertIdxs = numpy.unique(numpy.array(deleteVerts, dtype=numpy.uint32))
+
     return proxy
 
 
+
 def getFileName(folder, file, suffix):
     (name, ext) = os.path.split(file)
     if ext:
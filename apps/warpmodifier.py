@@ -126,7 +126,7 @@ class WarpModifier (humanmodifier.SimpleModifier):
         self.bodypart = bodypart
         self.slider = None
         self.refTargets = {}
-        self.refTargetVerts = {}
+        self.refTargetVerts = emptyTarget()
         self.modtype = modtype
 
         self.fallback = None
@@ -292,19 +292,26 @@ class WarpModifier (humanmodifier.SimpleModifier):
 
 
     def compileWarpTarget(self, human):
-        global _warpGlobals
         log.message("COMPWARP %s", self)
-        landmarks = _warpGlobals.getLandMarks(self.bodypart)
+        srcCharCoord,trgCharCoord = self.getCharacterCoords(human)
+        shape = self.warpRefTarget(human, srcCharCoord, trgCharCoord)
+        log.message("...done")
+        return shape
+
 
+    def getCharacterCoords(self, human):
+        """
+        Vertex locations of the base character the reference targets were made
+        for, and of the current character.
+        """
         obj = human.meshData
         srcCharCoord = obj.orig_coord.copy()
         trgCharCoord = obj.orig_coord.copy()
 
         for trgpath,value in list(human.targetsDetailStack.items()):
-            try:
-                target = algos3d.targetBuffer[trgpath]
-            except KeyError:
+            if trgpath in algos3d.warpTargetBuffer:
                 continue
+            target = algos3d.getTarget(obj, trgpath)
             srcVerts = np.s_[...]
             dstVerts = target.verts[srcVerts]
             data = value * target.data[srcVerts]
@@ -313,14 +320,18 @@ class WarpModifier (humanmodifier.SimpleModifier):
             if trgpath in list(self.bases.keys()):
                 srcCharCoord[dstVerts] += data
 
+        return srcCharCoord, trgCharCoord
+
+
+    def warpRefTarget(self, human, srcCharCoord, trgCharCoord):
+        global _warpGlobals
+        landmarks = _warpGlobals.getLandMarks(self.bodypart)
         self.updateRefTarget(human)
 
-        if self.refTargetVerts:
-            shape = warp.warp_target(self.refTargetVerts, srcCharCoord, trgCharCoord, landmarks)
+        if len(self.refTargetVerts[0]):
+            return warp.warp_target(self.refTargetVerts, srcCharCoord, trgCharCoord, landmarks)
         else:
-            shape = {}
-        log.message("...done")
-        return shape
+            return {}
 
 
     def updateRefTarget(self, human):
@@ -348,7 +359,7 @@ class WarpModifier (humanmodifier.SimpleModifier):
 
 
     def makeRefTarget(self, human):
-        self.refTargetVerts = {}
+        refTargets = []
         madeRefTarget = False
 
         factors = {}
@@ -370,7 +381,8 @@ class WarpModifier (humanmodifier.SimpleModifier):
                 madeRefTarget = True
                 verts = self.getRefTargetVertsInsist(target.path)
                 if verts is not None:
-                    addVerts(self.refTargetVerts, cval, verts)
+                    refTargets.append((cval,) + verts)
+        self.refTargetVerts = algos3d.blendTargetData(refTargets)
         return madeRefTarget
 
 
@@ -434,56 +446,61 @@ def compileWarpTarget(template, fallback, human, bodypart):
     mod = WarpModifier(template, bodypart, fallback)
     return mod.compileWarpTarget(human)
 
+
+def compileWarpTargets(templates, fallback, human, bodypart):
+    """
+    Compile several warp targets of the same modifier type and body part.
+    The characters and the warp field are set up once, and the reference
+    targets of all templates are warped together.
+    """
+    global _warpGlobals
+    if not templates:
+        return []
+
+    mods = [WarpModifier(template, bodypart, fallback) for template in templates]
+    log.message("COMPWARP %d targets %s", len(mods), fallback)
+    # The base characters only depend on the modifier type
+    srcCharCoord,trgCharCoord = mods[0].getCharacterCoords(human)
+
+    for mod in mods:
+        mod.updateRefTarget(human)
+    morphs = [mod.refTargetVerts for mod in mods]
+    landmarks = _warpGlobals.getLandMarks(bodypart)
+    shapes = warp.warp_targets(morphs, srcCharCoord, trgCharCoord, landmarks)
+    log.message("...done")
+    return shapes
+
 #----------------------------------------------------------
 #   Read target
 #----------------------------------------------------------
 
 def readTarget(filepath):
+    """
+    Vertex indices and displacements of a target as (verts, data) arrays.
+    """
 
     words = filepath.split("-")
     if (words[0] == mh.getSysDataPath("targets/macrodetails/universal") and
         words[-2] == "averagemuscle" and
         words[-1] == "averageweight.target"):
-        return {}
-
-    try:
-        fp = open(filepath, "r")
-    except:
-        fp = None
+        return emptyTarget()
 
-    if fp is None:
-        filepath1 = filepath.replace("-averagemuscle", "").replace("-averageweight", "")
+    filepath1 = filepath.replace("-averagemuscle", "").replace("-averageweight", "")
+    for path in [filepath, filepath1]:
         try:
-            fp = open(filepath1, "r")
-        except:
-            fp = None
-
-    if fp:
-        target = {}
-        for line in fp:
-            words = line.split()
-            if len(words) >= 4 and words[0][0] != '#':
-                n = int(words[0])
-                if n < meshstat.numberOfVertices:
-                    target[n] = np.array([float(words[1]), float(words[2]), float(words[3])])
-        fp.close()
-        return target
-    else:
-        log.message("Found neither %s nor %s" % (filepath, filepath1))
-        halt
-        return None
+            verts,data = algos3d.loadTargetData(path)
+        except (IOError, OSError):
+            continue
+        mask = (verts < meshstat.numberOfVertices)
+        return verts[mask], data[mask]
 
-#----------------------------------------------------------
-#   For testing np
-#----------------------------------------------------------
+    log.message("Found neither %s nor %s" % (filepath, filepath1))
+    halt
+    return None
 
-def addVerts(targetVerts, cval, verts):
-    for n,v in list(verts.items()):
-        dr = cval*v
-        try:
-            targetVerts[n] += dr
-        except KeyError:
-            targetVerts[n] = dr
+
+def emptyTarget():
+    return np.zeros(0, dtype=np.uint32), np.zeros((0,3), dtype=np.float32)
 
 #----------------------------------------------------------
 #   Global warp data
@@ -19,16 +19,17 @@
 Abstract
 --------
 
-Standalone script to compile all obj mesh files into binary npz files for faster
-loading.
+Standalone script to compile all obj mesh files into binary npz files, and all
+proxy files (mhclo and proxy) into binary mhpxy files for faster loading.
 """
 
 import sys
-sys.path = ["./core", "./lib", "./shared"] + sys.path
+sys.path = ["./core", "./lib", "./shared", "./apps"] + sys.path
 import os
 import fnmatch
 import module3d
 import files3d
+import mh2proxy
 from getpath import isSubPath
 
 def getAllFiles(rootPath, filterStrArr):
@@ -79,12 +80,29 @@ def compileMesh(path):
         
     return True
 
+def compileProxy(path):
+    try:
+        proxy = mh2proxy.parseProxyFile(path)
+        if proxy is None:
+            return False
+        mh2proxy.saveBinaryProxy(proxy, mh2proxy.getCompiledPath(path))
+    except:
+        print(('Unable to save compiled proxy for file %s' % path))
+        return False
+
+    return True
+
 
 if __name__ == '__main__':
-    allFiles = getAllFiles('data', ['*.obj'])
+    allFiles = getAllFiles('data', ['*.obj', '*.mhclo', '*.proxy'])
     allOBJs = allFiles[0]
     for (i, path) in enumerate(allOBJs):
         compileMesh(path)
         print(("[%.0f%% done] converted mesh %s" % (100*(float(i)/float(len(allOBJs))), path)))
 
+    allProxies = allFiles[1] + allFiles[2]
+    for (i, path) in enumerate(allProxies):
+        compileProxy(path)
+        print(("[%.0f%% done] converted proxy %s" % (100*(float(i)/float(len(allProxies))), path)))
+
     print("All done.")
@@ -45,12 +45,12 @@ def getFiles(root, filenames, filterStr):
     return foundFiles
 
 
-if __name__ == '__main__':
+def compileArchive(allTargets):
+    """
+    Write all targets to one compressed numpy archive (data/targets.npz).
+    """
     obj = algos3d.Target(None, None)
-    allFiles = getAllFiles('data', ['*.target', '*.png'])
     with zipfile.ZipFile('data/targets.npz', mode='w', compression=zipfile.ZIP_DEFLATED) as zip:
-        allTargets = allFiles[0]
-        print((len(allFiles)))
         for (i, path) in enumerate(allTargets):
             try:
                 obj._load_text(path)
@@ -63,6 +63,33 @@ if __name__ == '__main__':
             except Exception as e:
                 print(('error converting target %s' % path))
 
+def compileMmapArchive(allTargets):
+    """
+    Write all targets to one uncompressed, memory mappable archive
+    (data/targets.bin), which is preferred over targets.npz when loading.
+    """
+    obj = algos3d.Target(None, None)
+    targets = []
+    for (i, path) in enumerate(allTargets):
+        try:
+            obj._load_text(path)
+            name = os.path.splitext(path.replace('\\', '/'))[0]
+            targets.append((name, obj.verts, obj.data))
+            print(("[%.0f%% done] converted target %s" % (100*(float(i)/float(len(allTargets))), path)))
+        except Exception as e:
+            print(('error converting target %s' % path))
+    algos3d.TargetArchive.save('data/targets.bin', targets)
+
+
+if __name__ == '__main__':
+    allFiles = getAllFiles('data', ['*.target', '*.png'])
+    allTargets = allFiles[0]
+    print((len(allFiles)))
+    if '--mmap' in sys.argv[1:]:
+        compileMmapArchive(allTargets)
+    else:
+        compileArchive(allTargets)
+
     print("Writing images list")
     with open('data/images.list', 'w') as f:
         allImages = allFiles[1]
@@ -43,14 +43,241 @@ algorithms will be coded. For example:
 __docformat__ = 'restructuredtext'
 
 import os
+import json
+import struct
+from collections import OrderedDict
 import numpy as np
 import log
 import mh
 
-targetBuffer = {}
+
+class TargetCache:
+
+    """
+    This class is a bounded cache of loaded targets, indexed by target path.
+    When the memory used by the cached targets exceeds the byte budget, the
+    least recently used targets are evicted. Pinned targets are never
+    evicted: the targets in the detail stack of a human, the macro targets
+    when they are preloaded, and targets that exist only in memory. Pins are
+    counted, a target stays pinned until it is unpinned as often as it was
+    pinned. Arrays that are memory mapped from the target archive are shared
+    between processes and do not count toward the budget.
+    """
+
+    def __init__(self, budget=None):
+        """
+        This method initializes an instance of the TargetCache class.
+
+        Parameters
+        ----------
+
+        budget:
+            *int*. The maximum number of bytes used by the cached targets,
+            None for an unbounded cache.
+        """
+
+        self.budget = budget
+        self.entries = OrderedDict()    # target path -> (target, nbytes)
+        self.pinned = {}                # target path -> pin count
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _getSize(target):
+        nbytes = 0
+        for attr in ('verts', 'data', 'faces'):
+            array = getattr(target, attr, None)
+            if isinstance(array, np.ndarray) and not isinstance(array, np.memmap):
+                nbytes += array.nbytes
+        return nbytes
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, targetPath):
+        return targetPath in self.entries
+
+    def __getitem__(self, targetPath):
+        target, nbytes = self.entries[targetPath]
+        self.entries.move_to_end(targetPath)
+        return target
+
+    def __setitem__(self, targetPath, target):
+        if targetPath in self.entries:
+            self.nbytes -= self.entries[targetPath][1]
+        nbytes = self._getSize(target)
+        self.entries[targetPath] = (target, nbytes)
+        self.entries.move_to_end(targetPath)
+        self.nbytes += nbytes
+        self.evict(keep=targetPath)
+
+    def __delitem__(self, targetPath):
+        target, nbytes = self.entries.pop(targetPath)
+        self.nbytes -= nbytes
+
+    def get(self, targetPath):
+        """
+        Returns the cached target, or None if it is not in the cache.
+        Updates the hit and miss counters.
+        """
+        try:
+            target = self[targetPath]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return target
+
+    def pin(self, targetPath):
+        self.pinned[targetPath] = self.pinned.get(targetPath, 0) + 1
+
+    def unpin(self, targetPath):
+        count = self.pinned.get(targetPath, 0) - 1
+        if count > 0:
+            self.pinned[targetPath] = count
+        else:
+            self.pinned.pop(targetPath, None)
+            self.evict()
+
+    def setBudget(self, budget):
+        self.budget = budget
+        self.evict()
+
+    def evict(self, keep=None):
+        """
+        Evict least recently used targets until the budget is respected.
+        """
+        if self.budget is None or self.nbytes <= self.budget:
+            return
+        for targetPath in list(self.entries.keys()):
+            if self.nbytes <= self.budget:
+                break
+            if targetPath in self.pinned or targetPath == keep:
+                continue
+            del self[targetPath]
+            self.evictions += 1
+
+    def clear(self):
+        # Pins are kept, they belong to the users of the targets
+        self.entries.clear()
+        self.nbytes = 0
+
+    def getStats(self):
+        return {
+            'targets': len(self.entries),
+            'pinned': len(self.pinned),
+            'bytes': self.nbytes,
+            'budget': self.budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+            }
+
+    def logStats(self):
+        log.message('target cache: %(targets)d targets (%(pinned)d pinned), %(bytes)d bytes (budget %(budget)s), '
+                    '%(hits)d hits, %(misses)d misses, %(evictions)d evictions', self.getStats())
+
+
+targetBuffer = TargetCache()
 warpTargetBuffer = {}
 
 
+class TargetArchive:
+
+    """
+    This class gives access to an uncompressed target archive. The archive
+    is one flat binary blob preceded by a header that maps each target name
+    to the offset, shape and dtype of its index and vector arrays. The blob
+    is opened with numpy.memmap, so targets are loaded without copying and
+    the pages are shared between processes.
+    """
+
+    MAGIC = b'MHTARGET'
+    ALIGN = 16
+
+    def __init__(self, path):
+        """
+        This method initializes an instance of the TargetArchive class.
+        Only the header is read, the arrays are mapped on first use.
+
+        Parameters
+        ----------
+
+        path:
+            *string*. The file system path of the archive.
+        """
+
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise RuntimeError('%s is not a target archive' % path)
+            size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(size).decode('utf-8'))
+        self.base = self._align(len(self.MAGIC) + 8 + size)
+        self.index = header['targets']
+        self.buffer = None
+
+    @classmethod
+    def _align(cls, offset):
+        return (offset + cls.ALIGN - 1) // cls.ALIGN * cls.ALIGN
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return list(self.index.keys())
+
+    def _array(self, entry):
+        offset, shape, dtype = entry
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        start = self.base + offset
+        return self.buffer[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+
+    def get(self, name):
+        """
+        Returns the index and vector arrays of the named target, as read-only
+        views on the memory mapped archive.
+        """
+        entry = self.index[name]
+        if self.buffer is None:
+            self.buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+        return self._array(entry['index']), self._array(entry['vector'])
+
+    @classmethod
+    def save(cls, path, targets):
+        """
+        Write an archive from a sequence of (name, verts, data) tuples.
+        Indices are stored as uint32 and vectors as float32, so that they can
+        be used without conversion.
+        """
+        index = {}
+        arrays = []
+        offset = 0
+        for name, verts, data in targets:
+            entry = {}
+            for key, array in (('index', np.ascontiguousarray(verts, dtype='<u4')),
+                               ('vector', np.ascontiguousarray(data, dtype='<f4'))):
+                entry[key] = (offset, array.shape, array.dtype.str)
+                arrays.append((offset, array))
+                offset = cls._align(offset + array.nbytes)
+            index[name] = entry
+
+        header = json.dumps({'version': 1, 'targets': index}).encode('utf-8')
+        base = cls._align(len(cls.MAGIC) + 8 + len(header))
+
+        with open(path, 'wb') as f:
+            f.write(cls.MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for offset, array in arrays:
+                f.write(b'\0' * (base + offset - f.tell()))
+                f.write(array.tobytes())
+
+
 class Target:
 
     """
@@ -90,6 +317,7 @@ class Target:
     dtype = [('index','u4'),('vector','(3,)f4')]
     npzfile = None
     npztime = None
+    archive = None
 
     def _load_text(self, name):
         data = []
@@ -106,6 +334,17 @@ class Target:
         self.verts = raw['index']
         self.data = raw['vector']
 
+    def _load_mmap_archive(self, name):
+        name = name.replace('\\', '/')
+        bname = os.path.splitext(name)[0]
+        if os.path.isfile(name) and Target.archive.mtime < os.path.getmtime(name):
+            log.message('compiled file newer than archive: %s', name)
+            raise RuntimeError()
+        if bname not in Target.archive:
+            log.message('compiled file missing: %s', bname)
+            raise RuntimeError()
+        self.verts, self.data = Target.archive.get(bname)
+
     def _load_binary_archive(self, name):
         name = name.replace('\\', '/')
         bname = os.path.splitext(name)[0]
@@ -143,6 +382,18 @@ class Target:
         self.data = np.load(vname) * 1e-3
 
     def _load_binary(self, name):
+        if Target.archive is None:
+            try:
+                Target.archive = TargetArchive(mh.getSysDataPath('targets.bin'))
+            except:
+                log.message('no uncompressed targets found')
+                Target.archive = False
+        if Target.archive:
+            try:
+                self._load_mmap_archive(name)
+                return
+            except RuntimeError:
+                pass
         if Target.npzfile is None:
             try:
                 npzname = mh.getSysDataPath('targets.npz')
@@ -218,6 +469,142 @@ class Target:
 
         return False
 
+
+class TargetMatrix:
+
+    """
+    This class packs the translation vectors of many targets into a single
+    sparse (vertices x targets) matrix in CSR layout, so that a whole stack
+    of weighted targets can be applied in one vectorized pass.
+    """
+
+    def __init__(self, nVerts):
+        """
+        This method initializes an instance of the TargetMatrix class.
+
+        Parameters
+        ----------
+
+        nVerts:
+            *int*. The number of vertices of the base object (rows of the matrix).
+        """
+
+        self.nVerts = nVerts
+        self.columns = {}       # target path -> column index
+        self.targets = []       # column index -> Target
+        self.packed = []        # column index -> (verts, data) the matrix was packed from
+        self.isDirty = True
+
+        self.indptr = np.zeros(nVerts + 1, dtype=np.intp)
+        self.indices = np.zeros(0, dtype=np.intp)
+        self.data = np.zeros((0, 3), dtype=np.float32)
+        self.rows = np.zeros(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def retain(self, targetPaths):
+        """
+        Remove the columns of all targets that are not in targetPaths, so that
+        the matrix does not keep every target ever applied alive.
+        """
+        if all(targetPath in targetPaths for targetPath in self.columns):
+            return
+        columns = [(targetPath, col) for targetPath, col in sorted(self.columns.items(), key=lambda item: item[1])
+                   if targetPath in targetPaths]
+        self.columns = dict((targetPath, i) for i, (targetPath, col) in enumerate(columns))
+        self.targets = [self.targets[col] for targetPath, col in columns]
+        self.packed = [self.packed[col] for targetPath, col in columns]
+        self.isDirty = True
+
+    def setTarget(self, targetPath, target):
+        """
+        Register a target as a column of the matrix. The matrix is repacked
+        lazily when a new target is added or when the arrays of an already
+        registered target have been replaced (e.g. a recompiled warp target).
+        """
+        try:
+            col = self.columns[targetPath]
+        except KeyError:
+            col = len(self.targets)
+            self.columns[targetPath] = col
+            self.targets.append(target)
+            self.packed.append((None, None))
+            self.isDirty = True
+            return col
+
+        verts, data = self.packed[col]
+        if self.targets[col] is not target or \
+           verts is not target.verts or data is not getattr(target, 'data', None):
+            self.targets[col] = target
+            self.isDirty = True
+        return col
+
+    def pack(self):
+        """
+        Rebuild the CSR arrays from the registered targets.
+        """
+        self.packed = [(t.verts, getattr(t, 'data', None)) for t in self.targets]
+
+        verts = [np.asarray(v, dtype=np.intp) for v, d in self.packed]
+        data = [np.zeros((0, 3), dtype=np.float32) if d is None else np.asarray(d, dtype=np.float32)
+                for v, d in self.packed]
+        counts = [len(v) for v in verts]
+
+        if sum(counts):
+            rows = np.concatenate(verts)
+            cols = np.repeat(np.arange(len(counts), dtype=np.intp), counts)
+            data = np.concatenate(data)
+            order = np.argsort(rows, kind='mergesort')
+            rows = rows[order]
+            self.indices = cols[order]
+            self.data = data[order]
+            self.indptr = np.searchsorted(rows, np.arange(self.nVerts + 1))
+            self.rows = np.unique(rows)
+        else:
+            self.indptr = np.zeros(self.nVerts + 1, dtype=np.intp)
+            self.indices = np.zeros(0, dtype=np.intp)
+            self.data = np.zeros((0, 3), dtype=np.float32)
+            self.rows = np.zeros(0, dtype=np.intp)
+
+        self.isDirty = False
+
+    def getWeights(self, targets):
+        """
+        Build the weight vector (one weight per column) for a dict mapping
+        target paths to morph factors. Unregistered targets are ignored.
+        """
+        weights = np.zeros(len(self.targets), dtype=np.float32)
+        for targetPath, morphFactor in targets.items():
+            col = self.columns.get(targetPath)
+            if col is not None:
+                weights[col] = morphFactor
+        return weights
+
+    def dot(self, weights):
+        """
+        Sparse matrix-vector product: returns the offsets of the rows touched
+        by the matrix (see *rows*) for the given weight vector, as a
+        (len(rows), 3) array.
+        """
+        if self.isDirty:
+            self.pack()
+        if not len(self.rows):
+            return np.zeros((0, 3), dtype=np.float32)
+        contrib = self.data * weights[self.indices][:,None]
+        return np.add.reduceat(contrib, self.indptr[self.rows], axis=0)
+
+    def apply(self, obj, targets):
+        """
+        Add the weighted sum of the given targets (a dict mapping target paths
+        to morph factors) to the coordinates of obj.
+        """
+        offsets = self.dot(self.getWeights(targets))
+        if len(self.rows):
+            obj.coord[self.rows] += offsets
+            obj.markCoords(self.rows, coor=True)
+
+
 def getTarget(obj, targetPath):
     """
     This function retrieves a set of translation vectors from a morphing
@@ -250,10 +637,9 @@ def getTarget(obj, targetPath):
         The precise format of this string will be operating system dependant.
     """
 
-    try:
-        return targetBuffer[targetPath]
-    except KeyError:
-        pass
+    target = targetBuffer.get(targetPath)
+    if target is not None:
+        return target
 
     try:
         target = warpTargetBuffer[targetPath]
@@ -268,6 +654,60 @@ def getTarget(obj, targetPath):
     return target
 
 
+def loadTargetData(targetPath):
+    """
+    This function returns the vertex indices and translation vectors of a
+    morph target as arrays. The target is taken from the target buffer if it
+    is loaded, and otherwise read from the compiled targets, falling back to
+    the text file. Unlike getTarget, no face data is computed and the target
+    is not added to the buffer.
+
+    Parameters
+    ----------
+
+    targetPath:
+        *string*. The file system path to the file containing the morphing targets.
+
+    Raises IOError if the target cannot be read.
+    """
+
+    if targetPath in targetBuffer:
+        target = targetBuffer[targetPath]
+        if len(target.verts):
+            return np.asarray(target.verts), np.asarray(target.data)
+
+    target = Target.__new__(Target)
+    target._load(targetPath)
+    return np.asarray(target.verts), np.asarray(target.data)
+
+
+def blendTargetData(targets):
+    """
+    This function returns the weighted sum of a number of targets as sorted
+    vertex index and translation vector arrays, containing every vertex
+    moved by any of the targets.
+
+    Parameters
+    ----------
+
+    targets:
+        *list*. (weight, verts, data) tuples, with the index and vector arrays
+        of each target as returned by loadTargetData.
+    """
+
+    targets = [(weight, np.asarray(verts), np.asarray(data)) for weight, verts, data in targets if len(verts)]
+    if not targets:
+        return np.zeros(0, dtype=np.uint32), np.zeros((0,3), dtype=np.float64)
+
+    allVerts = np.concatenate([verts for weight, verts, data in targets])
+    allData = np.concatenate([weight * data.astype(np.float64) for weight, verts, data in targets])
+    verts, inverse = np.unique(allVerts, return_inverse=True)
+    data = np.empty((len(verts),3), dtype=np.float64)
+    for i in range(3):
+        data[:,i] = np.bincount(inverse, weights=allData[:,i], minlength=len(verts))
+    return verts, data
+
+
 def resetWarpBuffer():
     global warpTargetBuffer
     import gui3d
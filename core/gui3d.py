@@ -294,9 +294,19 @@ class Object(events3d.EventHandler):
                 self.mesh.update()
             self.mesh.setVisibility(1)
 
-    def updateSubdivisionMesh(self):
+    def updateSubdivisionMesh(self, changedVerts=None):
+        """
+        Update the subdivision mesh. If changedVerts (indices of seed mesh
+        vertices) is given, normals are only recalculated for the part of the
+        subdivided mesh influenced by these vertices. This is ignored when
+        the subdivision mesh belongs to a proxy.
+
+        """
 
-        self.getSubdivisionMesh(True)
+        if changedVerts is None or self.isProxied():
+            self.getSubdivisionMesh(True)
+        else:
+            cks.updateSubdivisionObject(self.getSubdivisionMesh(False), changedVerts=changedVerts)
 
     def _setMeshUVMap(self, filename, mesh):
         import material
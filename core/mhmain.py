@@ -169,7 +169,9 @@ class MHApplication(gui3d.Application, mh.Application):
             'rtl': False,
             'sliderImages': True,
             'guiTheme': 'default',
-            'preloadTargets': False
+            'preloadTargets': False,
+            'targetCacheSize': 256,
+            'animationCacheSize': 256
         }
 
         self.loadHandlers = {}
@@ -430,6 +432,8 @@ class MHApplication(gui3d.Application, mh.Application):
             key = keys[:i+1]
             for target in targets.getTargets().groups[key]:
                 algos3d.getTarget(self.selectedHuman.meshData, target.path)
+                algos3d.targetBuffer.pin(target.path)
+        algos3d.targetBuffer.logStats()
 
     def loadFinish(self):
 
@@ -491,6 +495,7 @@ class MHApplication(gui3d.Application, mh.Application):
 
     def onStop(self, event):
 
+        algos3d.targetBuffer.logStats()
         self.saveSettings(True)
         self.unloadPlugins()
         self.dumpMissingStrings()
@@ -579,6 +584,10 @@ class MHApplication(gui3d.Application, mh.Application):
 
         gui.Slider.showImages(self.settings['sliderImages'])
 
+        # Target cache budget in MB, 0 for an unbounded cache
+        cacheSize = self.settings['targetCacheSize']
+        algos3d.targetBuffer.setBudget(cacheSize * 1024 * 1024 if cacheSize else None)
+
         with inFile("shortcuts.ini") as f:
             shortcuts = {}
             for line in f:
@@ -32,6 +32,7 @@ from compat import MaterialsProxy
 import matrix
 import log
 import material
+import spatialindex
 
 class FaceGroup(object):
     """
@@ -79,6 +80,42 @@ class FaceGroup(object):
     def setColor(self, rgba):
         self.color = np.asarray(rgba, dtype = np.uint8)
 
+class DirtySet(object):
+    """
+    The indices of changed vertices (or UVs) that still have to be copied to
+    the render buffers.
+
+    Indices are collected as they are marked, and merged into one sorted
+    array without duplicates when they are read.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.parts = []
+        self.sorted = None
+
+    def add(self, indices):
+        if isinstance(indices, slice):
+            indices = np.arange(self.size)[indices]
+        else:
+            indices = np.asarray(indices)
+            if indices.dtype == bool:
+                indices = np.flatnonzero(indices)
+        self.parts.append(indices.reshape(-1))
+        self.sorted = None
+
+    def indices(self):
+        if self.sorted is None:
+            if self.parts:
+                self.sorted = np.unique(np.concatenate(self.parts))
+            else:
+                self.sorted = np.zeros(0, dtype=np.uint32)
+            self.parts = [self.sorted]
+        return self.sorted
+
+    def __len__(self):
+        return len(self.indices())
+
 class Object3D(object):
     def __init__(self, objName, vertsPerPrimitive=4):
 
@@ -103,9 +140,17 @@ class Object3D(object):
         self.object3d = None
         self.vmap = None
         self.tmap = None
+        self.ivmap = None
+        self.itmap = None
+        self.r_changed = {}
         self.priority = 0
         self.cull = 0
         self.MAX_FACES = 8
+        self.vface_offsets = None
+        self.vface_list = None
+        self.vface_overflow = False
+        self._spatialIndex = None
+        self.uspatial = False
 
         self.__object = None
 
@@ -216,13 +261,27 @@ class Object3D(object):
         if ix is None:
             ix = np.s_[:]
 
-        vface = self.vface[ix]
-        norms = self.fnorm[vface]
-        norms *= np.arange(self.MAX_FACES)[None,:,None] < self.nfaces[ix][:,None,None]
-        norms = np.sum(norms, axis=1)
+        norms = self._sumVertexFaces(self.fnorm, ix)
         norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
         self.vnorm[ix] = norms
 
+    def _sumVertexFaces(self, values, ix):
+        """
+        Sum the per face values over the faces around each of the vertices ix,
+        using the face list instead of the vface table when some vertices
+        have more faces than the table holds.
+        """
+        if self.vface_overflow:
+            rows, faces = self.getVertexFaces(np.arange(len(self.coord))[ix])
+            sums = np.zeros((len(self.coord[ix]),) + values.shape[1:], dtype=np.float32)
+            np.add.at(sums, rows, values[faces])
+        else:
+            sums = values[self.vface[ix]]
+            mask = np.arange(self.MAX_FACES)[None,:] < self.nfaces[ix][:,None]
+            sums *= mask.reshape(mask.shape + (1,) * (values.ndim - 1))
+            sums = np.sum(sums, axis=1)
+        return sums
+
     def calcVertexTangents(self, ix = None):
         self.markCoords(ix, norm=True)
         if ix is None:
@@ -231,7 +290,10 @@ class Object3D(object):
             f_ix = np.s_[:]
         else:
             xLen = len(ix)
-            f_ix = np.unique(self.vface[ix])
+            if self.vface_overflow:
+                f_ix = np.unique(self.getVertexFaces(ix)[1])
+            else:
+                f_ix = np.unique(self.vface[ix])
 
         # This implementation is based on
         # http://www.terathon.com/code/tangent.html
@@ -276,8 +338,8 @@ class Object3D(object):
                                         ( (s1 * y2) - (s2 * y1) ) * r,
                                         ( (s1 * z2) - (s2 * z1) ) * r  ] )
 
-        tan[:,0] = np.sum(sdir[self.vface[ix]])
-        tan[:,1] = np.sum(tdir[self.vface[ix]])
+        tan[:,0] = self._sumVertexFaces(sdir, ix)
+        tan[:,1] = self._sumVertexFaces(tdir, ix)
 
         # Gramm-Schmidt orthogonalize
         dotP = dot_v3(self.vnorm[ix], tan[:,0] )
@@ -345,6 +407,8 @@ class Object3D(object):
         del self.texco
         del self.vface
         del self.nfaces
+        self.vface_offsets = None
+        self.vface_list = None
 
         del self.ucoor
         del self.unorm
@@ -356,6 +420,8 @@ class Object3D(object):
         self.grpix = None
         self.vmap = None
         self.tmap = None
+        self.ivmap = None
+        self.itmap = None
 
     def setCoords(self, coords):
         nverts = len(coords)
@@ -399,28 +465,40 @@ class Object3D(object):
                 self.ucoor = True
             else:
                 if self.ucoor is False:
-                    self.ucoor = np.zeros(nverts, dtype=bool)
+                    self.ucoor = DirtySet(nverts)
                 if self.ucoor is not True:
-                    self.ucoor[indices] = True
+                    self.ucoor.add(indices)
+
+            if self._spatialIndex is not None:
+                if indices is None:
+                    self.uspatial = True
+                else:
+                    if self.uspatial is False:
+                        self.uspatial = DirtySet(nverts)
+                    if self.uspatial is not True:
+                        self.uspatial.add(indices)
 
         if norm:
             if indices is None:
                 self.unorm = self.utang = True
             else:
                 if self.unorm is False:
-                    self.unorm = self.utang = np.zeros(nverts, dtype=bool)
+                    self.unorm = DirtySet(nverts)
                 if self.unorm is not True:
-                    self.unorm[indices] = True
-                    self.utang[indices] = True
+                    self.unorm.add(indices)
+                if self.utang is False:
+                    self.utang = DirtySet(nverts)
+                if self.utang is not True:
+                    self.utang.add(indices)
 
         if colr:
             if indices is None:
                 self.ucolr = True
             else:
                 if self.ucolr is False:
-                    self.ucolr = np.zeros(nverts, dtype=bool)
+                    self.ucolr = DirtySet(nverts)
                 if self.ucolr is not True:
-                    self.ucolr[indices] = True
+                    self.ucolr.add(indices)
 
     def changeCoords(self, coords, indices = None):
         self.markCoords(indices, coor=True)
@@ -452,9 +530,9 @@ class Object3D(object):
             self.utexc = True
         else:
             if self.utexc is False:
-                self.utexc = np.zeros(ntexco, dtype=bool)
+                self.utexc = DirtySet(ntexco)
             if self.utexc is not True:
-                self.utexc[indices] = True
+                self.utexc.add(indices)
 
     def setFaces(self, verts, uvs = None, groups = None, materials = None, skipUpdate = False):
         nfaces = len(verts)
@@ -477,6 +555,10 @@ class Object3D(object):
 
         self.has_uv = uvs is not None
 
+        self.vface_offsets = None
+        self.vface_list = None
+        self.vface_overflow = False
+
         if not skipUpdate:
             self._update_faces()
 
@@ -507,16 +589,28 @@ class Object3D(object):
         return self.fuvs[indices]
 
     def _update_faces(self):
-        map = np.argsort(self.fvert.flat)
-        vi = self.fvert.flat[map]
-        fi = np.mgrid[:self.fvert.shape[0],:self.fvert.shape[1]][0].flat[map].astype(np.uint32)
-        del map
-        ix, first = np.unique(vi, return_index=True)
-        n = first[1:] - first[:-1]
-        n = np.hstack((n, np.array([len(vi) - first[-1]])))
-        self.nfaces[ix] = n.astype(np.uint8)
-        for i in range(len(ix)):
-            self.vface[ix[i],:n[i]] = fi[first[i]:][:n[i]]
+        vface, count, offsets, faces = buildVertexAdjacency(self.fvert, len(self.vface), self.MAX_FACES)
+        self.vface = vface
+        self.nfaces = np.minimum(count, self.MAX_FACES).astype(np.uint8)
+        self.vface_offsets = offsets
+        self.vface_list = faces
+        self.vface_overflow = bool(len(count)) and count.max() > self.MAX_FACES
+        if self.vface_overflow:
+            log.debug('%s has vertices with more than %d faces, using the face list for them',
+                      self.name, self.MAX_FACES)
+
+    def getVertexFaces(self, verts):
+        """
+        Returns the faces around the specified vertices, from the face list
+        (vface_offsets, vface_list) that is built alongside the vface table,
+        which is limited to MAX_FACES faces per vertex.
+        Returns two arrays: the index in verts and the face, for each face of
+        each vertex.
+        """
+        if self.vface_offsets is None:
+            _, _, self.vface_offsets, self.vface_list = \
+                buildVertexAdjacency(self.fvert, len(self.vface), self.MAX_FACES)
+        return gatherMap((self.vface_offsets, self.vface_list), verts, rows=True)
 
     def updateIndexBuffer(self):
         self.updateIndexBufferVerts()
@@ -542,6 +636,13 @@ class Object3D(object):
         self.tmap = unwelded[:,1]
         del unwelded
 
+        # Inverses of vmap and tmap, built when first needed
+        self.ivmap = None
+        self.itmap = None
+
+        # Render vertices changed since the buffer objects were updated
+        self.r_changed = {}
+
         self.r_coord = np.empty((nverts, 3), dtype=np.float32)
         self.r_texco = np.empty((nverts, 2), dtype=np.float32)
         self.r_vnorm = np.zeros((nverts, 3), dtype=np.float32)
@@ -580,15 +681,66 @@ class Object3D(object):
         self.utexc = True
         self.sync_all()
 
+    def _sync(self, dirty, src, dst, map, imapName):
+        """
+        Copy the changed vertex data src to the render buffer dst. dirty is
+        True for all vertices or a DirtySet, map maps render vertices to
+        vertices and imapName is the attribute holding the inverse of map,
+        see invertMap.
+        """
+        if dirty is True:
+            dst[...] = src[map]
+            self.markRenderChanged(dst)
+            return
+        imap = getattr(self, imapName)
+        if imap is None or len(imap[0]) != len(src) + 1:
+            imap = invertMap(map, len(src))
+            setattr(self, imapName, imap)
+        rverts = gatherMap(imap, dirty.indices())
+        if len(rverts) * 2 > len(map):
+            dst[...] = src[map]
+            self.markRenderChanged(dst)
+        else:
+            dst[rverts] = src[map[rverts]]
+            self.markRenderChanged(dst, rverts)
+
+    def markRenderChanged(self, array, rverts=None):
+        """
+        Record that the specified render vertices of the render buffer array
+        (r_coord, r_vnorm, ...) changed, or all of them if rverts is None.
+        The changes are collected for the buffer objects that are drawn, see
+        takeRenderChanges.
+        """
+        key = id(array)
+        changed = self.r_changed.get(key)
+        if changed is True:
+            return
+        if rverts is None:
+            self.r_changed[key] = True
+            return
+        if changed is None:
+            changed = self.r_changed[key] = DirtySet(len(array))
+        changed.add(rverts)
+        if len(changed.parts) > 16 and len(changed) * 2 > len(array):
+            self.r_changed[key] = True
+
+    def takeRenderChanges(self, array):
+        """
+        Returns the render vertices of the render buffer array that changed
+        since the last call, as a sorted index array, True if they all may
+        have changed, or None if none changed.
+        """
+        changed = self.r_changed.pop(id(array), None)
+        if changed is None or changed is True:
+            return changed
+        return changed.indices()
+
     def sync_coord(self):
         if self.ucoor is False:
             return
         if self.vmap is None or len(self.vmap) == 0:
             return
-        if self.ucoor is True:
-            self.r_coord[...] = self.coord[self.vmap]
-        else:
-            self.r_coord[self.ucoor[self.vmap]] = self.coord[self.vmap][self.ucoor[self.vmap]]
+        self._sync(self.ucoor, self.coord, self.r_coord, self.vmap, 'ivmap')
         self.ucoor = False
 
     def sync_norms(self):
@@ -596,10 +748,7 @@ class Object3D(object):
             return
         if self.vmap is None or len(self.vmap) == 0:
             return
-        if self.unorm is True:
-            self.r_vnorm[...] = self.vnorm[self.vmap]
-        else:
-            self.r_vnorm[self.unorm[self.vmap]] = self.vnorm[self.vmap][self.unorm[self.vmap]]
+        self._sync(self.unorm, self.vnorm, self.r_vnorm, self.vmap, 'ivmap')
         self.unorm = False
 
     def sync_tangents(self):
@@ -607,10 +756,7 @@ class Object3D(object):
             return
         if self.vmap is None or len(self.vmap) == 0:
             return
-        if self.utang is True:
-            self.r_vtang[...] = self.vtang[self.vmap]
-        else:
-            self.r_vtang[self.utang[self.vmap]] = self.vtang[self.vmap][self.utang[self.vmap]]
+        self._sync(self.utang, self.vtang, self.r_vtang, self.vmap, 'ivmap')
         self.utang = False
 
     def sync_color(self):
@@ -618,10 +764,7 @@ class Object3D(object):
             return
         if self.vmap is None or len(self.vmap) == 0:
             return
-        if self.ucolr is True:
-            self.r_color[...] = self.color[self.vmap]
-        else:
-            self.r_color[self.ucolr[self.vmap]] = self.color[self.vmap][self.ucolr[self.vmap]]
+        self._sync(self.ucolr, self.color, self.r_color, self.vmap, 'ivmap')
         self.ucolr = False
 
     def sync_texco(self):
@@ -629,10 +772,7 @@ class Object3D(object):
             return
         if self.tmap is None or len(self.tmap) == 0:
             return
-        if self.utexc is True:
-            self.r_texco[...] = self.texco[self.tmap]
-        else:
-            self.r_texco[self.utexc[self.tmap]] = self.texco[self.tmap][self.utexc[self.tmap]]
+        self._sync(self.utexc, self.texco, self.r_texco, self.tmap, 'itmap')
         self.utexc = False
 
     def sync_all(self):
@@ -927,15 +1067,41 @@ class Object3D(object):
 
     def getFaceMaskForVertices(self, verts):
         mask = np.zeros(len(self.fvert), dtype = bool)
-        valid = np.arange(self.MAX_FACES)[None,:] < self.nfaces[verts][:,None]
-        vface = self.vface[verts]
-        faces = vface[valid]
+        if self.vface_overflow:
+            _, faces = self.getVertexFaces(np.arange(len(self.vface))[verts])
+        else:
+            valid = np.arange(self.MAX_FACES)[None,:] < self.nfaces[verts][:,None]
+            vface = self.vface[verts]
+            faces = vface[valid]
         mask[faces] = True
         return mask
 
     def getFacesForVertices(self, verts):
         return np.argwhere(self.getFaceMaskForVertices(verts))[...,0]
 
+    def getSpatialIndex(self):
+        """
+        Returns a spatial index of the faces and vertices of this mesh, for
+        ray casting and nearest vertex queries (see spatialindex.SpatialIndex).
+        The index is created on first use, and updated for the vertices marked
+        with markCoords(coor=True) since the last call.
+        """
+        if self._spatialIndex is None:
+            self._spatialIndex = spatialindex.SpatialIndex(self)
+        elif self.uspatial is True:
+            self._spatialIndex.update()
+        elif self.uspatial is not False:
+            self._spatialIndex.update(self.uspatial.indices())
+        self.uspatial = False
+        return self._spatialIndex
+
+    def pickFace(self, origin, direction):
+        """
+        Returns the visible face hit first by the ray, given in the
+        coordinates of this mesh, and the point where it is hit, or None.
+        """
+        return self.getSpatialIndex().castRay(origin, direction, self.face_mask)
+
     def setCameraProjection(self, cameraMode):
         """
         This method sets the camera mode used to visualize this object (fixed or movable).
@@ -1013,3 +1179,58 @@ def dot_v3(v3_arr1, v3_arr2):
            (v3_arr1[:,1] * v3_arr2[:,1]) + \
            (v3_arr2[:,2] * v3_arr1[:,2])
 
+def buildVertexAdjacency(elements, nverts, width):
+    """
+    Vertex to element adjacency for an (nelements, n) array of vertex indices,
+    such as the face vertices of a mesh.
+
+    Returns a (nverts, width) table with the elements of each vertex, padded
+    with zeros, the number of elements of each vertex, which can exceed width,
+    and the complete adjacency as nverts + 1 offsets into an array of
+    elements. The elements of a vertex are in increasing order, and an element
+    that references a vertex more than once is listed more than once.
+    """
+    elements = np.asarray(elements)
+    flat = elements.reshape(-1)
+    order = np.argsort(flat, kind='mergesort')
+    vi = flat[order]
+    items = (order // elements.shape[1]).astype(np.uint32)
+    del order
+
+    count = np.bincount(vi, minlength=nverts)
+    offsets = np.zeros(nverts + 1, dtype=np.uint32)
+    np.cumsum(count, out=offsets[1:])
+
+    rank = np.arange(len(vi), dtype=np.uint32) - offsets[vi]
+    valid = rank < width
+    table = np.zeros((nverts, width), dtype=np.uint32)
+    table[vi[valid], rank[valid]] = items[valid]
+
+    return table, count, offsets, items
+
+def invertMap(map, size):
+    """
+    Inverse of an index map, such as the map from render vertices to vertices.
+    Returns size + 1 offsets into an array of the positions in map, sorted
+    by the index they map to, so the positions that map to index i are
+    indices[offsets[i]:offsets[i+1]].
+    """
+    indices = np.argsort(map, kind='mergesort').astype(np.uint32)
+    offsets = np.zeros(size + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(map, minlength=size), out=offsets[1:])
+    return offsets, indices
+
+def gatherMap(imap, keys, rows=False):
+    """
+    Look up the keys in a map in CSR form (offsets, indices), as built by
+    invertMap or buildVertexAdjacency, and return the concatenated indices of
+    all keys. With rows=True, also returns the position in keys of each index.
+    """
+    offsets, indices = imap
+    keys = np.asarray(keys)
+    start = offsets[keys].astype(np.int64)
+    count = offsets[keys+1] - start
+    pos = np.arange(np.sum(count)) - np.repeat(np.cumsum(count) - count, count) + np.repeat(start, count)
+    if rows:
+        return np.repeat(np.arange(len(keys)), count), indices[pos]
+    return indices[pos]
@@ -0,0 +1,377 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           Glynn Clements
+
+**Copyright(c):**      MakeHuman Team 2001-2013
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Spatial index of the faces and vertices of a mesh, for ray casting and
+nearest vertex queries without OpenGL.
+
+The index consists of two bounding volume hierarchies, one over the faces and
+one over the vertices of the mesh. Each is a complete binary tree in heap
+order (the root is node 1, the children of node i are nodes 2i and 2i+1)
+whose leaves hold up to LEAF_SIZE primitives, sorted along a Morton curve.
+The tree is built and searched one level at a time with array operations.
+
+When vertices move, only the boxes of the leaves containing them and of the
+ancestors of those leaves are recomputed. The tree is not rebuilt, so queries
+stay correct after any deformation, though they slow down somewhat after
+large ones. All coordinates are in the coordinate system of the mesh.
+"""
+
+import numpy as np
+
+# Maximum number of primitives in a leaf
+LEAF_SIZE = 8
+
+def _spreadBits(x):
+    """
+    Insert two zero bits between each of the 10 low bits of x.
+    """
+    x = x.astype(np.uint32)
+    x = (x | (x << 16)) & np.uint32(0x030000FF)
+    x = (x | (x << 8)) & np.uint32(0x0300F00F)
+    x = (x | (x << 4)) & np.uint32(0x030C30C3)
+    x = (x | (x << 2)) & np.uint32(0x09249249)
+    return x
+
+def mortonCodes(points):
+    """
+    30 bit Morton codes of points, quantized to their bounding box.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.uint32)
+    pmin = points.min(axis=0)
+    extent = points.max(axis=0) - pmin
+    scale = 1023.0 / np.maximum(extent, 1e-12)
+    q = np.clip((points - pmin) * scale, 0, 1023).astype(np.uint32)
+    return (_spreadBits(q[:,0]) << 2) | (_spreadBits(q[:,1]) << 1) | _spreadBits(q[:,2])
+
+
+class BoxTree(object):
+    """
+    Bounding volume hierarchy over primitives (faces or vertices), ordered by
+    the Morton codes of their centers.
+
+    .. py:attribute:: slots
+
+        (nleaves, LEAF_SIZE) array with the primitives of each leaf, -1 for
+        empty slots.
+
+    .. py:attribute:: leafOf
+
+        The leaf holding each primitive.
+
+    .. py:attribute:: bmin, bmax
+
+        Bounding boxes of the nodes, by node number. Empty nodes have an
+        inverted box, which no query can hit.
+    """
+
+    def __init__(self, centers, leafSize=LEAF_SIZE):
+        n = len(centers)
+        order = np.argsort(mortonCodes(centers), kind='mergesort')
+
+        nleaves = max(1, (n + leafSize - 1) // leafSize)
+        self.depth = int(np.ceil(np.log2(nleaves))) if nleaves > 1 else 0
+        self.nleaves = 1 << self.depth
+
+        slots = np.empty(self.nleaves * leafSize, dtype=np.int64)
+        slots[:n] = order
+        slots[n:] = -1
+        self.slots = slots.reshape((self.nleaves, leafSize))
+        self.leafOf = np.empty(n, dtype=np.int64)
+        self.leafOf[order] = np.arange(n) // leafSize
+
+        nnodes = 2 * self.nleaves
+        self.bmin = np.empty((nnodes, 3), dtype=np.float32)
+        self.bmax = np.empty((nnodes, 3), dtype=np.float32)
+        self.count = np.zeros(nnodes, dtype=np.int64)
+        self.count[self.nleaves:] = np.sum(self.slots >= 0, axis=1)
+        for level in range(self.depth - 1, -1, -1):
+            nodes = np.arange(1 << level, 2 << level)
+            self.count[nodes] = self.count[2*nodes] + self.count[2*nodes+1]
+
+    def refit(self, pmin, pmax, leaves=None):
+        """
+        Recompute the boxes of the specified leaves (all if None) and of
+        their ancestors from the primitive boxes pmin, pmax.
+        """
+        if leaves is None:
+            leaves = np.arange(self.nleaves)
+        else:
+            leaves = np.unique(leaves)
+            if len(leaves) == 0:
+                return
+
+        slots = self.slots[leaves]
+        valid = (slots >= 0)[:,:,None]
+        nodes = leaves + self.nleaves
+        self.bmin[nodes] = np.where(valid, pmin[slots], np.inf).min(axis=1)
+        self.bmax[nodes] = np.where(valid, pmax[slots], -np.inf).max(axis=1)
+
+        for level in range(self.depth):
+            nodes = np.unique(nodes >> 1)
+            self.bmin[nodes] = np.minimum(self.bmin[2*nodes], self.bmin[2*nodes+1])
+            self.bmax[nodes] = np.maximum(self.bmax[2*nodes], self.bmax[2*nodes+1])
+
+    def traverse(self, nqueries, prune):
+        """
+        Descend the tree for a number of queries at once.
+        prune(queries, nodes) returns a boolean array marking the (query, node)
+        pairs to descend into. Returns the (query, primitive) pairs of the
+        leaves that were reached.
+        """
+        queries = np.arange(nqueries)
+        nodes = np.ones(nqueries, dtype=np.int64)
+        for level in range(self.depth + 1):
+            keep = prune(queries, nodes)
+            queries = queries[keep]
+            nodes = nodes[keep]
+            if level < self.depth:
+                queries = np.repeat(queries, 2)
+                nodes = (2 * nodes[:,None] + np.arange(2)[None,:]).reshape(-1)
+
+        prims = self.slots[nodes - self.nleaves]
+        queries = np.repeat(queries, prims.shape[1])
+        prims = prims.reshape(-1)
+        valid = prims >= 0
+        return queries[valid], prims[valid]
+
+
+def _firstPerQuery(queries, values, nqueries):
+    """
+    For (query, value) pairs, returns the index of the pair with the smallest
+    value for each query, -1 for queries without pairs.
+    """
+    result = np.zeros(nqueries, dtype=np.int64) - 1
+    if len(queries) == 0:
+        return result
+    order = np.lexsort((values, queries))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = queries[order][1:] != queries[order][:-1]
+    result[queries[order][first]] = order[first]
+    return result
+
+
+class SpatialIndex(object):
+    """
+    Spatial index of the faces and vertices of a module3d.Object3D.
+    Use Object3D.getSpatialIndex to get an index that is kept up to date with
+    the coordinates of the mesh.
+    """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.build()
+
+    def build(self):
+        """
+        Build the trees for the current topology and coordinates of the mesh.
+        """
+        coord = self.mesh.coord
+        fvert = self.mesh.fvert
+        self.nverts = len(coord)
+        self.nfaces = len(fvert)
+        self.vertTree = BoxTree(coord)
+        self.faceTree = BoxTree(coord[fvert].mean(axis=1) if self.nfaces else np.zeros((0,3)))
+        self.update()
+
+    def update(self, verts=None):
+        """
+        Update the index after the coordinates of the specified vertices
+        changed, or of all vertices if verts is None.
+        """
+        mesh = self.mesh
+        if len(mesh.coord) != self.nverts or len(mesh.fvert) != self.nfaces:
+            self.build()
+            return
+
+        coord = mesh.coord
+        if verts is None:
+            faces = None
+            fcoord = coord[mesh.fvert]
+            self.vertTree.refit(coord, coord)
+            if self.nfaces:
+                self.faceTree.refit(fcoord.min(axis=1), fcoord.max(axis=1))
+            return
+
+        verts = np.asarray(verts)
+        if verts.dtype == bool:
+            verts = np.flatnonzero(verts)
+        self.vertTree.refit(coord, coord, self.vertTree.leafOf[verts])
+        if self.nfaces:
+            faces = mesh.getFacesForVertices(verts)
+            leaves = self.faceTree.leafOf[faces]
+            # Only the faces in the changed leaves are needed
+            slots = self.faceTree.slots[np.unique(leaves)]
+            slots = slots[slots >= 0]
+            fmin = np.empty((self.nfaces, 3), dtype=np.float32)
+            fmax = np.empty((self.nfaces, 3), dtype=np.float32)
+            fcoord = coord[mesh.fvert[slots]]
+            fmin[slots] = fcoord.min(axis=1)
+            fmax[slots] = fcoord.max(axis=1)
+            self.faceTree.refit(fmin, fmax, leaves)
+
+    def castRays(self, origins, directions, faceMask=None):
+        """
+        Intersect rays with the faces of the mesh. Returns the nearest face hit
+        by each ray (-1 for none) and the distance along the ray, in units of
+        the direction vector (inf for none). Only faces set in faceMask are
+        considered, if it is given. Meshes of lines have no surface to hit,
+        so no ray hits them.
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape((-1, 3))
+        directions = np.asarray(directions, dtype=np.float64).reshape((-1, 3))
+        nrays = len(origins)
+        faces = np.zeros(nrays, dtype=np.int64) - 1
+        dists = np.zeros(nrays) + np.inf
+        nverts = self.mesh.vertsPerPrimitive
+        if nrays == 0 or self.nfaces == 0 or nverts < 3:
+            return faces, dists
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            invdir = 1.0 / directions
+        tree = self.faceTree
+
+        def prune(queries, nodes):
+            o = origins[queries]
+            d = invdir[queries]
+            with np.errstate(invalid='ignore'):
+                t0 = (tree.bmin[nodes] - o) * d
+                t1 = (tree.bmax[nodes] - o) * d
+            # Parallel to a slab: inside if the origin is between its planes
+            parallel = np.isnan(t0) | np.isnan(t1)
+            t0 = np.where(parallel, -np.inf, t0)
+            t1 = np.where(parallel, np.inf, t1)
+            inside = ~parallel | ((o >= tree.bmin[nodes]) & (o <= tree.bmax[nodes]))
+            tnear = np.max(np.minimum(t0, t1), axis=1)
+            tfar = np.min(np.maximum(t0, t1), axis=1)
+            return np.all(inside, axis=1) & (tnear <= tfar) & (tfar >= 0)
+
+        rays, cand = tree.traverse(nrays, prune)
+        if faceMask is not None:
+            keep = faceMask[cand]
+            rays, cand = rays[keep], cand[keep]
+        if len(cand) == 0:
+            return faces, dists
+
+        # Quads are split in the triangles (0,1,2) and (0,2,3)
+        fcoord = self.mesh.coord[self.mesh.fvert[cand]].astype(np.float64)
+        t = np.zeros(len(cand)) + np.inf
+        for a, b, c in [(0, i, i+1) for i in range(1, nverts - 1)]:
+            t = np.minimum(t, _intersectTriangles(origins[rays], directions[rays],
+                                                  fcoord[:,a], fcoord[:,b], fcoord[:,c]))
+        hit = np.isfinite(t)
+        rays, cand, t = rays[hit], cand[hit], t[hit]
+
+        best = _firstPerQuery(rays, t, nrays)
+        found = best >= 0
+        faces[found] = cand[best[found]]
+        dists[found] = t[best[found]]
+        return faces, dists
+
+    def castRay(self, origin, direction, faceMask=None):
+        """
+        Returns the nearest face hit by the ray and the point where it is hit,
+        or None if no face is hit.
+        """
+        faces, dists = self.castRays(origin, direction, faceMask)
+        if faces[0] < 0:
+            return None
+        return faces[0], np.asarray(origin) + dists[0] * np.asarray(direction)
+
+    def nearestVertices(self, points, k=1):
+        """
+        Returns the k nearest vertices of each point and their distances, as
+        (npoints, k) arrays, sorted by distance. Missing vertices (when the
+        mesh has less than k vertices) are -1, at distance inf.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 3))
+        npoints = len(points)
+        tree = self.vertTree
+
+        def prune(queries, nodes):
+            p = points[queries]
+            bmin = tree.bmin[nodes]
+            bmax = tree.bmax[nodes]
+            nonempty = tree.count[nodes] > 0
+            lower = np.sum(np.maximum(np.maximum(bmin - p, p - bmax), 0) ** 2, axis=1)
+            upper = np.sum(np.maximum(np.abs(bmin - p), np.abs(bmax - p)) ** 2, axis=1)
+            lower[~nonempty] = np.inf
+            upper[~nonempty] = np.inf
+
+            # The k nearest vertices are at most as far as the farthest corner
+            # of the nearest boxes that together contain k vertices
+            order = np.lexsort((upper, queries))
+            q = queries[order]
+            counts = tree.count[nodes][order]
+            cum = np.cumsum(counts)
+            start = np.ones(len(q), dtype=bool)
+            start[1:] = q[1:] != q[:-1]
+            groupStart = np.maximum.accumulate(np.where(start, np.arange(len(q)), 0))
+            cum = cum - (cum[groupStart] - counts[groupStart])
+            bound = np.zeros(npoints) + np.inf
+            enough = np.flatnonzero(cum >= k)
+            if len(enough):
+                _, first = np.unique(q[enough], return_index=True)
+                bound[q[enough][first]] = upper[order][enough][first]
+            return lower <= bound[queries]
+
+        queries, verts = tree.traverse(npoints, prune)
+        d2 = np.sum((self.mesh.coord[verts] - points[queries]) ** 2, axis=1)
+
+        order = np.lexsort((d2, queries))
+        queries, verts, d2 = queries[order], verts[order], d2[order]
+        start = np.searchsorted(queries, np.arange(npoints))
+        rank = np.arange(len(queries)) - start[queries]
+        keep = rank < k
+
+        result = np.zeros((npoints, k), dtype=np.int64) - 1
+        dists = np.zeros((npoints, k)) + np.inf
+        result[queries[keep], rank[keep]] = verts[keep]
+        dists[queries[keep], rank[keep]] = np.sqrt(d2[keep])
+        return result, dists
+
+    def nearestVertex(self, point):
+        """
+        Returns the vertex nearest to the point and its distance.
+        """
+        verts, dists = self.nearestVertices(point, 1)
+        return verts[0,0], dists[0,0]
+
+
+def _intersectTriangles(origins, directions, v0, v1, v2, epsilon=1e-12):
+    """
+    Moller-Trumbore intersection of rays with triangles, one ray per triangle.
+    Returns the distance along each ray, inf where it misses.
+    """
+    e1 = v1 - v0
+    e2 = v2 - v0
+    p = np.cross(directions, e2)
+    det = np.sum(e1 * p, axis=1)
+    valid = np.abs(det) > epsilon
+    inv = np.where(valid, 1.0 / np.where(valid, det, 1.0), 0.0)
+    s = origins - v0
+    u = np.sum(s * p, axis=1) * inv
+    q = np.cross(s, e1)
+    v = np.sum(directions * q, axis=1) * inv
+    t = np.sum(e2 * q, axis=1) * inv
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
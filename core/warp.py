@@ -86,8 +86,16 @@ import numpy
 import sys
 import imp
 import os
+import hashlib
+from collections import OrderedDict
 import log
 
+# Maximum number of warp solvers kept in memory
+MAX_CACHED_SOLVERS = 16
+
+# Number of morph points evaluated at once, limits the size of the RBF matrix
+CHUNK_SIZE = 8192
+
 #----------------------------------------------------------
 #   class CWarp2
 #----------------------------------------------------------
@@ -104,17 +112,18 @@ def compute_distance2(x, y=None):
         return diagx[:,numpy.newaxis] + diagy[numpy.newaxis] - 2* gram
 
 
-class CWarp2(object):
-    
-    def __init__(self, source, target, landmarks):
-        self.source = numpy.asarray(source, dtype="float32")
-        self.target = numpy.asarray(target, dtype="float32")
-        
-        self.xverts = self.source[landmarks]
-        self.yverts = self.target[landmarks]
+class WarpSolver(object):
+    """
+    Solved RBF system for one set of source and target landmark locations.
+    The weights only depend on the landmarks, so one solver can warp any
+    number of morphs between the same two characters.
+    """
+
+    def __init__(self, xverts, yverts):
+        self.xverts = xverts
+        self.yverts = yverts
         H = self.rbf(self.xverts)
-        w = numpy.linalg.lstsq(H,self.yverts)[0]
-        self.w = w
+        self.w = numpy.linalg.lstsq(H,self.yverts)[0]
 
 
     def rbf(self, x, y=None):
@@ -129,13 +138,105 @@ class CWarp2(object):
         #~ return numpy.exp(- 0.003 * dists2 / dists2.max())
 
 
-    def warpTarget(self, morph):
+    def evaluate(self, x):
+        """
+        Warp field U(x) at the (n, 3) locations x.
+        """
+        chunks = []
+        for start in range(0, len(x), CHUNK_SIZE):
+            H = self.rbf(x[start:start+CHUNK_SIZE], self.xverts)
+            chunks.append(numpy.dot(H, self.w))
+        return numpy.vstack(chunks)
+
+
+_solverCache = OrderedDict()
+
+def getWarpSolver(source, target, landmarks):
+    """
+    Solver for the landmarks of the source and target characters. Solvers are
+    cached by the landmark locations, so warping many targets between the same
+    characters only solves the RBF system once.
+    """
+    landmarks = numpy.asarray(landmarks, dtype=numpy.int32)
+    xverts = source[landmarks]
+    yverts = target[landmarks]
+
+    sha = hashlib.sha1()
+    for array in (landmarks, xverts, yverts):
+        sha.update(numpy.ascontiguousarray(array).data)
+    key = sha.hexdigest()
+
+    try:
+        solver = _solverCache.pop(key)
+    except KeyError:
+        solver = WarpSolver(xverts, yverts)
+    _solverCache[key] = solver
+    while len(_solverCache) > MAX_CACHED_SOLVERS:
+        _solverCache.popitem(last=False)
+    return solver
+
+
+def clearWarpCache():
+    _solverCache.clear()
+
+
+def getMorphArrays(morph):
+    if isinstance(morph, dict):
         idx = list(morph.keys())
-        disp = numpy.asarray(list(morph.values()), dtype="float")
+        disp = list(morph.values())
+    else:
+        idx,disp = morph
+    idx = numpy.asarray(idx, dtype=numpy.int32)
+    disp = numpy.asarray(disp, dtype="float").reshape(-1,3)
+    return idx, disp
+
+
+class CWarp2(object):
+    
+    def __init__(self, source, target, landmarks):
+        self.source = numpy.asarray(source, dtype="float32")
+        self.target = numpy.asarray(target, dtype="float32")
+
+        self.solver = getWarpSolver(self.source, self.target, landmarks)
+        self.xverts = self.solver.xverts
+        self.yverts = self.solver.yverts
+        self.w = self.solver.w
+        self.s2 = self.solver.s2
+
+
+    def rbf(self, x, y=None):
+        return self.solver.rbf(x, y)
+
+
+    def warpTarget(self, morph):
+        return self.warpTargets([morph])[0]
+
+
+    def warpTargets(self, morphs):
+        """
+        Warp a list of morphs with a single evaluation of the warp field for
+        the vertices of all morphs together. A morph is either a dict of
+        displacements indexed by vertex, or a (verts, data) pair of index and
+        displacement arrays.
+        """
+        morphs = [getMorphArrays(morph) for morph in morphs]
+        idxs = [idx.tolist() for idx,disp in morphs]
+        counts = [len(idx) for idx in idxs]
+        if sum(counts) == 0:
+            return [{} for morph in morphs]
+
+        idx = numpy.concatenate([idx for idx,disp in morphs])
+        disp = numpy.concatenate([disp for idx,disp in morphs])
         xmorph = self.source[idx] + disp
-        H = self.rbf(xmorph, self.xverts)
-        ymorph = numpy.dot(H, self.w) - self.target[idx]
-        return dict(list(zip(idx, ymorph)))
+        ymorph = self.solver.evaluate(xmorph) - self.target[idx]
+
+        result = []
+        start = 0
+        for n,count in enumerate(counts):
+            end = start + count
+            result.append(dict(list(zip(idxs[n], ymorph[start:end]))))
+            start = end
+        return result
 
 
 #----------------------------------------------------------
@@ -148,6 +249,9 @@ def warp_target1(morph, source, target, landmarks):
 def warp_target(morph, source, target, landmarks):
     return CWarp2(source, target, landmarks).warpTarget(morph)
 
+def warp_targets(morphs, source, target, landmarks):
+    return CWarp2(source, target, landmarks).warpTargets(morphs)
+
 
 #----------------------------------------------------------
 #   Testing
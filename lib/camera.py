@@ -329,3 +329,13 @@ class Camera(events3d.EventHandler):
         m = self.getConvertToScreenMatrix(obj)
         x, y, z = matrix.transform3(m.I, [sx, sy, sz])
         return [x, y, z]
+
+    def getPickRay(self, sx, sy, obj = None):
+        """
+        Returns the origin and direction of the ray through the screen
+        coordinates, in the coordinates of obj if given, for picking with
+        module3d.Object3D.pickFace without reading back the depth buffer.
+        """
+        near = np.asarray(self.convertToWorld3D(sx, sy, 0.0, obj))
+        far = np.asarray(self.convertToWorld3D(sx, sy, 1.0, obj))
+        return near, far - near
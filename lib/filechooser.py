@@ -25,44 +25,198 @@ A Qt based filechooser widget.
 """
 
 import os
+import hashlib
+import threading
+from collections import OrderedDict
 
 from PyQt4 import QtCore, QtGui
 
 import qtgui as gui
 import mh
 import log
+import queue
 
 class ThumbnailCache(object):
+    """
+    Thumbnails of preview images, scaled to a fixed size.
+
+    The most recently used thumbnails are kept in memory. All thumbnails are
+    also saved as PNG files in the thumbnails cache folder, named after a hash
+    of the image path, the thumbnail size and the size and modification time
+    of the image, so they are reused as long as the image does not change.
+    Thumbnails that are not in memory are loaded in background threads, and a
+    placeholder is returned until they are ready.
+    """
     aspect_mode = QtCore.Qt.KeepAspectRatioByExpanding
     scale_mode = QtCore.Qt.SmoothTransformation
 
-    def __init__(self, size):
-        self.cache = {}
+    def __init__(self, size, aspectMode=None, maxCached=1000, threads=2):
+        self.cache = OrderedDict()  # path -> (image stat key, QPixmap)
         self.size = size
+        if aspectMode is not None:
+            self.aspect_mode = aspectMode
+        self.maxCached = maxCached
+        self.threads = threads
+        self.pending = {}           # path -> callbacks waiting for the thumbnail
+        self.stale = set()          # paths to check for changes on next use
+        self.path = os.path.join(mh.getPath('cache'), 'thumbnails')
+        self._placeholder = None
+        self._loader = None
 
     def __getitem__(self, name):
-        nstat = os.stat(name)
+        """
+        Returns the thumbnail of the image, loading it in the calling thread
+        if it is not in memory.
+        """
+        if name in self.cache and name not in self.stale:
+            return self._touch(name)
+        self.stale.discard(name)
+        key, image = self.loadThumbnail(name)
+        self._store(name, key, image)
+        return self.cache[name][1]
+
+    def get(self, name, callback=None):
+        """
+        Returns the thumbnail of the image if it is in memory. Otherwise returns
+        a placeholder and loads the thumbnail in the background, after which
+        callback is called with the thumbnail, in the GUI thread.
+        """
         if name in self.cache:
-            stat, pixmap = self.cache[name]
-            if stat.st_size == nstat.st_size and stat.st_mtime == nstat.st_mtime:
-                return pixmap
-            else:
-                del self.cache[name]
-        pixmap = self.loadImage(name)
-        self.cache[name] = (nstat, pixmap)
+            if name in self.stale:
+                self.stale.discard(name)
+                self._request(name, callback)
+            return self._touch(name)
+        self._request(name, callback)
+        return self.placeholder()
+
+    def expire(self):
+        """
+        Check the images of the thumbnails in memory for changes the next time
+        they are used.
+        """
+        self.stale.update(self.cache.keys())
+
+    def placeholder(self):
+        if self._placeholder is None:
+            width, height = self.size
+            self._placeholder = QtGui.QPixmap(width, height)
+            self._placeholder.fill(QtCore.Qt.transparent)
+        return self._placeholder
+
+    def _touch(self, name):
+        key, pixmap = self.cache.pop(name)
+        self.cache[name] = (key, pixmap)
         return pixmap
 
-    def loadImage(self, path):
-        pixmap = QtGui.QPixmap(path)
+    def _store(self, name, key, image):
+        """
+        Keep the thumbnail in memory, unless the thumbnail in memory is of the
+        same image. Returns whether the thumbnail was replaced.
+        """
+        old = self.cache.pop(name, None)
+        if old is not None and old[0] == key:
+            self.cache[name] = old
+            return False
+        self.cache[name] = (key, QtGui.QPixmap.fromImage(image))
+        while len(self.cache) > self.maxCached:
+            self.cache.popitem(last=False)
+        return True
+
+    def _request(self, name, callback):
+        callbacks = self.pending.get(name)
+        if callbacks is None:
+            callbacks = self.pending[name] = []
+            if self._loader is None:
+                self._loader = queue.Manager(self._loadAsync, self.threads)
+                self._loader.start()
+            self._loader.post(name)
+        if callback is not None:
+            callbacks.append(callback)
+
+    def _loadAsync(self, name):
+        try:
+            key, image = self.loadThumbnail(name)
+        except Exception:
+            log.warning('Unable to load thumbnail for %s', name, exc_info=True)
+            key, image = None, QtGui.QImage()
+        mh.callAsyncThread(self._loaded, name, key, image)
+
+    def _loaded(self, name, key, image):
+        callbacks = self.pending.pop(name, [])
+        if not self._store(name, key, image):
+            return
+        pixmap = self.cache[name][1]
+        for callback in callbacks:
+            try:
+                callback(pixmap)
+            except RuntimeError:
+                # The widget was deleted while the thumbnail loaded
+                pass
+
+    def getCachePath(self, path, stat):
         width, height = self.size
-        pixmap = pixmap.scaled(width, height, self.aspect_mode, self.scale_mode)
-        pwidth = pixmap.width()
-        pheight = pixmap.height()
-        if pwidth > width or pheight > height:
-            x0 = max(0, (pwidth - width) / 2)
-            y0 = max(0, (pheight - height) / 2)
-            pixmap = pixmap.copy(x0, y0, width, height)
-        return pixmap
+        key = '%s|%dx%d|%d|%s|%s' % (os.path.abspath(path), width, height,
+                                     int(self.aspect_mode), stat.st_size, stat.st_mtime)
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+    def loadThumbnail(self, path):
+        """
+        Load the thumbnail from the cache folder, or scale the image and save
+        the thumbnail in the cache folder.
+        Returns the stat key of the image and the thumbnail as a QImage.
+        Only uses QImage, so it can be called from any thread.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, QtGui.QImage()
+        key = (stat.st_size, stat.st_mtime)
+
+        cachePath = self.getCachePath(path, stat)
+        if os.path.isfile(cachePath):
+            image = QtGui.QImage(cachePath)
+            if not image.isNull():
+                return key, image
+
+        image = self.scaleImage(QtGui.QImage(path))
+        if not image.isNull():
+            self.saveThumbnail(image, cachePath)
+        return key, image
+
+    def saveThumbnail(self, image, cachePath):
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+        except OSError:
+            # Created by another thread
+            pass
+        tmpPath = '%s.%s.tmp' % (cachePath, threading.current_thread().ident)
+        if image.save(tmpPath, 'PNG'):
+            try:
+                os.rename(tmpPath, cachePath)
+            except OSError:
+                os.remove(tmpPath)
+        else:
+            log.debug('Unable to save thumbnail %s', cachePath)
+
+    def scaleImage(self, image):
+        if image.isNull():
+            return image
+        width, height = self.size
+        if self.aspect_mode == QtCore.Qt.KeepAspectRatio and \
+           image.width() <= width and image.height() <= height:
+            return image
+        image = image.scaled(width, height, self.aspect_mode, self.scale_mode)
+        iwidth = image.width()
+        iheight = image.height()
+        if iwidth > width or iheight > height:
+            x0 = max(0, (iwidth - width) // 2)
+            y0 = max(0, (iheight - height) // 2)
+            image = image.copy(x0, y0, width, height)
+        return image
+
+    def loadImage(self, path):
+        return QtGui.QPixmap.fromImage(self.scaleImage(QtGui.QImage(path)))
 
 class FileChooserRectangle(gui.Button):
     _size = (128, 128)
@@ -77,9 +231,8 @@ class FileChooserRectangle(gui.Button):
         self.layout = QtGui.QGridLayout(self)
         self.layout.setSizeConstraint(QtGui.QLayout.SetMinimumSize)
 
-        image = self._imageCache[imagePath]
         self.preview = QtGui.QLabel()
-        self.preview.setPixmap(image)
+        self.preview.setPixmap(self._imageCache.get(imagePath, self.preview.setPixmap))
         self.layout.addWidget(self.preview, 0, 0)
         self.layout.setRowStretch(0, 1)
         self.layout.setColumnMinimumWidth(0, self._size[0])
@@ -575,6 +728,10 @@ class FileChooser(FileChooserBase):
         super(FileChooser, self).addItem(file, label, preview, tags)
         return item
 
+    def refresh(self, keepSelections=True):
+        FileChooserRectangle._imageCache.expire()
+        super(FileChooser, self).refresh(keepSelections)
+
     def setPaths(self, value):
         super(FileChooser, self).setPaths(value)
         locationLbl = "  |  ".join(self.paths)
@@ -740,25 +897,25 @@ class ListFileChooser(FileChooserBase):
                 self.setSelection(selections[0])
 
 class IconListFileChooser(ListFileChooser):
+    _iconCache = ThumbnailCache((128, 128), QtCore.Qt.KeepAspectRatio)
+
     def __init__(self, path, extension, previewExtensions='bmp', notFoundImage=None, name="File chooser" , multiSelect=False, verticalScrolling=False, sort=FileSort()):
         super(IconListFileChooser, self).__init__(path, extension, name, multiSelect, verticalScrolling, sort)
         self.setPreviewExtensions(previewExtensions)
         self.notFoundImage = notFoundImage
-        self._iconCache = {}
         #self.children.setIconSize(QtCore.QSize(50,50))
 
     def addItem(self, file, label, preview, tags=[]):
         item = super(IconListFileChooser, self).addItem(file, label, preview, tags)
-        if preview not in self._iconCache:
-            pixmap = QtGui.QPixmap(preview)
-            size = pixmap.size()
-            if size.width() > 128 or size.height() > 128:
-                pixmap = pixmap.scaled(128, 128, QtCore.Qt.KeepAspectRatio)
-            self._iconCache[preview] = QtGui.QIcon(pixmap)
-        icon = self._iconCache[preview]
-        item.setIcon(icon)
+        def setIcon(pixmap):
+            item.setIcon(QtGui.QIcon(pixmap))
+        setIcon(self._iconCache.get(preview, setIcon))
         return item
 
+    def refresh(self, keepSelections=True):
+        self._iconCache.expire()
+        super(IconListFileChooser, self).refresh(keepSelections)
+
     def setIconSize(self, width, height):
         self.children.setIconSize(QtCore.QSize(width, height))
 
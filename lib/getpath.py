@@ -58,6 +58,8 @@ def getPath(type = None):
             path += "\\makehuman\\render\\"
         elif typeStr == "scenes":
             path += "\\makehuman\\scenes\\"
+        elif typeStr == "cache":
+            path += "\\makehuman\\cache\\"
         elif typeStr == "":
             path += "\\makehuman\\"
         else:
@@ -80,6 +82,8 @@ def getPath(type = None):
             path += "/render/"
         elif typeStr == "scenes":
             path += "/scenes/"
+        elif typeStr == "cache":
+            path += "/cache/"
         elif typeStr == "":
             path += "/"
         else:
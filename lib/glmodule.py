@@ -25,6 +25,7 @@ TODO
 import sys
 import math
 import atexit
+import ctypes
 import numpy as np
 
 import OpenGL
@@ -261,6 +262,94 @@ def cameraPosition(camera, eye):
 def transformObject(obj):
     glMultMatrixd(np.ascontiguousarray(obj.transform.T))
 
+# Set to False to always draw from client side arrays
+useVBO = True
+
+_hasVBO = None
+def hasVBO():
+    """
+    Whether meshes are drawn from vertex buffer objects (OpenGL 1.5), instead
+    of from client side arrays that are sent to the GPU on every draw.
+    """
+    global _hasVBO
+    if _hasVBO is None:
+        _hasVBO = useVBO and all([
+            bool(glGenBuffers), bool(glBindBuffer), bool(glBufferData),
+            bool(glBufferSubData), bool(glDeleteBuffers)])
+        log.debug('Vertex buffer objects %s', 'enabled' if _hasVBO else 'not available')
+    return _hasVBO
+
+def createBuffer(data, index = False):
+    target = GL_ELEMENT_ARRAY_BUFFER if index else GL_ARRAY_BUFFER
+    buffer = glGenBuffers(1)
+    glBindBuffer(target, buffer)
+    glBufferData(target, data.nbytes, data, GL_DYNAMIC_DRAW)
+    glBindBuffer(target, 0)
+    return buffer
+
+def updateBuffer(buffer, data, ranges, index = False):
+    """
+    Upload the (start, end) ranges of rows of data to the buffer object.
+    """
+    target = GL_ELEMENT_ARRAY_BUFFER if index else GL_ARRAY_BUFFER
+    rowSize = data.nbytes // len(data)
+    glBindBuffer(target, buffer)
+    for start, end in ranges:
+        rows = data[start:end]
+        glBufferSubData(target, start * rowSize, rows.nbytes, rows)
+    glBindBuffer(target, 0)
+
+_deletedBuffers = []
+
+def deleteBuffers(buffers):
+    """
+    Delete buffer objects. This can be called when the GL context is not
+    current, so the buffers are deleted before the next draw.
+    """
+    _deletedBuffers.extend(buffers)
+
+def _flushDeletedBuffers():
+    global _deletedBuffers
+    if _deletedBuffers:
+        glDeleteBuffers(len(_deletedBuffers), np.array(_deletedBuffers, dtype=np.uint32))
+        _deletedBuffers = []
+
+def _useBuffers(obj):
+    """
+    Whether obj is drawn from buffer objects, in which case its index buffer
+    is bound.
+    """
+    if not hasVBO() or len(obj.verts) == 0 or obj.primitives.size == 0:
+        return False
+    glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, obj.getBuffer('primitives'))
+    return True
+
+def _arrayData(obj, name, vbo):
+    """
+    Returns the array pointer argument for the render buffer with the
+    specified property name, binding its buffer object if vbo is set.
+    """
+    if vbo:
+        glBindBuffer(GL_ARRAY_BUFFER, obj.getBuffer(name))
+        return None
+    return getattr(obj, name)
+
+def _indexData(obj, vbo, start = 0, count = None):
+    """
+    Returns the glDrawElements indices argument for count primitives from
+    start (all primitives if count is None).
+    """
+    if vbo:
+        return ctypes.c_void_p(int(start) * obj.vertsPerPrimitive * 4)
+    if count is None:
+        return obj.primitives
+    return obj.primitives[start:start+count,:]
+
+def _unbindBuffers(vbo):
+    if vbo:
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
 def drawMesh(obj):
     if not obj.visibility:
         return
@@ -271,19 +360,21 @@ def drawMesh(obj):
     glPushMatrix()
     transformObject(obj)
 
+    if obj.texture and obj.solid and obj.nTransparentPrimitives:
+        obj.sortFaces()
+
+    vbo = _useBuffers(obj)
+
     if obj.texture and obj.solid:
         glEnable(GL_TEXTURE_2D)
         glEnableClientState(GL_TEXTURE_COORD_ARRAY)
         glBindTexture(GL_TEXTURE_2D, obj.texture)
-        glTexCoordPointer(2, GL_FLOAT, 0, obj.UVs)
-
-        if obj.nTransparentPrimitives:
-            obj.sortFaces()
+        glTexCoordPointer(2, GL_FLOAT, 0, _arrayData(obj, 'UVs', vbo))
 
     # Fill the array pointers with object mesh data
-    glVertexPointer(3, GL_FLOAT, 0, obj.verts)
-    glNormalPointer(GL_FLOAT, 0, obj.norms)
-    glColorPointer(4, GL_UNSIGNED_BYTE, 0, obj.color)
+    glVertexPointer(3, GL_FLOAT, 0, _arrayData(obj, 'verts', vbo))
+    glNormalPointer(GL_FLOAT, 0, _arrayData(obj, 'norms', vbo))
+    glColorPointer(4, GL_UNSIGNED_BYTE, 0, _arrayData(obj, 'color', vbo))
 
     # Disable lighting if the object is shadeless
     if obj.shadeless:
@@ -299,7 +390,7 @@ def drawMesh(obj):
 
         # Set custom attributes
         if obj.shaderObj.requiresVertexTangent():
-            glVertexAttribPointer(obj.shaderObj.vertexTangentAttrId, 4, GL_FLOAT, GL_FALSE, 0, obj.tangents)
+            glVertexAttribPointer(obj.shaderObj.vertexTangentAttrId, 4, GL_FLOAT, GL_FALSE, 0, _arrayData(obj, 'tangents', vbo))
             glEnableVertexAttribArray(obj.shaderObj.vertexTangentAttrId)
 
         # TODO
@@ -313,28 +404,28 @@ def drawMesh(obj):
         glDisableClientState(GL_COLOR_ARRAY)
         glColor3f(0.0, 0.0, 0.0)
         glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
-        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, obj.primitives)
+        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, _indexData(obj, vbo))
         glEnableClientState(GL_COLOR_ARRAY)
         glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
         glEnable(GL_POLYGON_OFFSET_FILL)
         glPolygonOffset(1.0, 1.0)
-        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, obj.primitives)
+        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, _indexData(obj, vbo))
         glDisable(GL_POLYGON_OFFSET_FILL)
     elif obj.nTransparentPrimitives:
         glDepthMask(GL_FALSE)
         glEnable(GL_ALPHA_TEST)
         glAlphaFunc(GL_GREATER, 0.0)
-        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, obj.primitives)
+        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, _indexData(obj, vbo))
         glDisable(GL_ALPHA_TEST)
         glDepthMask(GL_TRUE)
     elif obj.depthless:
         glDepthMask(GL_FALSE)
         glDisable(GL_DEPTH_TEST)
-        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, obj.primitives)
+        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, _indexData(obj, vbo))
         glEnable(GL_DEPTH_TEST)
         glDepthMask(GL_TRUE)
     else:
-        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, obj.primitives)
+        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], obj.primitives.size, GL_UNSIGNED_INT, _indexData(obj, vbo))
 
     if obj.solid and not obj.nTransparentPrimitives:
         glDisableClientState(GL_COLOR_ARRAY)
@@ -343,8 +434,7 @@ def drawMesh(obj):
             if color is None or np.all(color[:3] == 255):
                 continue
             glColor4ub(*color)
-            indices = obj.primitives[start:start+count,:]
-            glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], indices.size, GL_UNSIGNED_INT, indices)
+            glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], int(count) * obj.vertsPerPrimitive, GL_UNSIGNED_INT, _indexData(obj, vbo, start, count))
         glEnableClientState(GL_COLOR_ARRAY)
 
     # Disable the shader if the driver supports it and there is a shader assigned
@@ -362,6 +452,8 @@ def drawMesh(obj):
         glDisable(GL_TEXTURE_2D)
         glDisableClientState(GL_TEXTURE_COORD_ARRAY)
 
+    _unbindBuffers(vbo)
+
     glPopMatrix()
 
 def pickMesh(obj):
@@ -374,9 +466,11 @@ def pickMesh(obj):
     glPushMatrix()
     transformObject(obj)
 
+    vbo = _useBuffers(obj)
+
     # Fill the array pointers with object mesh data
-    glVertexPointer(3, GL_FLOAT, 0, obj.verts)
-    glNormalPointer(GL_FLOAT, 0, obj.norms)
+    glVertexPointer(3, GL_FLOAT, 0, _arrayData(obj, 'verts', vbo))
+    glNormalPointer(GL_FLOAT, 0, _arrayData(obj, 'norms', vbo))
 
     # Use color to pick i
     glDisableClientState(GL_COLOR_ARRAY)
@@ -391,14 +485,15 @@ def pickMesh(obj):
     # draw the meshes
     for i, (start, count) in enumerate(obj.groups):
         glColor3ub(*obj.clrid(i))
-        indices = obj.primitives[start:start+count,:]
-        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], indices.size, GL_UNSIGNED_INT, indices)
+        glDrawElements(g_primitiveMap[obj.vertsPerPrimitive-1], int(count) * obj.vertsPerPrimitive, GL_UNSIGNED_INT, _indexData(obj, vbo, start, count))
 
     glDisable(GL_CULL_FACE)
 
     glEnable(GL_LIGHTING)
     glEnableClientState(GL_COLOR_ARRAY)
 
+    _unbindBuffers(vbo)
+
     glPopMatrix()
 
 def drawOrPick(pickMode, obj):
@@ -533,6 +628,9 @@ def drawMeshes(pickMode):
     if G.world is None:
         return
 
+    if _hasVBO:
+        _flushDeletedBuffers()
+
     cameraMode = None
     # Draw all objects contained by G.world
     for obj in sorted(G.world, key = (lambda obj: obj.priority)):
@@ -31,6 +31,25 @@ import matrix
 import log
 from core import G
 
+# Changed rows closer together than this are uploaded in one range
+RANGE_GAP = 256
+# Upload one range spanning all changes when there are more ranges than this
+MAX_RANGES = 32
+
+def coalesceRanges(indices, gap=RANGE_GAP, maxRanges=MAX_RANGES):
+    """
+    Returns the (start, end) ranges of rows that cover the sorted indices,
+    merging ranges that are less than gap rows apart.
+    """
+    if len(indices) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > gap)
+    starts = indices[np.hstack(([0], breaks + 1))]
+    ends = indices[np.hstack((breaks, [len(indices) - 1]))] + 1
+    if len(starts) > maxRanges:
+        return [(int(starts[0]), int(ends[-1]))]
+    return list(zip(starts.tolist(), ends.tolist()))
+
 class Object3D(object):
     def __init__(self, parent):
         self.parent = parent
@@ -38,6 +57,8 @@ class Object3D(object):
         self._textureTex = None
         self._shaderPath = None
         self._shaderObj = None
+        self._buffers = {}          # property name -> (buffer object, array)
+        self._indexRanges = []      # ranges of primitives changed in place
 
     @property
     def verts(self):
@@ -228,6 +249,49 @@ class Object3D(object):
         indices2 = indices[order,:]
 
         indices[...] = indices2
+        self.markPrimitivesChanged(self.nPrimitives - self.nTransparentPrimitives, self.nPrimitives)
+
+    def markPrimitivesChanged(self, start, end):
+        self._indexRanges.append((start, end))
+
+    def getBuffer(self, name):
+        """
+        Returns the buffer object holding the render buffer of the mesh with
+        the specified property name (verts, norms, color, UVs, tangents or
+        primitives), after uploading the rows that changed since the last
+        call. Only the ranges of render vertices marked by the sync methods of
+        the mesh are uploaded, unless the render buffer was reallocated.
+        """
+        array = getattr(self, name)
+        index = name == 'primitives'
+        buffer = self._buffers.get(name)
+
+        if buffer is None or buffer[1] is not array:
+            if buffer is not None:
+                gl.deleteBuffers([buffer[0]])
+            buffer = self._buffers[name] = (gl.createBuffer(array, index), array)
+            changed = None
+            if index:
+                self._indexRanges = []
+            else:
+                self.parent.takeRenderChanges(array)
+        elif index:
+            changed = self._indexRanges
+            self._indexRanges = []
+        else:
+            changed = self.parent.takeRenderChanges(array)
+            if changed is True:
+                changed = [(0, len(array))]
+            elif changed is not None:
+                changed = coalesceRanges(changed)
+
+        if changed:
+            gl.updateBuffer(buffer[0], array, changed, index)
+        return buffer[0]
+
+    def deleteBuffers(self):
+        gl.deleteBuffers([buffer for buffer, array in self._buffers.values()])
+        self._buffers = {}
 
     @property
     def textureTex(self):
@@ -267,4 +331,5 @@ class Object3D(object):
             return
 
         G.world.remove(mesh.object3d)
+        mesh.object3d.deleteBuffers()
         mesh.object3d = None
@@ -19,7 +19,10 @@
 Abstract
 --------
 
-TODO
+Work queues served by Qt threads.
+
+A Manager calls its callback for every item posted to it, in one or more
+background threads.
 """
 
 from threading import Lock, Condition
@@ -35,49 +38,71 @@ class Queue(object):
     def put(self, values):
         self.cond.acquire()
         self.data.extend(values)
-        self.cond.notify()
+        self.cond.notify_all()
         self.cond.release()
 
-    def get(self):
-        if not self.cond.acquire(False):
-            return []
-        self.cond.wait()
-        result = self.data
-        self.data = []
+    def get(self, count=None):
+        """
+        Wait for items and return them, at most count items if count is given.
+        Returns an empty list when the queue is closed.
+        """
+        self.cond.acquire()
+        while self.live and not self.data:
+            self.cond.wait()
+        if count is None:
+            result = self.data
+            self.data = []
+        else:
+            result = self.data[:count]
+            del self.data[:count]
         self.cond.release()
         return result
 
+    def clear(self):
+        self.cond.acquire()
+        self.data = []
+        self.cond.release()
+
     def close(self):
         self.cond.acquire()
         self.live = False
-        self.cond.notify()
+        self.cond.notify_all()
         self.cond.release()
 
 class Thread(QtCore.QThread):
-    def __init__(self, queue, callback):
+    def __init__(self, queue, callback, count=None):
         QtCore.QThread.__init__(self)
         self.queue = queue
         self.callback = callback
+        self.count = count
 
     def __del__(self):
         self.wait()
 
     def run(self):
         while self.queue.live:
-            for func in self.queue.get():
+            for func in self.queue.get(self.count):
                 self.callback(func)
 
 class Manager(object):
-    def __init__(self, callback):
+    def __init__(self, callback, threads=1):
         self.queue = Queue()
-        self.thread = Thread(self.queue, callback)
+        # With several threads, each takes one item at a time
+        count = 1 if threads > 1 else None
+        self.threads = [Thread(self.queue, callback, count) for i in range(max(1, threads))]
+        self.thread = self.threads[0]
 
     def start(self):
-        self.thread.start()
+        for thread in self.threads:
+            thread.start()
+
+    def post(self, item):
+        self.queue.put([item])
+
+    def clear(self):
+        self.queue.clear()
 
     def stop(self):
         self.queue.close()
-        self.thread.wait()
-
-    def post(self, value):
-        self.queue.put([value])
+        for thread in self.threads:
+            thread.wait()
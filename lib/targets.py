@@ -156,14 +156,21 @@ class Targets(object):
                     dir[head] = {}
                 add_file(dir[head], tail)
 
-        with zipfile.ZipFile(mh.getSysDataPath('targets.npz'), 'r') as npzfile:
-            for file in npzfile.infolist():
-                name = file.filename
-                if not name.endswith('.index.npy'):
-                    continue
-                name = name[:-10] + '.target'
-                path = name.split('/')
+        if os.path.isfile(mh.getSysDataPath('targets.bin')):
+            import algos3d
+            archive = algos3d.TargetArchive(mh.getSysDataPath('targets.bin'))
+            for name in archive.names():
+                path = (name + '.target').split('/')
                 add_file(cls._files, path)
+        else:
+            with zipfile.ZipFile(mh.getSysDataPath('targets.npz'), 'r') as npzfile:
+                for file in npzfile.infolist():
+                    name = file.filename
+                    if not name.endswith('.index.npy'):
+                        continue
+                    name = name[:-10] + '.target'
+                    path = name.split('/')
+                    add_file(cls._files, path)
 
         with open(mh.getSysDataPath('images.list'), 'r') as imgfile:
             for line in imgfile:
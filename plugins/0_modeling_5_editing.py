@@ -266,7 +266,9 @@ class EditingTaskView(gui3d.TaskView):
         human = gui3d.app.selectedHuman
         morph = EditTarget(human.meshData, self.verts,
                            human.meshData.coord[self.verts] - self.original)
+        # There is no target file to reload an edit from
         algos3d.targetBuffer[morph.name] = morph
+        algos3d.targetBuffer.pin(morph.name)
         morph._save_binary(morph.name)
         gui3d.app.do(EditAction(human, [morph.name], 1.0))
 
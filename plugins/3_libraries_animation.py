@@ -393,6 +393,30 @@ class AnimationLibrary(gui3d.TaskView):
             self.interpolate = self.interpolateTggl.selected
         self.interpolateTggl.setSelected(True)
 
+        self.bakeTggl = self.playbackBox.addWidget(gui.ToggleButton("Bake playback"))
+        @self.bakeTggl.mhEvent
+        def onClicked(event):
+            self.updateBaking()
+
+    def updateBaking(self):
+        """
+        Bake or unbake the highlighted animation, depending on the bake toggle.
+        Baked animations precompute the skinning matrices of every frame and
+        cache skinned vertices. Both count toward the 'animationCacheSize'
+        setting (in MB), animations whose matrices exceed it are not baked.
+        """
+        if not self.animTrack or not self.human.animated:
+            return
+        name = self.animTrack.name
+        if self.bakeTggl.selected:
+            if not self.human.animated.isBaked(name):
+                cacheSize = gui3d.app.settings.get('animationCacheSize', 256)
+                if not self.human.animated.bakeAnimation(name, cacheSize * 1024 * 1024):
+                    self.bakeTggl.setSelected(False)
+                    gui3d.app.statusPersist('Animation %s is too long to bake in the animation cache of %d MB.', name, cacheSize)
+        else:
+            self.human.animated.removeBakedAnimation(name)
+
     def startPlayback(self):
         self.playPauseBtn.setText('Pause')
         if self.timer:
@@ -463,6 +487,7 @@ class AnimationLibrary(gui3d.TaskView):
         log.debug("Setting animation to %s", anim.name)
 
         self.human.animated.setAnimateInPlace(self.animateInPlaceTggl.selected)
+        self.updateBaking()
 
         if self.frameSlider:
             self.frameSlider.setMin(0)
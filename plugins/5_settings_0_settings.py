@@ -27,6 +27,7 @@ import mh
 import gui3d
 import gui
 import log
+import algos3d
 
 class ThemeRadioButton(gui.RadioButton):
 
@@ -85,6 +86,9 @@ class SettingsTaskView(gui3d.TaskView):
         preloadBox = self.addLeftWidget(gui.GroupBox('Preloading'))
         self.preload = preloadBox.addWidget(gui.CheckBox("Preload macro targets",
             gui3d.app.settings.get('preloadTargets', False)))
+        preloadBox.addWidget(gui.TextView('Target cache size (MB, 0 = unlimited)'))
+        self.targetCacheSize = preloadBox.addWidget(gui.TextEdit(
+            str(gui3d.app.settings.get('targetCacheSize', 256))))
         
         themes = []
         themesBox = self.themesBox = self.addRightWidget(gui.GroupBox('Theme'))
@@ -156,6 +160,15 @@ class SettingsTaskView(gui3d.TaskView):
         def onClicked(event):
             gui3d.app.settings['preloadTargets'] = self.preload.selected
 
+        @self.targetCacheSize.mhEvent
+        def onChange(value):
+            try:
+                size = max(0, int(value.strip()))
+            except ValueError: # The user hasn't typed the value correctly yet.
+                return
+            gui3d.app.settings['targetCacheSize'] = size
+            algos3d.targetBuffer.setBudget(size * 1024 * 1024 if size else None)
+
     def onShow(self, event):
         gui3d.TaskView.onShow(self, event)
     
@@ -35,6 +35,7 @@ import log
 
 import gui3d
 import exportutils
+from exportutils import serialize
 import posemode
 
 #
@@ -475,9 +476,7 @@ def writeGeometry(fp, rmesh, config):
         '          ')
 
 
-    for co in obj.coord:
-        (x,y,z) = rotateLoc(co, config)
-        fp.write("%.4f %.4f %.4f " % (x,y,z))
+    serialize.writeArray(fp, "%.4f %.4f %.4f ", rotateCoords(obj.coord, config))
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -500,9 +499,7 @@ def writeGeometry(fp, rmesh, config):
             '          <float_array count="%d" id="%s-Normals-array">\n' % (3*nNormals,rmesh.name) +
             '          ')
 
-        for no in obj.fnorm:
-            (x,y,z) = rotateLoc(no, config)
-            fp.write("%.4f %.4f %.4f " % (x,y,z))
+        serialize.writeArray(fp, "%.4f %.4f %.4f ", rotateCoords(obj.fnorm, config))
 
         fp.write('\n' +
             '          </float_array>\n' +
@@ -523,8 +520,7 @@ def writeGeometry(fp, rmesh, config):
         '           ')
 
 
-    for uv in obj.texco:
-        fp.write(" %.4f %.4f" % tuple(uv))
+    serialize.writeArray(fp, " %.4f %.4f", obj.texco)
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -570,11 +566,9 @@ def writeShapeKey(fp, name, shape, rmesh, config):
         '           ')
 
     target = np.array(obj.coord)
-    for n,dr in list(shape.items()):
-        target[n] += np.array(dr)
-    for co in target:
-        loc = rotateLoc(co, config)
-        fp.write(" %.4g %.4g %.4g" % tuple(loc))
+    if shape:
+        target[list(shape.keys())] += np.array(list(shape.values()))
+    serialize.writeArray(fp, " %.4g %.4g %.4g", rotateCoords(target, config))
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -616,21 +610,14 @@ def writeShapeKey(fp, name, shape, rmesh, config):
         #'          <input semantic="NORMAL" source="#%sMeshMorph_%s-normals" offset="1"/>\n' % (rmesh.name, name) +
         '          <vcount>')
 
-    for fv in obj.fvert:
-        if fv[0] == fv[3]:
-            fp.write("3 ")
-        else:
-            fp.write("4 ")
+    sizes = serialize.getFaceSizes(obj.fvert)
+    serialize.writeArray(fp, "%d ", sizes)
 
     fp.write('\n' +
         '          </vcount>\n' +
         '          <p>')
 
-    for fv in obj.fvert:
-        if fv[0] == fv[3]:
-            fp.write("%d %d %d " % (fv[0], fv[1], fv[2]))
-        else:
-            fp.write("%d %d %d %s " % (fv[0], fv[1], fv[2], fv[3]))
+    serialize.writeFaces(fp, "%d ", [obj.fvert], sizes, '', '', '')
 
     fp.write('\n' +
         '          </p>\n' +
@@ -679,28 +666,18 @@ def writePolylist(fp, rmesh, config):
         '          <input offset="1" semantic="TEXCOORD" source="#%s-UV"/>\n' % rmesh.name +
         '          <vcount>')
 
-    for fv in obj.fvert:
-        if fv[0] == fv[3]:
-            fp.write('3 ')
-        else:
-            fp.write('4 ')
+    sizes = serialize.getFaceSizes(obj.fvert)
+    serialize.writeArray(fp, '%d ', sizes)
 
     fp.write('\n' +
         '          </vcount>\n'
         '          <p>')
 
-    for fn,fv in enumerate(obj.fvert):
-        fuv = obj.fuvs[fn]
-        if fv[0] == fv[3]:
-            nverts = 3
-        else:
-            nverts = 4
-        if config.useNormals:
-            for n in range(nverts):
-                fp.write("%d %d %d " % (fv[n], fn, fuv[n]))
-        else:
-            for n in range(nverts):
-                fp.write("%d %d " % (fv[n], fuv[n]))
+    if config.useNormals:
+        fnums = serialize.getFaceIndices(len(obj.fvert))
+        serialize.writeFaces(fp, "%d %d %d ", [obj.fvert, fnums, obj.fuvs], sizes, '', '', '')
+    else:
+        serialize.writeFaces(fp, "%d %d ", [obj.fvert, obj.fuvs], sizes, '', '', '')
 
     fp.write(
         '          </p>\n' +
@@ -713,13 +690,14 @@ def writePolylist(fp, rmesh, config):
 
 def checkFaces(rmesh, nVerts, nUvVerts):
     obj = rmesh.object
-    for fn,fverts in enumerate(obj.fvert):
-        for n,vn in enumerate(fverts):
-            uv = obj.fuvs[fn][n]
-            if vn > nVerts:
-                raise NameError("v %d > %d" % (vn, nVerts))
-            if uv > nUvVerts:
-                raise NameError("uv %d > %d" % (uv, nUvVerts))
+    if len(obj.fvert) == 0:
+        return
+    vn = obj.fvert.max()
+    if vn > nVerts:
+        raise NameError("v %d > %d" % (vn, nVerts))
+    uv = obj.fuvs.max()
+    if uv > nUvVerts:
+        raise NameError("uv %d > %d" % (uv, nUvVerts))
     return
 
 
@@ -767,6 +745,14 @@ def rotateLoc(loc, config):
     return (x,y,z)
 
 
+def rotateCoords(coords, config):
+    """
+    Array version of rotateLoc, for (n, 3) coordinates. Like rotateLoc, it
+    leaves the coordinates unchanged.
+    """
+    return coords
+
+
 def writeBone(fp, hier, orig, extra, pad, amt, config):
     (bone, children) = hier
     if bone:
@@ -39,7 +39,7 @@ def exportObj(human, filepath, config=None):
     filename = os.path.basename(filepath)
     name = config.goodName(os.path.splitext(filename)[0])
 
-    rmeshes,_amt = exportutils.collect.setupObjects(
+    _amt,rmeshes = exportutils.collect.streamObjects(
         name,
         human,
         config=config,
@@ -48,7 +48,8 @@ def exportObj(human, filepath, config=None):
         lashes=config.lashes,
         subdivide=config.subdivide)
 
-    objects = [rmesh.richMesh.object for rmesh in rmeshes]
+    # Each mesh is written as soon as it is ready
+    objects = (rmesh.object for rmesh in rmeshes)
     wavefront.writeObjFile(filepath, objects, True, config)
 
     return
@@ -33,8 +33,9 @@ Requires:
 __docformat__ = 'restructuredtext'
 
 import os
-import struct
+import numpy as np
 import exportutils
+import exportutils.serialize
 
 def exportStlAscii(human, filepath, config, exportJoints = False):
     """
@@ -71,31 +72,23 @@ def exportStlAscii(human, filepath, config, exportJoints = False):
     f.write('solid %s\n' % solid)
 
     for rmesh in rmeshes:
-        obj = rmesh.richMesh.object
-
-        for fn,fv in enumerate(obj.fvert):
-            f.write('facet normal %f %f %f\n' % tuple(obj.fnorm[fn]))
-            f.write('\touter loop\n')
-            f.write('\t\tvertex %f %f %f\n' % tuple(obj.coord[fv[0]]))
-            f.write('\t\tvertex %f %f %f\n' % tuple(obj.coord[fv[1]]))
-            f.write('\t\tvertex %f %f %f\n' % tuple(obj.coord[fv[2]]))
-            f.write('\tendloop\n')
-            f.write('\tendfacet\n')
-
-            if fv[0] != fv[3]:
-                f.write('facet normal %f %f %f\n' % tuple(obj.fnorm[fn]))
-                f.write('\touter loop\n')
-                f.write('\t\tvertex %f %f %f\n' % tuple(obj.coord[fv[2]]))
-                f.write('\t\tvertex %f %f %f\n' % tuple(obj.coord[fv[3]]))
-                f.write('\t\tvertex %f %f %f\n' % tuple(obj.coord[fv[0]]))
-                f.write('\tendloop\n')
-                f.write('\tendfacet\n')
+        obj = rmesh.object
+        tris, faces = exportutils.serialize.triangulate(obj.fvert)
+        data = np.hstack([obj.fnorm[faces], obj.coord[tris].reshape((-1,9))])
+        exportutils.serialize.writeArray(f,
+            'facet normal %f %f %f\n' +
+            '\touter loop\n' +
+            '\t\tvertex %f %f %f\n' +
+            '\t\tvertex %f %f %f\n' +
+            '\t\tvertex %f %f %f\n' +
+            '\tendloop\n' +
+            '\tendfacet\n', data)
 
     f.write('endsolid %s\n' % solid)
     f.close()
 
 
-def exportStlBinary(human, filename, config, exportJoints = False):
+def exportStlBinary(human, filepath, config, exportJoints = False):
     """
     human:
       *Human*.  The object whose information is to be used for the export.
@@ -120,29 +113,11 @@ def exportStlBinary(human, filename, config, exportJoints = False):
         lashes=config.lashes,
         subdivide=config.subdivide)
 
-    # TL: should loop over rmesh (clothes etc) but only do nude human for now.
-
-    f = open(filename, 'wb')
-    f.write('\x00' * 80)
-    f.write(struct.pack('<I', 0))
-    count = 0
-    for fn,fverts in enumerate(obj.fvert):
-        fno = obj.fnorm[fn]
-
-        f.write(struct.pack('<fff', fno[0], fno[1], fno[2]))
-        f.write(struct.pack('<fff', fverts[0][0], fverts[0][1], fverts[0][2]))
-        f.write(struct.pack('<fff', fverts[1][0], fverts[1][1], fverts[1][2]))
-        f.write(struct.pack('<fff', fverts[2][0], fverts[2][1], fverts[2][2]))
-        f.write(struct.pack('<H', 0))
-        count += 1
-
-        f.write(struct.pack('<fff', fno[0], fno[1], fno[2]))
-        f.write(struct.pack('<fff', fverts[2][0], fverts[2][1], fverts[2][2]))
-        f.write(struct.pack('<fff', fverts[3][0], fverts[3][1], fverts[3][2]))
-        f.write(struct.pack('<fff', fverts[0][0], fverts[0][1], fverts[0][2]))
-        f.write(struct.pack('<H', 0))
-        count += 1
-    f.seek(80)
-    f.write(struct.pack('<I', count))
-
+    triangles = []
+    for rmesh in rmeshes:
+        obj = rmesh.object
+        triangles.append(exportutils.serialize.getStlTriangles(obj.coord, obj.fvert, obj.fnorm))
 
+    f = open(filepath, 'wb')
+    exportutils.serialize.writeStlBinary(f, triangles)
+    f.close()
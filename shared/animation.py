@@ -24,6 +24,7 @@ Data handlers for skeletal animation.
 
 import math
 import numpy as np
+import log
 
 
 INTERPOLATION = {
@@ -52,7 +53,7 @@ class AnimationTrack(object):
         self.name = name
         self.dataLen = len(poseData)
         self.nFrames = nFrames
-        self.nBones = self.dataLen/nFrames
+        self.nBones = self.dataLen//nFrames
 
         if self.nBones*self.nFrames != self.dataLen:
             raise RuntimeError("The specified pose data does not have the proper length. Is %s, expected %s (nBones*nFrames)." % (self.dataLen, self.nBones*self.nFrames))
@@ -113,7 +114,7 @@ class AnimationTrack(object):
             frameIdx = self.nFrames-1
             fraction = 0
 
-        return frameIdx, fraction
+        return int(frameIdx), fraction
 
     def isLooping(self):
         return self.loop
@@ -145,7 +146,59 @@ class AnimationTrack(object):
         self.data = data
         self.frameRate = newFrameRate
         self.dataLen = len(self.data)
-        self.nFrames = self.dataLen/self.nBones
+        self.nFrames = self.dataLen//self.nBones
+
+class BakedAnimation(object):
+    """
+    Precomputed playback data of an animation track for an animated mesh.
+    Stores the pose, global pose and skinning (matPoseVerts) matrices of the
+    skeleton for every frame, and caches the skinned vertex coordinates of the
+    meshes per frame, so that playing back a frame that was seen before is
+    only a lookup. The memory cap includes the matrices, the coordinates are
+    cached in what remains of it.
+    The baked data becomes invalid when the pose data of the track is
+    replaced (eg. by sparsify()).
+    """
+
+    def __init__(self, anim, poses, poseGlobals, poseVerts, inPlace, maxBytes=None):
+        self.anim = anim
+        self.data = anim.data
+        self.inPlace = inPlace
+        self.poses = poses              # np.array((nFrames, nBones, 4, 4))
+        self.poseGlobals = poseGlobals  # np.array((nFrames, nBones, 4, 4))
+        self.poseVerts = poseVerts      # np.array((nFrames, nBones, 4, 4))
+        self.maxBytes = maxBytes        # Memory cap, None to cache no vertex coordinates
+        self.matrixBytes = poses.nbytes + poseGlobals.nbytes + poseVerts.nbytes
+        self.nbytes = self.matrixBytes
+        self.coords = {}                # (meshIdx, frameIdx) -> skinned coordinates
+
+    def isValid(self, anim, inPlace):
+        return self.anim is anim and self.data is anim.data and self.inPlace == inPlace
+
+    def getMatrices(self, frameIdx, fraction=0):
+        """
+        Returns the pose, global pose and skinning matrices at the specified
+        frame. With a fraction, the matrices of the frame and the next one are
+        blended linearly, like AnimationTrack.getAtTime blends pose data.
+        """
+        if fraction == 0:
+            return self.poses[frameIdx], self.poseGlobals[frameIdx], self.poseVerts[frameIdx]
+        nextIdx = (frameIdx + 1) % len(self.poseVerts)
+        return tuple(mats[frameIdx] * (1-fraction) + mats[nextIdx] * fraction
+                     for mats in (self.poses, self.poseGlobals, self.poseVerts))
+
+    def getCoords(self, meshIdx, frameIdx):
+        return self.coords.get((meshIdx, frameIdx))
+
+    def storeCoords(self, meshIdx, frameIdx, coords):
+        if self.maxBytes is None or self.nbytes + coords.nbytes > self.maxBytes:
+            return
+        self.coords[(meshIdx, frameIdx)] = coords
+        self.nbytes += coords.nbytes
+
+    def clearCoords(self):
+        self.coords = {}
+        self.nbytes = self.matrixBytes
 
 class AnimatedMesh(object):
     """
@@ -159,7 +212,9 @@ class AnimatedMesh(object):
         self.__skeleton = skel
         self.__meshes = []
         self.__vertexToBoneMaps = []
+        self.__skinningTables = []
         self.__originalMeshCoords = []
+        self.__baked = {}
         self.addMesh(mesh, vertexToBoneMapping)
 
         self.__animations = {}
@@ -183,13 +238,62 @@ class AnimatedMesh(object):
 
     def removeAnimations(self):
         self.__animations = {}
+        self.__baked = {}
         self.__currentAnim = None
 
     def removeAnimation(self, name):
         del self.__animations[name]
+        self.removeBakedAnimation(name)
         if self.__currentAnim and self.__currentAnim.name == name:
             self.__currentAnim = None
 
+    def bakeAnimation(self, name, maxBytes=None):
+        """
+        Precompute the skeleton matrices of all frames of the specified
+        animation, for playback without evaluating the skeleton pose.
+        If maxBytes is set, it caps the memory used by the baked animation:
+        an animation whose matrices alone need more is not baked, and
+        skinned vertex coordinates are cached per frame during playback in
+        the remaining memory.
+        With linear interpolation, playback between frames blends the baked
+        matrices of the surrounding frames, which differs slightly from
+        posing the skeleton with blended pose data.
+        Returns True if the animation was baked.
+        """
+        anim = self.__animations[name]
+        nFrames = int(anim.nFrames)
+        nBones = self.__skeleton.getBoneCount()
+        matrixBytes = 3 * nFrames * nBones * 16 * np.dtype(np.float32).itemsize
+        if maxBytes is not None and matrixBytes > maxBytes:
+            log.warning('Not baking animation %s: its %d frames need %.1f MB, more than the cache size of %.1f MB',
+                        name, nFrames, matrixBytes / (1024.0 * 1024), maxBytes / (1024.0 * 1024))
+            return False
+        skel = self.__skeleton
+        poses = np.zeros((nFrames, nBones, 4, 4), dtype=np.float32)
+        poseGlobals = np.zeros((nFrames, nBones, 4, 4), dtype=np.float32)
+        poseVerts = np.zeros((nFrames, nBones, 4, 4), dtype=np.float32)
+        for frameIdx in range(nFrames):
+            skel.setPose(self._getPoseState(anim.getAtFramePos(frameIdx)))
+            poses[frameIdx] = skel.matPose
+            poseGlobals[frameIdx] = skel.matPoseGlobal
+            poseVerts[frameIdx] = skel.getPoseVertsMatrices()
+        self.__baked[name] = BakedAnimation(anim, poses, poseGlobals, poseVerts, self.__inPlace, maxBytes)
+
+        # Restore current pose
+        self._pose()
+        return True
+
+    def isBaked(self, name):
+        return name in self.__baked and self.__baked[name].isValid(self.__animations[name], self.__inPlace)
+
+    def removeBakedAnimation(self, name):
+        if name in self.__baked:
+            del self.__baked[name]
+
+    def _clearBakedCoords(self):
+        for baked in list(self.__baked.values()):
+            baked.clearCoords()
+
     def setActiveAnimation(self, name):   # TODO maybe allow blending of several activated animations
         if not name:
             self.__currentAnim = None
@@ -209,6 +313,9 @@ class AnimatedMesh(object):
         originalMeshCoords[:,:3] = mesh.coord[:,:3]        
         self.__originalMeshCoords.append(originalMeshCoords)
         self.__vertexToBoneMaps.append(vertexToBoneMapping)
+        # Convert the mapping once to a fixed width table for batched skinning
+        self.__skinningTables.append(self.__skeleton.getSkinningTable(vertexToBoneMapping, mesh.getVertexCount()))
+        self._clearBakedCoords()
         self.__meshes.append(mesh)
 
     def removeMesh(self, name):
@@ -227,6 +334,8 @@ class AnimatedMesh(object):
             del self.__meshes[rIdx]
             del self.__originalMeshCoords[rIdx]
             del self.__vertexToBoneMaps[rIdx]
+            del self.__skinningTables[rIdx]
+            self._clearBakedCoords()
 
     def containsMesh(self, mesh):
         mesh2, _ = self.getMesh(mesh.name)
@@ -273,19 +382,59 @@ class AnimatedMesh(object):
     def getTime(self):
         return self.__playTime
 
+    def _getPoseState(self, poseState):
+        if self.__inPlace:
+            poseState = poseState.copy()
+            # Remove translation from matrix
+            poseState[:,:3,3] = np.zeros((poseState.shape[0],3), dtype=np.float32)
+        return poseState
+
+    def _poseBaked(self, baked):
+        """
+        Pose the skeleton and the meshes from baked animation data. Returns
+        False if the interpolation type of the track is not supported and
+        the pose has to be computed.
+        """
+        anim = self.__currentAnim
+        frameIdx, fraction = anim.getFrameIndexAtTime(self.__playTime)
+        if anim.interpolationType == 0:
+            fraction = 0
+        elif fraction != 0 and anim.interpolationType != 1:
+            return False
+
+        matPose, matPoseGlobal, poseVerts = baked.getMatrices(frameIdx, fraction)
+        self.__skeleton.setPoseMatrices(matPose, matPoseGlobal, poseVerts)
+        for idx,mesh in enumerate(self.__meshes):
+            if self.onlyAnimateVisible and not mesh.visibility:
+                continue
+            # Only coordinates of exact frames are cached
+            posedCoords = baked.getCoords(idx, frameIdx) if fraction == 0 else None
+            if posedCoords is None:
+                posedCoords = self.__skinningTables[idx].skin(poseVerts, self.__originalMeshCoords[idx])
+                posedCoords = np.ascontiguousarray(posedCoords[:,:3], dtype=np.float32)
+                if fraction == 0:
+                    baked.storeCoords(idx, frameIdx, posedCoords)
+            self._updateMeshVerts(mesh, posedCoords)
+        return True
+
     def _pose(self):
         if self.__currentAnim:
-            poseState = self.__currentAnim.getAtTime(self.__playTime)
-            if self.__inPlace:
-                poseState = poseState.copy()
-                # Remove translation from matrix
-                poseState[:,:3,3] = np.zeros((poseState.shape[0],3), dtype=np.float32)
-            # TODO pass poseVerts matrices immediately from animation track for performance improvement (cache them)
+            baked = self.__baked.get(self.__currentAnim.name)
+            if baked:
+                if not baked.isValid(self.__currentAnim, self.__inPlace):
+                    # Pose data or in-place setting changed since baking
+                    if self.bakeAnimation(self.__currentAnim.name, baked.maxBytes):
+                        return
+                    self.removeBakedAnimation(self.__currentAnim.name)
+                elif self._poseBaked(baked):
+                    return
+
+            poseState = self._getPoseState(self.__currentAnim.getAtTime(self.__playTime))
             self.__skeleton.setPose(poseState)
             for idx,mesh in enumerate(self.__meshes):
                 if self.onlyAnimateVisible and not mesh.visibility:
                     continue
-                posedCoords = self.__skeleton.skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx])
+                posedCoords = self.__skeleton.skinMesh(self.__originalMeshCoords[idx], self.__skinningTables[idx])
                 # TODO you could avoid an array copy by passing the mesh.coord list directly and modifying it in place
                 self._updateMeshVerts(mesh, posedCoords[:,:3])
         else:
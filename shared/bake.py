@@ -0,0 +1,318 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           Glynn Clements, Jonas Hauquier
+
+**Copyright(c):**      MakeHuman Team 2001-2013
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Batch baking of texture maps.
+
+A Baker renders a list of bake passes for a human with the software
+rasterizer, so it needs no OpenGL context and does not depend on the camera or
+the selected human of the running application. The same human is reused for
+every model that is baked, and the images are saved by a pool of writer
+threads while the next pass renders.
+
+Supported passes:
+lightmap        Lightmap for a single light
+scenelighting   Lightmap for all lights of a scene
+uvmap           UV map topology
+mask            Texture map mask
+
+Run from the MakeHuman folder to bake models from the command line:
+
+    python shared/bake.py -p scenelighting,uvmap -s studio.mhscene -o bakes models/*.mhm
+
+Without the GUI plugins only the modifiers can be loaded from models. Other
+lines (like measurements, custom targets, expressions or proxies) are reported
+for each model, and with --strict such a model is not baked.
+"""
+
+import sys
+import os
+import threading
+from collections import OrderedDict
+
+if __name__ == '__main__':
+    sys.path = ["./core", "./lib", "./shared", "./apps"] + sys.path
+
+import log
+import mh
+import scene
+import projection
+
+
+class ImageWriter(object):
+    """
+    Saves images in a number of background threads.
+    """
+
+    def __init__(self, threads=2):
+        self.cond = threading.Condition(threading.Lock())
+        self.pending = []
+        self.live = True
+        self.threads = [threading.Thread(target=self._run) for i in range(max(1, threads))]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def post(self, image, path):
+        with self.cond:
+            self.pending.append((image, path))
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.live and not self.pending:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                image, path = self.pending.pop(0)
+            try:
+                image.save(path)
+                log.message('Saved %s', path)
+            except Exception:
+                log.error('Error saving %s', path, exc_info=True)
+
+    def close(self):
+        """
+        Wait until all posted images are saved and stop the threads.
+        """
+        with self.cond:
+            self.live = False
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+
+#----------------------------------------------------------
+#   Bake passes
+#----------------------------------------------------------
+
+def bakeLightmap(baker, human):
+    return projection.mapLightingSoft(baker.lightpos, baker.progress, human.mesh,
+                                      baker.dimensions, baker.processes)
+
+def bakeSceneLighting(baker, human):
+    if baker.scene is None:
+        raise RuntimeError('The scenelighting pass needs a scene')
+
+    def mapLight(lightpos, progressCallback, mesh):
+        return projection.mapLightingSoft(lightpos, progressCallback, mesh,
+                                          baker.dimensions, baker.processes)
+
+    return projection.mapSceneLighting(baker.scene, baker.progress, human, mapLight, baker.dimensions)
+
+def bakeUVMap(baker, human):
+    return projection.mapUVSoft(human.mesh, baker.dimensions, baker.progress)
+
+def bakeMask(baker, human):
+    return projection.mapMaskSoft(baker.dimensions, human.mesh, baker.processes)
+
+BAKE_PASSES = OrderedDict([
+    ('lightmap', bakeLightmap),
+    ('scenelighting', bakeSceneLighting),
+    ('uvmap', bakeUVMap),
+    ('mask', bakeMask),
+    ])
+
+
+#----------------------------------------------------------
+#   class Baker
+#----------------------------------------------------------
+
+class Baker(object):
+    """
+    Bakes texture maps for a human, see BAKE_PASSES for the available passes.
+    """
+
+    def __init__(self, human, dimensions=(1024, 1024), processes=1, writers=2, lightpos=(-10.99, 20.0, 20.0), strict=False):
+        self.human = human
+        self.dimensions = dimensions
+        self.strict = strict
+        self.processes = processes
+        self.lightpos = lightpos
+        self.scene = None
+        self.writer = ImageWriter(writers)
+
+    def progress(self, value):
+        pass
+
+    def loadScene(self, path):
+        self.scene = scene.Scene(path)
+
+    def loadModel(self, path):
+        """
+        Load a model into the human. Lines of the model that cannot be loaded
+        are reported, or raise a RuntimeError if strict is set.
+        """
+        import gui3d
+        log.message('Loading model %s', path)
+        unsupported = getUnsupportedLines(gui3d.app, path)
+        if unsupported:
+            text = '; '.join([' '.join(words) for words in unsupported])
+            if self.strict:
+                raise RuntimeError('Model %s has %d lines that cannot be loaded: %s' % (path, len(unsupported), text))
+            log.warning('Model %s has %d lines that cannot be loaded and are ignored: %s', path, len(unsupported), text)
+        self.human.load(path, True)
+
+    def bake(self, passes, outputDir, name):
+        """
+        Bake the passes for the current state of the human and queue the images
+        to be saved as <outputDir>/<name>_<pass>.png.
+        Returns the paths of the images.
+        """
+        for bakePass in passes:
+            if bakePass not in BAKE_PASSES:
+                raise KeyError('Unknown bake pass %s' % bakePass)
+
+        if not os.path.exists(outputDir):
+            os.makedirs(outputDir)
+
+        paths = []
+        for bakePass in passes:
+            log.message('Baking %s %s', name, bakePass)
+            image = BAKE_PASSES[bakePass](self, self.human)
+            path = os.path.join(outputDir, '%s_%s.png' % (name, bakePass))
+            self.writer.post(image, path)
+            paths.append(path)
+        return paths
+
+    def bakeModels(self, modelPaths, passes, outputDir):
+        """
+        Load each model in turn into the human and bake the passes for it.
+        Returns the paths of the images and the paths of the models that
+        could not be baked.
+        """
+        paths = []
+        failed = []
+        for modelPath in modelPaths:
+            try:
+                self.loadModel(modelPath)
+                name = os.path.splitext(os.path.basename(modelPath))[0]
+                paths.extend(self.bake(passes, outputDir, name))
+            except Exception:
+                log.error('Error baking %s', modelPath, exc_info=True)
+                failed.append(modelPath)
+        return paths, failed
+
+    def close(self):
+        self.writer.close()
+
+
+#----------------------------------------------------------
+#   Command line
+#----------------------------------------------------------
+
+def getUnsupportedLines(app, path):
+    """
+    Returns the lines (as lists of words) of a model file that the
+    application has no load handler for, or that set an unknown modifier.
+    """
+    modifiers = getattr(app, 'modifiers', {})
+    unsupported = []
+    with open(path, 'r') as f:
+        for line in f:
+            words = line.split()
+            if not words or words[0] == '#' or words[0] in ('version', 'tags'):
+                continue
+            if words[0] not in app.loadHandlers:
+                unsupported.append(words)
+            elif words[0] in modifiers and (len(words) < 3 or words[1] not in modifiers[words[0]]):
+                unsupported.append(words)
+    return unsupported
+
+
+def createApplication():
+    """
+    Application without window or OpenGL context, holding a human to bake.
+    The modifiers are loaded from their definitions in humanmodifier, the
+    other load handlers are defined by plugins, which are not loaded.
+    """
+    import gui3d
+    import files3d
+    import human
+    import humanmodifier
+
+    class BakeApplication(gui3d.Application):
+
+        def __init__(self):
+            gui3d.Application.__init__(self)
+            self.loadHandlers = {}
+            self.saveHandlers = []
+            self.selectedHuman = human.Human(files3d.loadMesh(mh.getSysDataPath("3dobjs/base.obj")))
+
+            self.modifiers = humanmodifier.loadModifiers()
+            for group in self.modifiers:
+                self.addLoadHandler(group, self.loadModifierHandler)
+
+        def addLoadHandler(self, keyword, handler):
+            self.loadHandlers[keyword] = handler
+
+        def loadModifierHandler(self, human, values):
+            modifier = self.modifiers[values[0]].get(values[1], None)
+            if modifier:
+                modifier.setValue(human, float(values[2]))
+
+        def progress(self, value, text=None):
+            pass
+
+    return BakeApplication()
+
+
+def main(argv):
+    from optparse import OptionParser
+
+    parser = OptionParser(usage='%prog [options] model.mhm ...')
+    parser.add_option('-p', '--passes', default='lightmap',
+                      help='comma separated bake passes (%s)' % ', '.join(BAKE_PASSES.keys()))
+    parser.add_option('-s', '--scene', help='scene file for the scenelighting pass')
+    parser.add_option('-o', '--output', default='.', help='output folder')
+    parser.add_option('-W', '--width', type='int', default=1024)
+    parser.add_option('-H', '--height', type='int', default=1024)
+    parser.add_option('-j', '--processes', type='int', default=0,
+                      help='rasterizer processes, 0 for one per CPU')
+    parser.add_option('-w', '--writers', type='int', default=2, help='image writer threads')
+    parser.add_option('--strict', action='store_true', default=False,
+                      help='do not bake models with lines that cannot be loaded')
+    options, models = parser.parse_args(argv)
+
+    if not models:
+        parser.error('no models given')
+    passes = [p for p in options.passes.split(',') if p]
+    for bakePass in passes:
+        if bakePass not in BAKE_PASSES:
+            parser.error('unknown bake pass %s' % bakePass)
+
+    app = createApplication()
+    baker = Baker(app.selectedHuman, (options.width, options.height), options.processes, options.writers,
+                  strict=options.strict)
+    try:
+        if options.scene:
+            baker.loadScene(options.scene)
+        paths, failed = baker.bakeModels(models, passes, options.output)
+    finally:
+        baker.close()
+
+    if failed:
+        log.error('%d of %d models were not baked: %s', len(failed), len(models), ' '.join(failed))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -165,16 +165,10 @@ class BVH():
                             rot = tm.rotation_matrix(-angle*D, [0,0,1])
                             # Roll around global Y axis (this is a limitation)
                             roll = tm.rotation_matrix(angle*D, [0,1,0])
-                            for i in range(nFrames):
-                                # TODO make into numpy loop
-                                poseMats[i] = np.dot(poseMats[i], rot)
-                                poseMats[i] = np.dot(poseMats[i], roll)
+                            poseMats[...] = np.matmul(np.matmul(poseMats, rot), roll)
                     else:   # Compensation (angle) is a transformation matrix
                         # Compensate animation frames
-                        for i in range(nFrames):
-                            # TODO make into numpy loop
-                            poseMats[i] = np.mat(poseMats[i]) * np.mat(angle)
-                            #poseMats[i] = np.mat(angle) # Test compensated rest pose
+                        poseMats[...] = np.matmul(poseMats, np.asarray(angle))
                     jointsData.append(poseMats)
                 else:
                     jointsData.append(animation.emptyTrack(nFrames))
@@ -201,7 +195,7 @@ class BVH():
         return name in self.joints
 
     def __cacheGetJoints(self):
-        from queue import deque
+        from collections import deque
 
         result = []
         queue = deque([self.rootJoint])
@@ -229,29 +223,23 @@ class BVH():
         Loads both the skeleton hierarchy and the animation track from the 
         specified BVH file.
         """
-        fp = open(filepath, "rU")
+        with open(filepath, "r") as fp:
+            # Read hierarchy
+            self.__expectKeyword('HIERARCHY', fp)
+            words = self.__expectKeyword('ROOT', fp)
+            rootJoint = self.addRootJoint(words[1])
 
-        # Read hierarchy
-        self.__expectKeyword('HIERARCHY', fp)
-        words = self.__expectKeyword('ROOT', fp)
-        rootJoint = self.addRootJoint(words[1])        
+            self.__readJoint(self.rootJoint, fp)
 
-        self.__readJoint(self.rootJoint, fp)
+            # Read motion
+            self.__expectKeyword('MOTION', fp)
 
-        # Read motion
-        self.__expectKeyword('MOTION', fp)
+            words = self.__expectKeyword('Frames:', fp)
+            self.frameCount = int(words[1])
+            words = self.__expectKeyword('Frame', fp) # Time:
+            self.frameTime = float(words[2])
 
-        words = self.__expectKeyword('Frames:', fp)
-        self.frameCount = int(words[1])
-        words = self.__expectKeyword('Frame', fp) # Time:
-        self.frameTime = float(words[2])
-
-        for i in range(self.frameCount):
-            line = fp.readline()
-            words = line.split()
-            data = [float(word) for word in words]
-            for joint in self.getJointsBVHOrder():
-                data = self.__processChannelData(joint, data)
+            self.__readMotion(fp)
 
         self.__cacheGetJoints()
 
@@ -460,16 +448,26 @@ class BVH():
             else:
                 raise RuntimeError('Expected %s found %s' % ('JOINT, End Site or }', words[0]))
 
-    def __processChannelData(self, joint, data):
+    def __readMotion(self, fp):
         """
-        Distribute animation channel data for one frame or motion sample, 
-        loaded from a BVH file, among the joints of the skeleton structure.
+        Read the motion data of all frames, which follows the frame time in a
+        BVH file, in one go and distribute its columns among the joints of the
+        skeleton structure, in the order in which they were defined.
         """
-        nChannels = len(joint.channels)
-        joint.frames.extend(data[:nChannels])
-        data = data[nChannels:]
+        joints = self.getJointsBVHOrder()
+        nChannels = sum([len(joint.channels) for joint in joints])
+        nValues = self.frameCount * nChannels
+
+        data = np.fromstring(fp.read(), dtype=np.float32, sep=' ')
+        if len(data) < nValues:
+            raise RuntimeError('Expected %s values of motion data found %s' % (nValues, len(data)))
+        data = data[:nValues].reshape((self.frameCount, nChannels))
 
-        return data
+        offset = 0
+        for joint in joints:
+            n = len(joint.channels)
+            joint.frames = data[:,offset:offset+n].reshape(-1)
+            offset += n
 
     def __calcPosition(self, joint, offset):
         """
@@ -605,24 +603,16 @@ class BVHJoint():
             # TODO allow partial rotation channels too?
             pass
         elif len(rotAngles) >= 3:
-            for frameIdx in range(nFrames):
-                self.matrixPoses[frameIdx,:3,:3] = tm.euler_matrix(rotAngles[2][frameIdx], rotAngles[1][frameIdx], rotAngles[0][frameIdx], axes=rotOrder)[:3,:3]
-
-            # TODO eliminate loop with numpy?
-            '''
-            for rotAngle in rotAngles:  
-                self.matrixPoses[:] = tm.euler_matrix(rotAngle[2], rotAngle[1], rotAngle[0], axes=rotOrder))
-            # unfortunately tm.euler_matrix is not a np ufunc
-            '''
+            self.matrixPoses[:,:3,:3] = eulerMatrices(rotAngles[2], rotAngles[1], rotAngles[0], rotOrder)
 
         # Add translations to pose matrices
         # Allow partial transformation channels too
-        if rXs != None or rYs != None or rZs != None:
-            if rXs == None:
+        if rXs is not None or rYs is not None or rZs is not None:
+            if rXs is None:
                 rXs = np.zeros(nFrames, dtype=np.float32)
-            if rYs == None:
+            if rYs is None:
                 rYs = np.zeros(nFrames, dtype=np.float32)
-            if rZs == None:
+            if rZs is None:
                 rZs = np.zeros(nFrames, dtype=np.float32)
 
             self.matrixPoses[:,:3,3] = np.column_stack([rXs,rYs,rZs])[:,:]
@@ -647,6 +637,58 @@ class BVHJoint():
         return not self.hasChildren()
 
 
+def eulerMatrices(ai, aj, ak, axes='sxyz'):
+    """
+    Rotation matrices from arrays of Euler angles, as an (n, 3, 3) array.
+    Vectorized version of transformations.euler_matrix, which takes the same
+    arguments for one set of angles.
+    """
+    try:
+        firstaxis, parity, repetition, frame = tm._AXES2TUPLE[axes]
+    except (AttributeError, KeyError):
+        tm._TUPLE2AXES[axes]  # validation
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis
+    j = tm._NEXT_AXIS[i+parity]
+    k = tm._NEXT_AXIS[i-parity+1]
+
+    ai = np.asarray(ai, dtype=np.float64)
+    aj = np.asarray(aj, dtype=np.float64)
+    ak = np.asarray(ak, dtype=np.float64)
+    if frame:
+        ai, ak = ak, ai
+    if parity:
+        ai, aj, ak = -ai, -aj, -ak
+
+    si, sj, sk = np.sin(ai), np.sin(aj), np.sin(ak)
+    ci, cj, ck = np.cos(ai), np.cos(aj), np.cos(ak)
+    cc, cs = ci*ck, ci*sk
+    sc, ss = si*ck, si*sk
+
+    M = np.empty((len(ai), 3, 3), dtype=np.float64)
+    if repetition:
+        M[:, i, i] = cj
+        M[:, i, j] = sj*si
+        M[:, i, k] = sj*ci
+        M[:, j, i] = sj*sk
+        M[:, j, j] = -cj*ss+cc
+        M[:, j, k] = -cj*cs-sc
+        M[:, k, i] = -sj*ck
+        M[:, k, j] = cj*sc+cs
+        M[:, k, k] = cj*cc-ss
+    else:
+        M[:, i, i] = cj*ck
+        M[:, i, j] = sj*sc-cs
+        M[:, i, k] = sj*cc+ss
+        M[:, j, i] = cj*sk
+        M[:, j, j] = sj*ss+cc
+        M[:, j, k] = sj*cs-sc
+        M[:, k, i] = -sj
+        M[:, k, j] = cj*si
+        M[:, k, k] = cj*ci
+    return M
+
 def load(filename, convertFromZUp = False):
     result = BVH()
     result.convertFromZUp = convertFromZUp
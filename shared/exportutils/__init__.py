@@ -26,6 +26,7 @@ Export utilities available to all exporters.
 from . import collect
 from . import config
 from . import custom
+from . import serialize
 from . import shapekeys
 from . import uvset
 """
@@ -28,7 +28,10 @@ import module3d
 import mh
 import files3d
 import os
+import sys
 import time
+import threading
+import multiprocessing
 import numpy
 import shutil
 
@@ -69,7 +72,26 @@ def readTargets(human, config):
 #   setupObjects
 #
 
-def setupObjects(name, human, config=None, rawTargets=[], helpers=False, hidden=False, eyebrows=True, lashes=True, subdivide = False, progressCallback=None):
+def setupObjects(name, human, config=None, rawTargets=[], helpers=False, hidden=False, eyebrows=True, lashes=True, subdivide = False, progressCallback=None, workers=None):
+    amt,rmeshes = streamObjects(name, human, config, rawTargets, helpers, hidden, eyebrows, lashes, subdivide, progressCallback, workers)
+    return list(rmeshes),amt
+
+#
+#   streamObjects
+#
+
+def streamObjects(name, human, config=None, rawTargets=[], helpers=False, hidden=False, eyebrows=True, lashes=True, subdivide = False, progressCallback=None, workers=None):
+    """
+    Set up the armature, and return it with an iterator over the rich meshes
+    to export: the body (unless a proxy replaces it), clothes, hair and eyes.
+    The meshes are fitted, filtered, rescaled and subdivided in a pool of
+    worker threads and yielded in order as soon as they are ready, so that
+    only a few meshes are held in memory at a time.
+
+    workers:
+      *int*. Number of worker threads, None for one per CPU (at most 4).
+      With one worker the meshes are built one at a time as they are iterated.
+    """
     from armature.armature import setupArmature
 
     def progress(prog):
@@ -82,55 +104,140 @@ def setupObjects(name, human, config=None, rawTargets=[], helpers=False, hidden=
         config = Config()
         config.setHuman(human)
 
-    rmeshes = []
+    if workers is None:
+        workers = min(multiprocessing.cpu_count(), 4)
+
     amt = setupArmature(name, human, config.rigOptions)
     richMesh = richmesh.getRichMesh(human.meshData, None, None, rawTargets, amt)
     richMesh.name = name
     if amt:
         richMesh.weights = amt.vertexWeights
+    if config.scale != 1.0:
+        amt.rescale(config.scale)
 
     deleteGroups = []
     deleteVerts = None  # Don't load deleteVerts from proxies directly, we use the facemask set in the gui module3d
-    _,deleteVerts = setupProxies('Clothes', None, human, rmeshes, richMesh, config, deleteGroups, deleteVerts)
-    _,deleteVerts = setupProxies('Hair', None, human, rmeshes, richMesh, config, deleteGroups, deleteVerts)
-    _,deleteVerts = setupProxies('Eyes', None, human, rmeshes, richMesh, config, deleteGroups, deleteVerts)
-    foundProxy,deleteVerts = setupProxies('Proxy', name, human, rmeshes, richMesh, config, deleteGroups, deleteVerts)
+    proxies = []
+    _,deleteVerts = setupProxies('Clothes', None, human, proxies, richMesh, config, deleteGroups, deleteVerts)
+    _,deleteVerts = setupProxies('Hair', None, human, proxies, richMesh, config, deleteGroups, deleteVerts)
+    _,deleteVerts = setupProxies('Eyes', None, human, proxies, richMesh, config, deleteGroups, deleteVerts)
+    foundProxy,deleteVerts = setupProxies('Proxy', name, human, proxies, richMesh, config, deleteGroups, deleteVerts)
     progress(0.06*(3-2*subdivide))
-    if not foundProxy:
-        if helpers is None:     # helpers override everything
-            richMesh = filterMesh(richMesh, deleteGroups, deleteVerts, eyebrows, lashes, not hidden)
-        rmeshes = [richMesh] + rmeshes
 
-    if config.scale != 1.0:
-        amt.rescale(config.scale)
-        for rmesh in rmeshes:
+    def finish(rmesh):
+        if config.scale != 1.0:
             rmesh.rescale(config.scale)
-
-    progbase = 0.12*(3-2*subdivide)
-    progress(progbase)
-
-    # Subdivide, if requested.
-    rmeshnum = float(len(rmeshes))
-    i = 0.0
-    for rmesh in rmeshes:
-        progress(progbase+(i/rmeshnum)*(1-progbase))
         if subdivide:
-            subMesh = cks.createSubdivisionObject(
-                rmesh.object, lambda p: progress(progbase+((i+p)/rmeshnum)*(1-progbase)))
+            subMesh = cks.createSubdivisionObject(rmesh.object)
             rmesh.fromObject(subMesh, rmesh.weights, rawTargets)
-        i += 1.0
+        return rmesh
+
+    def bodyJob():
+        rmesh = richMesh
+        if helpers is None:     # helpers override everything
+            rmesh = filterMesh(rmesh, deleteGroups, deleteVerts, eyebrows, lashes, not hidden)
+        return finish(rmesh)
+
+    # Filtering the body replaces its weights and shapes, proxies use the
+    # unfiltered ones
+    rawWeights = richMesh.weights
+    rawShapes = richMesh.shapes
+
+    def proxyJob(proxy, proxyName):
+        def job():
+            return finish(getProxyMesh(proxy, proxyName, rawWeights, rawShapes, amt))
+        return job
+
+    jobs = [proxyJob(proxy, proxyName) for proxy,proxyName in proxies]
+    if not foundProxy:
+        jobs = [bodyJob] + jobs
+
+    def iterMeshes():
+        progbase = 0.12*(3-2*subdivide)
+        progress(progbase)
+        nJobs = float(len(jobs))
+        for i,rmesh in enumerate(iterParallel(jobs, workers)):
+            yield rmesh
+            progress(progbase+((i+1)/nJobs)*(1-progbase))
+        progress(1)
 
-    progress(1)
-    return rmeshes,amt
+    return amt,iterMeshes()
 
 #
-#    setupProxies(typename, name, human, rmeshes, richMesh, config, deleteGroups, deleteVerts):
+#   iterParallel(jobs, workers):
 #
 
-def setupProxies(typename, name, human, rmeshes, richMesh, config, deleteGroups, deleteVerts):
-    # TODO document that this method does not only return values, it also modifies some of the passed parameters (deleteGroups and rmeshes, deleteVerts is modified only if it is not None)
-    import re    
+class _JobState(object):
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.results = {}
+        self.started = 0
+        self.consumed = 0
+        self.stopped = False
+
+def iterParallel(jobs, workers):
+    """
+    Run the jobs (functions without arguments) in a pool of worker threads and
+    yield their results in order. A job is only started when fewer than
+    workers results are waiting to be consumed, which bounds the number of
+    results held in memory. Exceptions of a job are raised when its result is
+    due.
+    """
+    jobs = list(jobs)
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield job()
+        return
+
+    # The queue module is shadowed by lib/queue.py, use a condition instead
+    state = _JobState()
+
+    def run():
+        while True:
+            with state.cond:
+                while not state.stopped and state.started < len(jobs) and state.started >= state.consumed + workers:
+                    state.cond.wait()
+                if state.stopped or state.started >= len(jobs):
+                    return
+                n = state.started
+                state.started += 1
+            try:
+                result = (True, jobs[n]())
+            except Exception:
+                result = (False, sys.exc_info())
+            with state.cond:
+                state.results[n] = result
+                state.cond.notify_all()
+
+    threads = [threading.Thread(target=run) for i in range(min(workers, len(jobs)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for n in range(len(jobs)):
+            with state.cond:
+                while n not in state.results:
+                    state.cond.wait()
+                ok,result = state.results.pop(n)
+                state.consumed += 1
+                state.cond.notify_all()
+            if not ok:
+                raise result[1].with_traceback(result[2])
+            yield result
+    finally:
+        with state.cond:
+            state.stopped = True
+            state.cond.notify_all()
+        for thread in threads:
+            thread.join()
+
+#
+#    setupProxies(typename, name, human, proxies, richMesh, config, deleteGroups, deleteVerts):
+#
 
+def setupProxies(typename, name, human, proxies, richMesh, config, deleteGroups, deleteVerts):
+    # TODO document that this method does not only return values, it also modifies some of the passed parameters (deleteGroups and proxies, deleteVerts is modified only if it is not None)
     foundProxy = False
     for proxy in list(config.getProxies().values()):
         if proxy.type == typename:
@@ -138,13 +245,22 @@ def setupProxies(typename, name, human, rmeshes, richMesh, config, deleteGroups,
             deleteGroups += proxy.deleteGroups
             if deleteVerts != None:
                 deleteVerts = deleteVerts | proxy.deleteVerts
-            rmesh = richmesh.getRichMesh(None, proxy, richMesh.weights, richMesh.shapes, richMesh.armature) 
-            if name is not None:    # Make exportable names.
-                rmesh.name = name
-            rmesh.name = re.sub('[^0-9a-zA-Z]+', '_', rmesh.name)
-            rmeshes.append(rmesh)
+            proxies.append((proxy, name))
     return foundProxy, deleteVerts
 
+def getProxyMesh(proxy, name, rawWeights, rawShapes, amt):
+    """
+    Fit the proxy to the human, and transfer the weights and shapes of the
+    human to it.
+    """
+    import re
+
+    rmesh = richmesh.getRichMesh(None, proxy, rawWeights, rawShapes, amt)
+    if name is not None:    # Make exportable names.
+        rmesh.name = name
+    rmesh.name = re.sub('[^0-9a-zA-Z]+', '_', rmesh.name)
+    return rmesh
+
 #
 #
 #
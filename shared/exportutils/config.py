@@ -239,15 +239,21 @@ def scanFileForUuid(path):
     return None
 
 def scanFileForTags(path):
+    import mh2proxy
+    tags = mh2proxy.readCompiledTags(path)
+    if tags is not None:
+        return tags
+
     tags = set()
     fp = open(path)
     for line in fp:
         words = line.split()
-        if len(words) == 0:
+        if len(words) == 0 or words[0].startswith('#'):
             continue
         elif words[0] == 'tag':
-            tags.add(words[1])
-        else:
+            tags.add(' '.join(words[1:]))
+        elif words[0] == 'verts':
+            # Tags are in the header
             break
     fp.close()
     return tags
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           Thomas Larsson, Jonas Hauquier
+
+**Copyright(c):**      MakeHuman Team 2001-2013
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Bulk serialization of mesh arrays for exporters.
+
+Instead of formatting one vertex or face at a time, whole coordinate, normal,
+UV and index arrays are formatted with a single string formatting operation
+per chunk of rows, and binary data is written from structured numpy arrays.
+"""
+
+import numpy as np
+
+# Number of rows formatted at once, limits the size of the intermediate strings
+CHUNK_SIZE = 65536
+
+# One triangle in a binary STL file
+STL_TRIANGLE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3,3)),
+    ('attribute', '<u2')])
+
+
+def formatArray(fmt, data):
+    """
+    Format each row of a 2D array (or each element of a 1D array) with the
+    format string fmt and return the concatenated result.
+    fmt contains one conversion specifier per column.
+    """
+    data = np.asarray(data)
+    if len(data) == 0:
+        return ''
+    return (fmt * len(data)) % tuple(data.ravel().tolist())
+
+
+def writeArray(fp, fmt, data, chunkSize=CHUNK_SIZE):
+    """
+    Write each row of data formatted with fmt to fp, see formatArray.
+    """
+    data = np.asarray(data)
+    for start in range(0, len(data), chunkSize):
+        fp.write(formatArray(fmt, data[start:start+chunkSize]))
+
+
+def getFaceSizes(fvert):
+    """
+    Number of vertices (3 or 4) of each face. Triangles are stored as quads
+    with their first vertex repeated.
+    """
+    fvert = np.asarray(fvert)
+    return np.where(fvert[:,0] == fvert[:,3], 3, 4)
+
+
+def getFaceIndices(nFaces):
+    """
+    (nFaces, 4) array with the face index in every column, to write the face
+    number with each face vertex.
+    """
+    return np.repeat(np.arange(nFaces)[:,None], 4, axis=1)
+
+
+def formatFaces(fmt, columns, sizes, prefix='', sep=' ', suffix='\n'):
+    """
+    Format polygons of 3 or 4 vertices.
+
+    Parameters
+    ----------
+
+    fmt:
+      *string*. Format of one face vertex, with one conversion specifier per
+      column.
+    columns:
+      *list of arrays*. (nFaces, 4) arrays with the values written for each
+      face vertex, e.g. vertex indices and UV indices.
+    sizes:
+      *array*. Number of vertices of each face, see getFaceSizes.
+    prefix, sep, suffix:
+      *string*. Text written before, between and after the face vertices.
+    """
+    sizes = np.asarray(sizes)
+    if len(sizes) == 0:
+        return ''
+    values = np.dstack(columns)
+    values = values[np.arange(4)[None,:] < sizes[:,None]]
+    faceFmts = [prefix + sep.join(n*[fmt]) + suffix for n in (3, 4)]
+    fmts = ''.join([faceFmts[size-3] for size in sizes.tolist()])
+    return fmts % tuple(values.ravel().tolist())
+
+
+def writeFaces(fp, fmt, columns, sizes, prefix='', sep=' ', suffix='\n', chunkSize=CHUNK_SIZE):
+    """
+    Write polygons of 3 or 4 vertices to fp, see formatFaces.
+    """
+    for start in range(0, len(sizes), chunkSize):
+        end = start + chunkSize
+        fp.write(formatFaces(fmt, [np.asarray(col)[start:end] for col in columns], sizes[start:end], prefix, sep, suffix))
+
+
+def triangulate(fvert):
+    """
+    Split quads in the triangles (0,1,2) and (2,3,0).
+    Returns an (nTris, 3) vertex index array and the index of the face each
+    triangle originates from.
+    """
+    fvert = np.asarray(fvert)
+    quads = np.flatnonzero(fvert[:,0] != fvert[:,3])
+    tris = np.vstack([fvert[:,:3], fvert[quads][:,[2,3,0]]])
+    faces = np.concatenate([np.arange(len(fvert)), quads])
+    # Keep the triangles of a quad next to each other
+    order = np.argsort(faces, kind='mergesort')
+    return tris[order], faces[order]
+
+
+def getStlTriangles(coord, fvert, fnorm):
+    """
+    Structured STL_TRIANGLE array for the triangulated faces of a mesh.
+    """
+    tris, faces = triangulate(fvert)
+    data = np.zeros(len(tris), dtype=STL_TRIANGLE)
+    data['normal'] = np.asarray(fnorm)[faces]
+    data['vertices'] = np.asarray(coord)[tris]
+    return data
+
+
+def writeStlBinary(fp, triangles):
+    """
+    Write a binary STL file from STL_TRIANGLE arrays. fp must be a real file
+    opened in binary mode.
+    """
+    fp.write(b'\x00' * 80)
+    np.array([sum([len(tris) for tris in triangles])], dtype='<u4').tofile(fp)
+    for tris in triangles:
+        tris.tofile(fp)
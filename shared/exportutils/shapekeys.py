@@ -92,36 +92,21 @@ def loopGendersAges(name, human, typ):
                 continue
             filename = targetFileName(typ, name, gender, age)
             ashape = readShape(filename)
-            if ashape:
+            if ashape is not None and len(ashape[0]):
                 gshapes[age] = ashape
                 asums[gender] += aval
 
-    shape = {}
-    wsum = 0.0
+    blend = []
     for (gender, gval) in genders:
         if gval < epsilon or asums[gender] < epsilon:
             continue
         gw = gval/gsum
         gshapes = shapes[gender]
         for (age, aval) in ages:
-            if aval < epsilon:
+            if aval < epsilon or age not in gshapes:
                 continue
             aw = aval/asums[gender]
-            w = gw*aw
-            try:
-                ashape = gshapes[age]
-            except:
-                ashape = None
-            if not ashape:
-                continue
-            wsum += w
-            for v in list(ashape.keys()):
-                try:
-                    (x,y,z) = shape[v]
-                    (dx,dy,dz) = ashape[v]
-                    shape[v] = (x+w*dx, y+w*dy, z+w*dz)
-                except:
-                    shape[v] = ashape[v]
+            blend.append((gw*aw,) + gshapes[age])
 
     dwarf = 0.8324
     giant = 1.409
@@ -131,12 +116,11 @@ def loopGendersAges(name, human, typ):
     elif height > 0:
         k = 1 + (giant-1)*height
     else:
-        return shape
+        k = 1
 
-    for v in list(shape.keys()):
-        (x,y,z) = shape[v]
-        shape[v] = (k*x, k*y, k*z)
-    return shape
+    verts,data = algos3d.blendTargetData(blend)
+    data *= k
+    return dict(list(zip(verts.tolist(), [tuple(dr) for dr in data.tolist()])))
 
 
 def targetFileName(typ, name, gender, age):
@@ -152,22 +136,19 @@ def targetFileName(typ, name, gender, age):
 
 
 def readShape(filename):
-    #print ("Try", filename)
+    """
+    Vertex indices and displacements of a target as (verts, data) arrays,
+    or None if the target cannot be read.
+    """
     try:
-        fp = open(filename, "rU")
-    except:
+        verts,data = algos3d.loadTargetData(filename)
+    except (IOError, OSError):
         log.error("*** Cannot open %s", filename)
         return None
 
-    shape = {}
-    for line in fp:
-        words = line.split()
-        n = int(words[0])
-        if n < meshstat.numberOfVertices:
-            shape[n] = (float(words[1]), float(words[2]), float(words[3]))
-    fp.close()
+    mask = (verts < meshstat.numberOfVertices)
     log.message("    %s copied", filename)
-    return shape
+    return verts[mask], data[mask]
 
 #----------------------------------------------------------
 #
@@ -175,36 +156,31 @@ def readShape(filename):
 
 def readFaceShapes(human, drivers, t0, t1):
     shapeList = []
-    shapes = {}
-    t,dt = initTimes(list(drivers.keys()), 0.0, 1.0)
+    specs = []
+    fnames = []
 
     for name,value in list(drivers.items()):
         (fname, bone, channel, sign, min, max) = value
         if (name[-2:] in ["_L", "_R"]):
             lr = "LR"
             sname = name[:-2]
-            t += 2*dt
         else:
             lr = "Sym"
             sname = name
-            t += dt
-
-        try:
-            shape = shapes[fname]
-            doLoad = False
-        except:
-            doLoad = True
-        if doLoad:
-            gui3d.app.progress(t, text="Reading face shape %s" % fname)
-
-            shape = warpmodifier.compileWarpTarget(
-                    'shared/mhx/targets/body_language/${gender}-${age}/%s.target' % fname,
-                    "GenderAge",
-                    human,
-                    "face")
-
-            shapes[fname] = shape
-            shapeList.append((sname, shape, lr, min, max))
+
+        if fname not in fnames:
+            fnames.append(fname)
+            specs.append((sname, fname, lr, min, max))
+
+    gui3d.app.progress(t0, text="Reading face shapes")
+    shapes = warpmodifier.compileWarpTargets(
+            ['shared/mhx/targets/body_language/${gender}-${age}/%s.target' % fname for fname in fnames],
+            "GenderAge",
+            human,
+            "face")
+
+    for (sname, fname, lr, min, max),shape in zip(specs, shapes):
+        shapeList.append((sname, shape, lr, min, max))
     shapeList.sort()
     return shapeList
 
@@ -228,41 +204,30 @@ def readExpressions(human, t0, t1):
 """
 
 def readExpressionUnits(human, t0, t1):
-    shapeList = []
-    t,dt = initTimes(ExpressionUnits, 0.0, 1.0)
-
-    for name in ExpressionUnits:
-        gui3d.app.progress(t, text="Reading expression %s" % name)
+    gui3d.app.progress(t0, text="Reading expressions")
 
-        shape = warpmodifier.compileWarpTarget(
-                #mh.getSysDataPath('targets/expression/units/${ethnic}/${gender}_${age}/%s.target') % name,
-                #"GenderAgeEthnic",
-                mh.getSysDataPath('targets/expression/units/${ethnic}/%s.target') % name,
-                "Ethnic",
-                human,
-                "face")
+    shapes = warpmodifier.compileWarpTargets(
+            #[mh.getSysDataPath('targets/expression/units/${ethnic}/${gender}_${age}/%s.target') % name for name in ExpressionUnits],
+            #"GenderAgeEthnic",
+            [mh.getSysDataPath('targets/expression/units/${ethnic}/%s.target') % name for name in ExpressionUnits],
+            "Ethnic",
+            human,
+            "face")
 
-        shapeList.append((name, shape))
-        t += dt
-    return shapeList
+    return list(zip(ExpressionUnits, shapes))
 
 
 def readCorrectives(drivers, human, folder, landmarks, t0, t1):
-    shapeList = []
-    t,dt = initTimes(drivers, 0.0, 1.0)
-
-    for (pose, lr, expr, vars) in drivers:
-        gui3d.app.progress(t, text="Reading corrective %s %s" % (folder, pose))
+    gui3d.app.progress(t0, text="Reading correctives %s" % folder)
 
-        shape = warpmodifier.compileWarpTarget(
-                "shared/mhx/targets/correctives/%s/caucasian/${gender}-${age}-${tone}-${weight}/%s.target" % (folder, pose),
-                'GenderAgeToneWeight',
-                human,
-                landmarks)
+    shapes = warpmodifier.compileWarpTargets(
+            ["shared/mhx/targets/correctives/%s/caucasian/${gender}-${age}-${tone}-${weight}/%s.target" % (folder, pose)
+                for (pose, lr, expr, vars) in drivers],
+            'GenderAgeToneWeight',
+            human,
+            landmarks)
 
-        shapeList.append((shape, pose, lr))
-        t += dt
-    return shapeList
+    return [(shape, pose, lr) for (pose, lr, expr, vars),shape in zip(drivers, shapes)]
 
 def readCorrective(human, part, pose):
     #for e in list(shape.items())[:10]:
@@ -27,6 +27,8 @@ UV map creator
 
 """
 
+import multiprocessing
+import traceback
 import numpy as np
 import gui3d
 import mh
@@ -54,51 +56,190 @@ class UvAlphaShader(Shader):
 
     def shade(self, i, xy, uvw):
         dst = self.dst.data[xy[...,1],xy[...,0]]
-        uva = np.sum(self.uva[i][None,None,:,:] * uvw[...,[1,2,0]][:,:,:,None], axis=2)
-        ix = np.floor(uva[:,:,:2] * self.size[None,None,:]).astype(int)
+        uva = np.sum(self.uva[i] * uvw[...,[1,2,0],None], axis=-2)
+        ix = np.floor(uva[...,:2] * self.size).astype(int)
         ix = np.minimum(ix, self.size - 1)
         ix = np.maximum(ix, 0)
         src = self.texture.data[ix[...,1], ix[...,0]]
-        a = uva[:,:,2]
-        return a[:,:,None] * (src.astype(float) - dst) + dst
+        a = uva[...,2]
+        return a[...,None] * (src.astype(float) - dst) + dst
 
 class ColorShader(Shader):
     def __init__(self, colors):
         self.colors = colors
 
     def shade(self, i, xy, uvw):
-        return np.sum(self.colors[i][None,None,:,:] * uvw[...,[1,2,0]][:,:,:,None], axis=2)
+        return np.sum(self.colors[i] * uvw[...,[1,2,0],None], axis=-2)
 
-def RasterizeTriangles(dst, coords, shader, progress = None):
-    """
-    Software rasterizer.
-    """
-    delta = coords - coords[:,[1,2,0],:]
-    perp = np.concatenate((delta[:,:,1,None], -delta[:,:,0,None]), axis=-1)
-    dist = np.sum(perp[:,0,:] * delta[:,2,:], axis=-1)
-    perp /= dist[:,None,None]
-    base = np.sum(perp * coords, axis=-1)
+# Size in pixels of the square screen tiles the software rasterizer works on
+TILE_SIZE = 64
 
-    cmin = np.floor(np.amin(coords, axis=1)).astype(int)
-    cmax = np.ceil( np.amax(coords, axis=1)).astype(int)
+# Number of worker processes of the software rasterizer, 0 for one per CPU
+rasterProcesses = 1
 
-    minx = cmin[:,0]
-    maxx = cmax[:,0]
-    miny = cmin[:,1]
-    maxy = cmax[:,1]
+class _RasterSetup(object):
+    """
+    Edge functions and bounding boxes of the triangles to rasterize, and the
+    triangles binned by the screen tiles their bounding box overlaps.
+    Shaders are called with arrays of pixels, the triangle index, pixel
+    coordinates and barycentric coordinates of each pixel.
+    """
 
-    for i in range(len(coords)):
-        if progress is not None and i % 100 == 0:
-            progress(i, len(coords))
+    def __init__(self, dst, coords, shader, tileSize):
+        self.dst = dst
+        self.shader = shader
+        self.tileSize = tileSize
+        h, w = dst.data.shape[:2]
+
+        delta = coords - coords[:,[1,2,0],:]
+        perp = np.concatenate((delta[:,:,1,None], -delta[:,:,0,None]), axis=-1)
+        dist = np.sum(perp[:,0,:] * delta[:,2,:], axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            perp /= dist[:,None,None]
+        self.perp = perp
+        self.base = np.sum(perp * coords, axis=-1)
+
+        cmin = np.floor(np.amin(coords, axis=1)).astype(int)
+        cmax = np.ceil( np.amax(coords, axis=1)).astype(int)
+        self.cmin = np.maximum(cmin, 0)
+        self.cmax = np.minimum(cmax, [w, h])
+
+        # Degenerate triangles and triangles outside the image cover no pixels
+        tris = np.flatnonzero(np.all(self.cmax > self.cmin, axis=-1) & (dist != 0))
+
+        self.nTilesX = (w + tileSize - 1) // tileSize
+        tmin = self.cmin[tris] // tileSize
+        tmax = (self.cmax[tris] - 1) // tileSize
+        nx = tmax[:,0] - tmin[:,0] + 1
+        counts = nx * (tmax[:,1] - tmin[:,1] + 1)
+        idx = np.repeat(np.arange(len(tris)), counts)
+        k = np.arange(len(idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+        tx = tmin[idx,0] + k % nx[idx]
+        ty = tmin[idx,1] + k // nx[idx]
+
+        # Sort by tile, keeping the triangles of each tile in drawing order
+        tiles = ty * self.nTilesX + tx
+        order = np.argsort(tiles, kind='mergesort')
+        tiles = tiles[order]
+        self.tileTris = tris[idx[order]]
+        self.tiles, self.tileStart = np.unique(tiles, return_index=True)
+        self.tileEnd = np.append(self.tileStart[1:], len(tiles))
+
+    def rasterizeTile(self, n):
+        """
+        Pixel coordinates and colors of the pixels covered in tile n. Where
+        triangles overlap the last one is drawn.
+        """
+        tris = self.tileTris[self.tileStart[n]:self.tileEnd[n]]
+        ty, tx = divmod(self.tiles[n], self.nTilesX)
+        tmin = np.array([tx, ty]) * self.tileSize
+        cmin = np.maximum(self.cmin[tris], tmin)
+        cmax = np.minimum(self.cmax[tris], tmin + self.tileSize)
+        size = cmax - cmin
+
+        # One row per (triangle, pixel in its bounding box) pair
+        counts = size[:,0] * size[:,1]
+        idx = np.repeat(np.arange(len(tris)), counts)
+        k = np.arange(len(idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+        ixy = cmin[idx] + np.column_stack((k % size[idx,0], k // size[idx,0]))
+        i = tris[idx]
 
-        ixy = np.mgrid[miny[i]:maxy[i],minx[i]:maxx[i]].transpose([1,2,0])[:,:,::-1]
         xy = ixy + 0.5
-        uvw = np.sum(perp[i,None,None,:,:] * xy[:,:,None,:], axis=-1) - base[i,None,None,:]
+        uvw = np.einsum('nij,nj->ni', self.perp[i], xy) - self.base[i]
         mask = np.all(uvw > 0, axis=-1)
-        col = shader.shade(i, ixy, uvw)
-        # log.debug('dst: %s', dst.data[miny[i]:maxy[i],minx[i]:maxx[i]].shape)
-        # log.debug('src: %s', col.shape)
-        dst.data[miny[i]:maxy[i],minx[i]:maxx[i],:][mask] = col[mask]
+        i = i[mask]
+        ixy = ixy[mask]
+        uvw = uvw[mask]
+
+        # Keep the last triangle covering each pixel
+        pixel = (ixy[:,1] - tmin[1]) * self.tileSize + (ixy[:,0] - tmin[0])
+        order = np.argsort(pixel, kind='mergesort')
+        pixel = pixel[order]
+        last = order[np.append(pixel[1:] != pixel[:-1], True)]
+        ixy = ixy[last]
+
+        return ixy, self.shader.shade(i[last], ixy, uvw[last])
+
+    def rasterizeTiles(self, tiles):
+        return [self.rasterizeTile(n) for n in tiles]
+
+    def write(self, ixy, col):
+        self.dst.data[ixy[:,1],ixy[:,0],:] = col
+
+def _rasterizeWorker(setup, tiles, conn):
+    """
+    Rasterize tiles in a forked worker process, and send back either
+    (True, pixels) or (False, (exception, traceback)).
+    """
+    try:
+        try:
+            result = (True, setup.rasterizeTiles(tiles))
+        except Exception as e:
+            result = (False, (e, traceback.format_exc()))
+        try:
+            conn.send(result)
+        except Exception:
+            # The exception cannot be pickled
+            conn.send((False, (RuntimeError(str(result[1][0])), traceback.format_exc())))
+    finally:
+        conn.close()
+
+def RasterizeTriangles(dst, coords, shader, progress = None, processes = None):
+    """
+    Software rasterizer.
+
+    The triangles are binned into square screen tiles, and all pixels of a
+    tile are evaluated at once. With more than one process the tiles are
+    split across forked worker processes, which inherit the triangle data
+    and send back the shaded pixels. An exception raised in a worker is
+    raised again here.
+    """
+    if processes is None:
+        processes = rasterProcesses
+    if processes == 0:
+        processes = multiprocessing.cpu_count()
+
+    setup = _RasterSetup(dst, coords, shader, TILE_SIZE)
+    nTiles = len(setup.tiles)
+    processes = min(processes, nTiles // 16)
+
+    if processes > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # Pool would import the queue module, which is shadowed by lib/queue.py
+        context = multiprocessing.get_context('fork')
+        workers = []
+        try:
+            for n in range(processes):
+                recv, send = context.Pipe(False)
+                worker = context.Process(target=_rasterizeWorker, args=(setup, list(range(n, nTiles, processes)), send))
+                worker.start()
+                send.close()
+                workers.append((worker, recv))
+            for n, (worker, recv) in enumerate(workers):
+                if progress is not None:
+                    progress(n, len(workers))
+                try:
+                    success, result = recv.recv()
+                except EOFError:
+                    worker.join()
+                    raise RuntimeError('Rasterizer process exited with code %s' % worker.exitcode)
+                if not success:
+                    exception, tb = result
+                    log.debug('Rasterizer process failed:\n%s', tb)
+                    raise exception
+                for ixy, col in result:
+                    setup.write(ixy, col)
+        finally:
+            for worker, recv in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+                recv.close()
+    else:
+        for start in range(0, nTiles, 16):
+            if progress is not None:
+                progress(start, nTiles)
+            for ixy, col in setup.rasterizeTiles(range(start, min(start + 16, nTiles))):
+                setup.write(ixy, col)
 
 def getCamera(mesh):
     ex, ey, ez = gui3d.app.modelCamera.eye
@@ -244,15 +385,17 @@ def fixSeams(img):
     img.data[...,:-1][border] = fill.astype(np.uint8)[border]
     img.data[...,-1:][border] = 255
 
-def mapLightingSoft(lightpos = (-10.99, 20.0, 20.0), progressCallback = None):
+def mapLightingSoft(lightpos = (-10.99, 20.0, 20.0), progressCallback = None, mesh = None, dimensions = (1024, 1024), processes = None):
     """
     Create a lightmap for the selected human (software renderer).
+    The mesh of another human can be passed explicitly, in which case the
+    lightmap is created without using the application state.
     """
 
-    mesh = gui3d.app.selectedHuman.mesh
+    if mesh is None:
+        mesh = gui3d.app.selectedHuman.mesh
 
-    W = 1024
-    H = 1024
+    W, H = dimensions
     
     dstImg = mh.Image(width=W, height=H, components=4)
     dstImg.data[...] = 0
@@ -281,9 +424,9 @@ def mapLightingSoft(lightpos = (-10.99, 20.0, 20.0), progressCallback = None):
         else:
             progressCallback(base + 0.5 * i / n)
 
-    RasterizeTriangles(dstImg, coords[:,[0,1,2],:], ColorShader(colors[:,[0,1,2],:]), progress = lambda i,n: progress(0.0,i,n))
-    RasterizeTriangles(dstImg, coords[:,[2,3,0],:], ColorShader(colors[:,[2,3,0],:]), progress = lambda i,n: progress(0.5,i,n))
-    gui3d.app.progress(1.0)
+    RasterizeTriangles(dstImg, coords[:,[0,1,2],:], ColorShader(colors[:,[0,1,2],:]), progress = lambda i,n: progress(0.0,i,n), processes = processes)
+    RasterizeTriangles(dstImg, coords[:,[2,3,0],:], ColorShader(colors[:,[2,3,0],:]), progress = lambda i,n: progress(0.5,i,n), processes = processes)
+    progress(1.0, 0, 1)
 
     fixSeams(dstImg)
 
@@ -293,12 +436,13 @@ def mapLightingSoft(lightpos = (-10.99, 20.0, 20.0), progressCallback = None):
 
     return dstImg
 
-def mapLightingGL(lightpos = (-10.99, 20.0, 20.0)):
+def mapLightingGL(lightpos = (-10.99, 20.0, 20.0), mesh = None):
     """
     Create a lightmap for the selected human (hardware accelerated).
     """
 
-    mesh = gui3d.app.selectedHuman.mesh
+    if mesh is None:
+        mesh = gui3d.app.selectedHuman.mesh
 
     W = 1024
     H = 1024
@@ -330,28 +474,38 @@ def mapLightingGL(lightpos = (-10.99, 20.0, 20.0)):
 
     return dstImg
 
-def mapLighting(lightpos = (-10.99, 20.0, 20.0), progressCallback = None):
+def mapLighting(lightpos = (-10.99, 20.0, 20.0), progressCallback = None, mesh = None):
     """
     Bake lightmap for human from one light.
     Uses OpenGL hardware acceleration if the necessary OGL features are
     available, otherwise uses a slower software rasterizer.
     """
     if mh.hasRenderSkin():
-        return mapLightingGL(lightpos)
+        return mapLightingGL(lightpos, mesh)
     else:
-        return mapLightingSoft(lightpos, progressCallback)
+        return mapLightingSoft(lightpos, progressCallback, mesh)
 
-def mapSceneLighting(scn, progressCallback = None):
+def mapSceneLighting(scn, progressCallback = None, human = None, mapLight = None, dimensions = (1024, 1024)):
     """
     Create a lightmap for a scene with one or multiple lights.
+    By default the selected human is lit with mapLighting. Another human, and
+    a function with the signature of mapLightingSoft to create the lightmap of
+    a single light, can be passed explicitly. dimensions is the size of the
+    empty lightmap returned for a scene without lights, and should match the
+    lightmaps created by mapLight.
     """
+    if human is None:
+        human = gui3d.app.selectedHuman
+    if mapLight is None:
+        mapLight = mapLighting
+
     def progress(prog):
         if (progressCallback is not None):
             progressCallback(prog)
         else:
             pass
 
-    humanRot = gui3d.app.selectedHuman.getRotation()
+    humanRot = human.getRotation()
     def calcLightPos(light):
         return tuple(
             matrix.transform3(
@@ -362,28 +516,64 @@ def mapSceneLighting(scn, progressCallback = None):
 
     lnum = float(len(scn.lights))
     if (lnum>0):    # Add up all the lightmaps.
-        lmap = mapLighting(calcLightPos(scn.lights[0]),
-                           lambda p: progress(p/lnum)).data
+        lmap = mapLight(calcLightPos(scn.lights[0]),
+                        lambda p: progress(p/lnum), human.mesh).data
         i = 1.0        
         for light in scn.lights[1:]:
             lmap = image_operations.mixData(
-                lmap, mapLighting(calcLightPos(light),
-                                  lambda p: progress((i+p)/lnum)).data,1,1)       
+                lmap, mapLight(calcLightPos(light),
+                               lambda p: progress((i+p)/lnum), human.mesh).data,1,1)       
             i += 1.0
 
         return mh.Image(data = image_operations.normalizeData(lmap))
     else:   # If the scene has no lights, return an empty lightmap.
-        return mh.Image(data = np.zeros((1024, 1024, 1), dtype=np.uint8))
+        W, H = dimensions
+        return mh.Image(data = np.zeros((H, W, 1), dtype=np.uint8))
 
-def mapMask(dimensions = (1024, 1024)):
+def mapMaskGL(dimensions = (1024, 1024), mesh = None):
     """
-    Create a texture map mask, for finding the texture map borders.
+    Create a texture map mask, for finding the texture map borders
+    (hardware accelerated).
     """
     
-    mesh = gui3d.app.selectedHuman.mesh
+    if mesh is None:
+        mesh = gui3d.app.selectedHuman.mesh
     return mh.renderSkin(dimensions, mesh.vertsPerPrimitive, mesh.r_texco,
                          index = mesh.index, clearColor = (0, 0, 0, 0))
 
+def mapMaskSoft(dimensions = (1024, 1024), mesh = None, processes = None):
+    """
+    Create a texture map mask, for finding the texture map borders
+    (software rasterizer).
+    """
+
+    if mesh is None:
+        mesh = gui3d.app.selectedHuman.mesh
+
+    W, H = dimensions
+    dstImg = mh.Image(width=W, height=H, components=4)
+    dstImg.data[...] = 0
+
+    coords = np.asarray([0,H])[None,None,:] + mesh.texco[mesh.fuvs] * np.asarray([W,-H])[None,None,:]
+    colors = np.zeros((1,3,4)) + 255
+    white = np.zeros(len(coords), dtype=int)
+
+    RasterizeTriangles(dstImg, coords[:,[0,1,2],:], ColorShader(colors[white]), processes = processes)
+    RasterizeTriangles(dstImg, coords[:,[2,3,0],:], ColorShader(colors[white]), processes = processes)
+
+    return dstImg
+
+def mapMask(dimensions = (1024, 1024)):
+    """
+    Create a texture map mask, for finding the texture map borders.
+    Uses OpenGL hardware acceleration if the necessary OGL features are
+    available, otherwise uses a slower software rasterizer.
+    """
+    if mh.hasRenderSkin():
+        return mapMaskGL(dimensions)
+    else:
+        return mapMaskSoft(dimensions)
+
 def rasterizeHLines(dstImg, edges, delta, progress = None):
     flip = delta[:,0] < 0
     p = np.where(flip[:,None,None], edges[:,::-1,:], edges[:,:,:])
@@ -405,12 +595,13 @@ def rasterizeHLines(dstImg, edges, delta, progress = None):
 
     data = dstImg.data[::-1]
 
-    for i in range(len(x0)):
-        if progress is not None and i % 100 == 0:
-            progress(i, len(x0))
-        x = np.arange(x0[i], x1[i])
-        y = m[i] * (x + 0.5) + c[i]
-        data[np.floor(y).astype(int),x,:] = 255
+    counts = np.maximum(x1 - x0, 0)
+    idx = np.repeat(np.arange(len(x0)), counts)
+    x = x0[idx] + np.arange(len(idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    y = m[idx] * (x + 0.5) + c[idx]
+    data[np.floor(y).astype(int),x,:] = 255
+    if progress is not None:
+        progress(len(x0), len(x0))
 
 def rasterizeVLines(dstImg, edges, delta, progress = None):
     flip = delta[:,1] < 0
@@ -433,23 +624,24 @@ def rasterizeVLines(dstImg, edges, delta, progress = None):
 
     data = dstImg.data[::-1]
 
-    for i in range(len(y0)):
-        if progress is not None and i % 100 == 0:
-            progress(i, len(y0))
-        y = np.arange(y0[i], y1[i]) + 0.5
-        x = m[i] * y + c[i]
-        data[y.astype(int),np.floor(x).astype(int),:] = 255
+    counts = np.maximum(y1 - y0, 0)
+    idx = np.repeat(np.arange(len(y0)), counts)
+    y = y0[idx] + np.arange(len(idx)) - np.repeat(np.cumsum(counts) - counts, counts) + 0.5
+    x = m[idx] * y + c[idx]
+    data[y.astype(int),np.floor(x).astype(int),:] = 255
+    if progress is not None:
+        progress(len(y0), len(y0))
 
-def mapUVSoft():
+def mapUVSoft(mesh = None, dimensions = (2048, 2048), progressCallback = None):
     """
     Project the UV map topology of the selected human mesh onto a texture 
     (software rasterizer).
     """
 
-    mesh = gui3d.app.selectedHuman.mesh
+    if mesh is None:
+        mesh = gui3d.app.selectedHuman.mesh
 
-    W = 2048
-    H = 2048
+    W, H = dimensions
     
     dstImg = mh.Image(width=W, height=H, components=3)
     dstImg.data[...] = 0
@@ -471,8 +663,13 @@ def mapUVSoft():
     edges = mesh.texco[edges] * (W, H)
 
     delta = edges[:,1,:] - edges[:,0,:]
+    # Edges between coincident UVs have no direction
+    valid = np.any(delta != 0, axis=-1)
+    edges = edges[valid]
+    delta = delta[valid]
+    del valid
     vertical = np.abs(delta[:,1]) > np.abs(delta[:,0])
-    horizontal = -vertical
+    horizontal = ~vertical
 
     hdelta = delta[horizontal]
     vdelta = delta[vertical]
@@ -484,11 +681,14 @@ def mapUVSoft():
     log.debug("mapUV: begin render")
 
     def progress(base, i, n):
-        gui3d.app.progress(base + 0.5 * i / n, "Projecting UV map")
+        if progressCallback is None:
+            gui3d.app.progress(base + 0.5 * i / n, "Projecting UV map")
+        else:
+            progressCallback(base + 0.5 * i / n)
 
     rasterizeHLines(dstImg, hedges, hdelta, progress = lambda i,n: progress(0.0,i,n))
     rasterizeVLines(dstImg, vedges, vdelta, progress = lambda i,n: progress(0.5,i,n))
-    gui3d.app.progress(1.0)
+    progress(1.0, 0, 1)
 
     log.debug("mapUV: end render")
 
@@ -55,6 +55,18 @@ class Skeleton(object):
         self.boneslist = []  # Breadth-first ordered list of all bones
         self.roots = []     # Root bones of this skeleton, a skeleton can have multiple root bones.
 
+        # Matrices of all bones stacked in (nBones, 4, 4) arrays, bones in
+        # breadth-first order. See Bone for their meaning.
+        self.matRestGlobal = None
+        self.matRestGlobalInv = None
+        self.matRestRelative = None
+        self.matPose = None
+        self.matPoseGlobal = None
+        self.matPoseVerts = None
+
+        self.parentIdxs = None  # Index of the parent of each bone, -1 for roots
+        self.boneLevels = []    # Bone indices per depth in the hierarchy, roots first
+
     def __repr__(self):
         return ("  <Skeleton %s>" % self.name)
 
@@ -137,10 +149,69 @@ class Skeleton(object):
         self.__cacheGetBones()
         for bone in self.getBones():
             bone.build()
+        self.__buildMatrices()
+
+    def __buildMatrices(self):
+        """
+        Preallocate the stacked rest and pose matrices and the hierarchy
+        levels used for evaluating the pose of all bones in batch.
+        """
+        bones = self.getBones()
+        nBones = len(bones)
+
+        self.matRestGlobal = np.array([bone.matRestGlobal for bone in bones], dtype=np.float64).reshape((nBones,4,4))
+        self.matRestRelative = np.array([bone.matRestRelative for bone in bones], dtype=np.float64).reshape((nBones,4,4))
+        self.matRestGlobalInv = np.zeros((nBones,4,4), dtype=np.float64)
+        for bIdx, bone in enumerate(bones):
+            try:
+                self.matRestGlobalInv[bIdx] = la.inv(bone.matRestGlobal)
+            except la.LinAlgError:
+                log.debug("Non-singular rest matrix for bone %s %s", bone.name, bone.matRestGlobal)
+                self.matRestGlobalInv[bIdx] = np.identity(4)
+
+        self.matPose = np.zeros((nBones,4,4), dtype=np.float64)
+        self.matPose[:] = np.identity(4)
+        self.matPoseGlobal = np.zeros((nBones,4,4), dtype=np.float64)
+        self.matPoseVerts = np.zeros((nBones,4,4), dtype=np.float64)
+
+        self.parentIdxs = np.array([bone.parent.index if bone.parent else -1 for bone in bones], dtype=np.intp)
+        depth = np.zeros(nBones, dtype=np.intp)
+        for bIdx, pIdx in enumerate(self.parentIdxs):
+            if pIdx >= 0:
+                depth[bIdx] = depth[pIdx] + 1
+        self.boneLevels = [np.argwhere(depth == d)[...,0] for d in range(depth.max() + 1)] if nBones else []
+
+        self.update()
 
     def update(self):
-        for bone in self.getBones():
-            bone.update()
+        """
+        Recalculate the global pose matrices of all bones, level by level in
+        the hierarchy with batched matrix products.
+        Should be called after changing the pose (matPose) of bones.
+        """
+        bones = self.getBones()
+        if not bones:
+            return
+        for bIdx, bone in enumerate(bones):
+            self.matPose[bIdx] = bone.matPose
+        self.__updateMatrices()
+
+    def __updateMatrices(self):
+        local = np.matmul(self.matRestRelative, self.matPose)
+        for level in self.boneLevels:
+            parents = self.parentIdxs[level]
+            if parents[0] < 0:
+                # Roots are the first level
+                self.matPoseGlobal[level] = local[level]
+            else:
+                self.matPoseGlobal[level] = np.matmul(self.matPoseGlobal[parents], local[level])
+        np.matmul(self.matPoseGlobal, self.matRestGlobalInv, out=self.matPoseVerts)
+
+        # Bones reference their sub-arrays of the stacked matrices
+        for bIdx, bone in enumerate(self.getBones()):
+            bone.matPose = self.matPose[bIdx]
+            bone.matPoseGlobal = self.matPoseGlobal[bIdx]
+            bone.matPoseVerts = self.matPoseVerts[bIdx]
 
     def getBoneCount(self):
         return len(self.getBones())
@@ -168,18 +239,16 @@ class Skeleton(object):
 
         poseMats    np.array((nBones, 4, 4), dtype=float32)
         """
-        for bIdx, bone in enumerate(self.getBones()):
-            bone.matPose = np.identity(4, dtype=np.float32)
+        # Calculate rotations
+        rot = np.zeros(self.matPose.shape, dtype=np.float64)
+        rot[:,:3,:3] = poseMats[:,:3,:3]
+        rot[:,3,3] = 1
+        np.matmul(np.matmul(self.matRestGlobalInv, rot), self.matRestGlobal, out=self.matPose)
 
-            # Calculate rotations
-            bone.matPose[:3,:3] = poseMats[bIdx,:3,:3]
-            invRest = la.inv(bone.matRestGlobal)
-            bone.matPose = np.dot(np.dot(invRest, bone.matPose), bone.matRestGlobal)
+        # Add translations from original
+        self.matPose[:,:3,3] = poseMats[:,:3,3]
 
-            # Add translations from original
-            bone.matPose[:3,3] = poseMats[bIdx,:3,3]
-        # TODO avoid this loop, eg by storing a pre-allocated poseMats np array in skeleton and keeping a reference to a sub-array in each bone. It would allow batch processing of all pose matrices in one np call
-        self.update()
+        self.__updateMatrices()
 
     def isInRestPose(self):
         for bone in self.getBones():
@@ -188,23 +257,48 @@ class Skeleton(object):
         return True
 
     def setToRestPose(self):
-        for bone in self.getBones():
-            bone.setToRestPose()
+        self.matPose[:] = np.identity(4)
+        self.__updateMatrices()
+
+    def setPoseMatrices(self, matPose, matPoseGlobal, matPoseVerts):
+        """
+        Set the pose of this skeleton from precomputed pose, global pose and
+        skinning (matPoseVerts) matrices of all bones, bones in breadth-first
+        order, without evaluating the bone hierarchy.
+
+        matPose, matPoseGlobal, matPoseVerts    np.array((nBones, 4, 4))
+        """
+        # Assign in place, bones reference sub-arrays of these
+        self.matPose[...] = matPose
+        self.matPoseGlobal[...] = matPoseGlobal
+        self.matPoseVerts[...] = matPoseVerts
+
+    def getPoseVertsMatrices(self):
+        """
+        Returns the matPoseVerts matrices of all bones stacked in one array,
+        bones in breadth-first order (same order as getBones()).
+
+        returns     np.array((nBones, 4, 4), dtype=float64)
+        """
+        return self.matPoseVerts
+
+    def getSkinningTable(self, vertBoneMapping, nVerts, maxInfluences=None):
+        """
+        Convert a vertex-to-bone mapping to a fixed width skinning table for
+        this skeleton, that can be passed to skinMesh instead of the mapping.
+        """
+        return SkinningTable(self, vertBoneMapping, nVerts, maxInfluences)
 
     def skinMesh(self, meshCoords, vertBoneMapping):
         """
         Update (pose) assigned mesh using linear blend skinning.
+        vertBoneMapping is either a vertex-to-bone mapping
+        { boneName: (vertIdxs, weights) } or a SkinningTable built from one.
+        The latter avoids converting the mapping on every call.
         """
-        nVerts = len(meshCoords)
-        coords = np.zeros((nVerts,4), float)
-        for bname, mapping in list(vertBoneMapping.items()):
-            bone = self.getBone(bname)
-            verts,weights = mapping
-            vec = np.dot(bone.matPoseVerts, meshCoords[verts].transpose())
-            wvec = weights*vec
-            coords[verts] += wvec.transpose()
-
-        return coords
+        if not isinstance(vertBoneMapping, SkinningTable):
+            vertBoneMapping = self.getSkinningTable(vertBoneMapping, len(meshCoords))
+        return vertBoneMapping.skin(self.getPoseVertsMatrices(), meshCoords)
 
     def getBones(self):
         """
@@ -213,7 +307,7 @@ class Skeleton(object):
         return self.boneslist
 
     def __cacheGetBones(self):
-        from queue import deque
+        from collections import deque
 
         result = []
         queue = deque(self.roots)
@@ -286,6 +380,69 @@ class Skeleton(object):
         # TODO compare two skeletons (structure only)
 
 
+class SkinningTable(object):
+    """
+    Fixed width per-vertex bone influence table, used for skinning all
+    vertices of a mesh in one batched operation.
+    Vertices with less influences than the table width are padded with zero
+    weights. If maxInfluences is specified and a vertex has more influences,
+    only the largest ones are kept and its weights are renormalized.
+    """
+
+    def __init__(self, skel, vertBoneMapping, nVerts, maxInfluences=None):
+        boneIdxs = skel.getBoneToIdxMapping()
+
+        verts = []
+        bones = []
+        weights = []
+        for bname, (vs, ws) in list(vertBoneMapping.items()):
+            vs = np.asarray(vs, dtype=np.intp)
+            verts.append(vs)
+            bones.append(np.repeat(boneIdxs[bname], len(vs)))
+            weights.append(np.asarray(ws, dtype=np.float32).reshape(-1))
+
+        if verts:
+            verts = np.concatenate(verts)
+            bones = np.concatenate(bones)
+            weights = np.concatenate(weights)
+        else:
+            verts = bones = np.zeros(0, dtype=np.intp)
+            weights = np.zeros(0, dtype=np.float32)
+
+        # Sort influences per vertex, largest weight first
+        order = np.lexsort((-weights, verts))
+        verts = verts[order]
+        bones = bones[order]
+        weights = weights[order]
+
+        counts = np.bincount(verts, minlength=nVerts)
+        width = max(1, counts.max() if len(counts) else 0)
+        if maxInfluences:
+            width = min(width, maxInfluences)
+        slot = np.arange(len(verts)) - (np.cumsum(counts) - counts)[verts]
+        keep = slot < width
+
+        self.nVerts = nVerts
+        self.width = width
+        self.boneIdxs = np.zeros((nVerts, width), dtype=np.intp)
+        self.weights = np.zeros((nVerts, width), dtype=np.float32)
+        self.boneIdxs[verts[keep], slot[keep]] = bones[keep]
+        self.weights[verts[keep], slot[keep]] = weights[keep]
+
+        if not keep.all():
+            truncated = np.unique(verts[~keep])
+            total = np.sum(self.weights[truncated], axis=1)
+            self.weights[truncated] /= np.where(total > 0, total, 1)[:,None]
+
+    def skin(self, poseVertsMats, meshCoords):
+        """
+        Skin homogenous mesh coordinates (nVerts, 4) with the stacked
+        matPoseVerts matrices (nBones, 4, 4) of the skeleton.
+        """
+        blended = np.einsum('nk,nkij->nij', self.weights, poseVertsMats[self.boneIdxs])
+        return np.einsum('nij,nj->ni', blended, meshCoords)
+
+
 class Bone(object):
 
     def __init__(self, skel, name, parentName, headPos, tailPos, roll=0):
@@ -377,6 +534,16 @@ class Bone(object):
             log.debug("Cannot calculate pose verts matrix for bone %s %s %s", self.name, self.head, self.tail)
             log.debug("Non-singular rest matrix %s", self.matRestGlobal)
 
+        # Keep the stacked matrices of the skeleton in sync
+        skel = self.skeleton
+        if skel.matPose is not None and self.index < len(skel.matPose):
+            skel.matPose[self.index] = self.matPose
+            skel.matPoseGlobal[self.index] = self.matPoseGlobal
+            skel.matPoseVerts[self.index] = self.matPoseVerts
+            self.matPose = skel.matPose[self.index]
+            self.matPoseGlobal = skel.matPoseGlobal[self.index]
+            self.matPoseVerts = skel.matPoseVerts[self.index]
+
     def getHead(self):
         """
         The head position of this bone in world space.
@@ -668,30 +835,19 @@ def loadRig(options, mesh):
     return skel, weights
 
 def getProxyWeights(proxy, humanWeights, mesh):
+    """
+    Transfer bone weights of the human mesh to a proxy mesh, and normalize
+    them per proxy vertex.
+    """
+    vertexWeights = proxy.transferVertexGroups(humanWeights)
 
-    # Zip vertex indices and weights
-    rawWeights = {}
-    for (key, val) in list(humanWeights.items()):
-        indxs, weights = val
-        rawWeights[key] = list(zip(indxs, weights))
-    vertexWeights = proxy.getWeights(rawWeights)
-
-    # Unzip and normalize weights (and put them in np format)
-    boneWeights = {}
     wtot = np.zeros(mesh.getVertexCount(), np.float32)
-    for vgroup in list(vertexWeights.values()):
-        for vn,w in vgroup:
-            wtot[vn] += w
+    for verts, weights in list(vertexWeights.values()):
+        wtot += np.bincount(verts, weights, minlength=len(wtot)).astype(np.float32)
 
-    for bname,vgroup in list(vertexWeights.items()):
-        weights = np.zeros(len(vgroup), np.float32)
-        verts = []
-        n = 0
-        for vn,w in vgroup:
-            verts.append(vn)
-            weights[n] = w/wtot[vn]
-            n += 1
-        boneWeights[bname] = (verts, weights)
+    boneWeights = {}
+    for bname, (verts, weights) in list(vertexWeights.items()):
+        boneWeights[bname] = (verts, (weights / wtot[verts]).astype(np.float32))
 
     return boneWeights
 
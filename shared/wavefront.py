@@ -26,45 +26,55 @@ Abstract
 import os
 import module3d
 import codecs
-import math
+import re
+import numpy as np
+from exportutils import serialize
+
+# Patterns match from the preceding newline, which lets the regex engine skip
+# quickly to candidate lines. Trailing comments are left out of the data.
+_directiveRe = re.compile(r'\n[ \t]*(g|usemtl|o)[ \t]+(\S+)[^\n]*')
+_vertexRe = re.compile(r'\n[ \t]*v[ \t]+([^\n#]*)')
+_uvRe = re.compile(r'\n[ \t]*vt[ \t]+([^\n#]*)')
+_faceRe = re.compile(r'\n[ \t]*f[ \t]+([^\n#]*)')
 
 def loadObjFile(path, obj = None):
     """
     Parse and load a Wavefront OBJ file as mesh.
+    The file is split on group, material and object statements, the vertex,
+    UV and face lines in between are collected with regular expressions and
+    their numbers are converted in bulk with numpy.
     """
     if obj == None:
         name = os.path.splitext( os.path.basename(path) )[0]
         obj = module3d.Object3D(name)
 
-    objFile = open(path)
+    with open(path) as objFile:
+        text = '\n' + objFile.read()
 
     fg = None
     mtl = None
 
-    verts = []
-    uvs = []
-    fverts = []
-    fuvs = []
-    groups = []
-    fmtls = []
-    has_uv = False
+    vlines = []
+    vtlines = []
+    flines = []
+    segments = []   # Face ranges with the same group and material: (first face, group, material)
+    changed = True
     materials = {}
     faceGroups = {}
 
-    for objData in objFile:
-
-        lineData = objData.split()
-        if len(lineData) > 0:
-
-            command = lineData[0]
+    # Split yields: chunk, command, argument, chunk, command, argument, ..., chunk
+    parts = _directiveRe.split(text)
+    del text
 
-            if command == 'v':
-                verts.append((float(lineData[1]), float(lineData[2]), float(lineData[3])))
+    for i in range(0, len(parts), 3):
 
-            elif command == 'vt':
-                uvs.append((float(lineData[1]), float(lineData[2])))
+        chunk = parts[i]
+        vlines.extend(_vertexRe.findall(chunk))
+        vtlines.extend(_uvRe.findall(chunk))
+        faces = _faceRe.findall(chunk)
 
-            elif command == 'f':
+        if faces:
+            if changed:
                 if not fg:
                     if 0 not in faceGroups:
                         faceGroups[0] = obj.createFaceGroup('default-dummy-group')
@@ -75,51 +85,41 @@ def loadObjFile(path, obj = None):
                         materials[0] = obj.createMaterial('')
                     mtl = materials[0]
 
-                uvIndices = []
-                vIndices = []
-                for faceData in lineData[1:]:
-                    vInfo = faceData.split('/')
-                    vIdx = int(vInfo[0]) - 1  # -1 because obj is 1 based list
-                    vIndices.append(vIdx)
-
-                    # If there are other data (uv, normals, etc)
-                    if len(vInfo) > 1 and vInfo[1] != '':
-                        uvIndex = int(vInfo[1]) - 1  # -1 because obj is 1 based list
-                        uvIndices.append(uvIndex)
-
-                if len(vIndices) == 3:
-                    vIndices.append(vIndices[0])
-                fverts.append(tuple(vIndices))
-                    
-                if len(uvIndices) > 0:
-                    if len(uvIndices) == 3:
-                        uvIndices.append(uvIndices[0])
-                    has_uv = True
-                if len(uvIndices) < 4:
-                    uvIndices = [0, 0, 0, 0]
-                fuvs.append(tuple(uvIndices))
-
-                groups.append(fg.idx)
-                
-                fmtls.append(mtl)
-
-            elif command == 'g':
-                fgName = lineData[1]
-                if fgName not in faceGroups:
-                    faceGroups[fgName] = obj.createFaceGroup(fgName)
-                fg =  faceGroups[fgName]
-
-            elif command == 'usemtl':
-                mtlName = lineData[1]
-                if mtlName not in materials:
-                    materials[mtlName] = obj.createMaterial(mtlName)
-                mtl =  materials[mtlName]
-
-            elif command == 'o':
-                
-                obj.name = lineData[1]
-
-    objFile.close()
+                segments.append((len(flines), fg.idx, mtl))
+                changed = False
+
+            flines.extend(faces)
+
+        if i + 1 >= len(parts):
+            break
+
+        command, arg = parts[i+1], parts[i+2]
+
+        if command == 'g':
+            if arg not in faceGroups:
+                faceGroups[arg] = obj.createFaceGroup(arg)
+            fg =  faceGroups[arg]
+            changed = True
+
+        elif command == 'usemtl':
+            if arg not in materials:
+                materials[arg] = obj.createMaterial(arg)
+            mtl =  materials[arg]
+            changed = True
+
+        elif command == 'o':
+
+            obj.name = arg
+
+    del parts
+
+    verts = _parseFloats(vlines, 3)
+    uvs = _parseFloats(vtlines, 2)
+    fverts, fuvs, has_uv = _parseFaces(flines)
+
+    starts = np.array([segment[0] for segment in segments] + [len(flines)], dtype=np.intp)
+    groups = np.repeat(np.array([segment[1] for segment in segments], dtype=np.intp), np.diff(starts))
+    fmtls = np.repeat(np.array([segment[2] for segment in segments], dtype=np.intp), np.diff(starts))
 
     obj.setCoords(verts)
     obj.setUVs(uvs)
@@ -127,12 +127,112 @@ def loadObjFile(path, obj = None):
 
     return obj
 
+def _parseFloats(lines, ncols):
+    """
+    Convert the first ncols values of each line to a (len(lines), ncols)
+    float array.
+    """
+    if not lines:
+        return np.zeros((0, ncols), dtype=np.float32)
+
+    try:
+        values = np.fromstring(' '.join(lines), dtype=np.float32, sep=' ')
+    except ValueError:
+        values = None
+    if values is not None and len(values) == len(lines) * ncols:
+        return values.reshape((-1, ncols))
+
+    # Lines with extra (or missing) values
+    return np.array([line.split()[:ncols] for line in lines], dtype=np.float32)
+
+def _parseFaces(lines):
+    """
+    Convert face lines (triangles or quads) to (nFaces, 4) vertex and UV
+    index arrays. Triangles repeat their first vertex.
+    Returns (fverts, fuvs, has_uv).
+    """
+    nFaces = len(lines)
+    if nFaces == 0:
+        return np.zeros((0, 4), dtype=np.int32), np.zeros((0, 4), dtype=np.int32), False
+
+    # Vertex references are v, v/vt, v//vn or v/vt/vn, all faces normally
+    # use the same form. Every face is followed by a row of zeros (an invalid
+    # index in OBJ) so face boundaries survive the bulk conversion.
+    first = lines[0].split()
+    nValues = first[0].count('/') + 1 if first else 1
+    sentinel = ' ' + '0 ' * nValues
+    text = sentinel.join(lines) + sentinel
+    if nValues > 1:
+        text = text.replace('//', '/0/')
+    nSlashes = text.count('/')
+    if nValues == 2 and re.search(r'/[^\s/]*/', text):
+        return _parseMixedFaces(lines)
+    try:
+        values = np.fromstring(text.replace('/', ' '), dtype=np.int64, sep=' ')
+    except ValueError:
+        return _parseMixedFaces(lines)
+    del text
+
+    # Each reference has one value more than it has slashes, so this only
+    # holds if all references have the same form
+    nRefs = len(values) - nValues * nFaces - nSlashes
+    if nSlashes != (nValues - 1) * nRefs:
+        return _parseMixedFaces(lines)
+    values = values.reshape((-1, nValues))
+
+    ends = np.flatnonzero(values[:,0] == 0)
+    if len(ends) != nFaces:
+        return _parseMixedFaces(lines)
+    counts = np.diff(np.append(-1, ends)) - 1
+
+    return _gatherFaces(values[:,0], values[:,1] if nValues > 1 else None, ends - counts, counts)
+
+def _parseMixedFaces(lines):
+    """
+    Slower fallback of _parseFaces for files mixing vertex reference forms.
+    """
+    tokens = np.array(' '.join(lines).split())
+    counts = np.array([len(line.split()) for line in lines])
+
+    parts = np.char.partition(tokens, '/')
+    vIdx = parts[:,0].astype(np.int64)
+    uvTokens = np.char.partition(parts[:,2], '/')[:,0]
+    uvIdx = np.where(uvTokens != '', uvTokens, '0').astype(np.int64)
+
+    return _gatherFaces(vIdx, uvIdx, np.cumsum(counts) - counts, counts)
+
+def _gatherFaces(vIdx, uvIdx, starts, counts):
+    """
+    Build padded face arrays from one based vertex and UV indices (one entry
+    per vertex reference, UV index 0 when absent) and the offset and number
+    of references of each face.
+    """
+    if np.any((counts < 3) | (counts > 4)):
+        raise RuntimeError('Only triangles and quads are supported')
+
+    cols = np.arange(4)
+    ix = starts[:,None] + np.where(cols[None,:] < counts[:,None], cols[None,:], 0)
+
+    fverts = (vIdx[ix] - 1).astype(np.int32)  # -1 because obj is 1 based list
+    if uvIdx is None:
+        return fverts, np.zeros(fverts.shape, dtype=np.int32), False
+
+    fuvs = uvIdx[ix]
+    hasUV = (fuvs > 0)
+    fuvs = (fuvs - 1).astype(np.int32)
+    fuvs[~np.all(hasUV, axis=1)] = 0
+
+    return fverts, fuvs, bool(np.any(hasUV))
 
 def writeObjFile(path, objects, writeMTL = True, config = None):
-    if not isinstance(objects, list):
+    """
+    Write the objects to an OBJ file. objects can be any iterable, each
+    object is written completely before the next one is requested.
+    """
+    if hasattr(objects, 'coord'):
         objects = [objects]
 
-    if isinstance(path, file):
+    if hasattr(path, 'write'):
         fp = path
     else:
         fp = codecs.open(path, 'w', encoding="utf-8")
@@ -145,69 +245,48 @@ def writeObjFile(path, objects, writeMTL = True, config = None):
         mtlfile = path.replace(".obj",".mtl")
         fp.write("mtllib %s\n" % os.path.basename(mtlfile))
 
-    # Vertices
+    useNormals = (config == None or config.useNormals)
+    materials = []
+    nVerts = 1
+    nTexVerts = 1
+    nNormals = 1
     for obj in objects:
-        for co in obj.coord:
-            fp.write("v %.4g %.4g %.4g\n" % tuple(co))
+        materials.append(obj.material)
+
+        serialize.writeArray(fp, "v %.4g %.4g %.4g\n", obj.coord)
 
-    # Vertex normals
-    if config == None or config.useNormals:
-        for obj in objects:
+        # Face normals
+        if useNormals:
             obj.calcFaceNormals()
             #obj.calcVertexNormals()
-            for no in obj.fnorm:
-                no = no/math.sqrt(no.dot(no))
-                fp.write("vn %.4g %.4g %.4g\n" % tuple(no))
+            no = obj.fnorm / np.sqrt(np.sum(obj.fnorm * obj.fnorm, axis=1))[:,None]
+            serialize.writeArray(fp, "vn %.4g %.4g %.4g\n", no)
 
-    # UV vertices
-    for obj in objects:
         if obj.has_uv:
-            for uv in obj.texco:
-                fp.write("vt %.4g %.4g\n" % tuple(uv))
+            serialize.writeArray(fp, "vt %.4g %.4g\n", obj.texco)
 
-    # Faces
-    nVerts = 1
-    nTexVerts = 1
-    for obj in objects:
+        # Faces
         fp.write("usemtl %s\n" % obj.material.name)
         fp.write("g %s\n" % obj.name)
-        for fn,fv in enumerate(obj.fvert):
-            fp.write('f ')
-            fuv = obj.fuvs[fn]
-            if fv[0] == fv[3]:
-                nv = 3
+        sizes = serialize.getFaceSizes(obj.fvert)
+        fverts = obj.fvert + nVerts
+        fuvs = obj.fuvs + nTexVerts
+        if useNormals:
+            fnums = serialize.getFaceIndices(len(obj.fvert)) + nNormals
+            if obj.has_uv:
+                serialize.writeFaces(fp, "%d/%d/%d", [fverts, fuvs, fnums], sizes, 'f ')
             else:
-                nv = 4
-            if config == None or config.useNormals:
-                if obj.has_uv:
-                    line = []
-                    for n in range(nv):
-                        vn = fv[n]+nVerts
-                        line.append("%d/%d/%d" % (vn, fuv[n]+nTexVerts, fn))
-                    fp.write(" ".join(line))
-                else:
-                    line = []
-                    for n in range(nv):
-                        vn = fv[n]+nVerts
-                        line.append("%d//%d" % (vn, fn))
-                    fp.write(" ".join(line))
+                serialize.writeFaces(fp, "%d//%d", [fverts, fnums], sizes, 'f ')
+            nNormals += len(obj.fvert)
+        else:
+            if obj.has_uv:
+                serialize.writeFaces(fp, "%d/%d", [fverts, fuvs], sizes, 'f ')
             else:
-                if obj.has_uv:
-                    line = []
-                    for n in range(nv):
-                        vn = fv[n]+nVerts
-                        line.append("%d/%d" % (vn, fuv[n]+nTexVerts))
-                    fp.write(" ".join(line))
-                else:
-                    line = []
-                    for n in range(nv):
-                        vn = fv[n]+nVerts
-                        line.append("%d" % (vn))
-                    fp.write(" ".join(line))
-            fp.write('\n')
+                serialize.writeFaces(fp, "%d", [fverts], sizes, 'f ')
 
         nVerts += len(obj.coord)
-        nTexVerts += len(obj.texco)
+        if obj.has_uv:
+            nTexVerts += len(obj.texco)
 
     fp.close()
 
@@ -216,8 +295,8 @@ def writeObjFile(path, objects, writeMTL = True, config = None):
         fp.write(
             '# MakeHuman exported MTL\n' +
             '# www.makehuman.org\n\n')
-        for obj in objects:
-            writeMaterial(fp, obj.material, config)
+        for material in materials:
+            writeMaterial(fp, material, config)
         fp.close()
 
 
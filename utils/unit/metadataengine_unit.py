@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+sys.path = ["./core", "./lib", "./apps", "./shared"] + sys.path
+
+import metadataengine
+
+# saving to an archive whose last line has no newline
+path = os.path.join(tempfile.mkdtemp(), 'archive.txt')
+with open(path, 'w') as f:
+    f.write('a x y\nc u v')
+
+metadataengine.saveRecord(path, 'b z')
+
+print((open(path).read(),))
+assert metadataengine.loadRecord(path, 'c') == ['c', 'u', 'v']
+assert metadataengine.loadRecord(path, 'b') == ['b', 'z']
+
+# reindex from scratch
+metadataengine.flushArchives()
+metadataengine._archives.clear()
+os.remove(path + '.index')
+assert metadataengine.loadRecord(path, 'c') == ['c', 'u', 'v']
+assert metadataengine.loadRecord(path, 'b') == ['b', 'z']
+assert metadataengine.searchRecord(path, 'z') == ['b']
+
+# an archive edited by hand before the indexed end is indexed again
+metadataengine.flushArchives()
+metadataengine._archives.clear()
+with open(path, 'r+') as f:
+    f.write('d')
+assert metadataengine.loadRecord(path, 'd') == ['d', 'x', 'y']
+assert metadataengine.loadRecord(path, 'a') is None
+assert metadataengine.searchRecord(path, 'x') == ['d']
+
+# and so is one edited while it is open
+with open(path, 'r+') as f:
+    f.write('e')
+assert metadataengine.loadRecord(path, 'd') is None
+assert metadataengine.loadRecord(path, 'e') == ['e', 'x', 'y']